@@ -53,9 +53,13 @@ def run_migrations_online():
                 poolclass=pool.NullPool)
 
     connection = engine.connect()
+    # Every migration is committed with its version on its own, so the
+    # migrations that commit to build indexes CONCURRENTLY (see their
+    # autocommit helper) do not commit the ones before them half done
     context.configure(
                 connection=connection, 
-                target_metadata=target_metadata
+                target_metadata=target_metadata,
+                transaction_per_migration=True
                 )
 
     try:
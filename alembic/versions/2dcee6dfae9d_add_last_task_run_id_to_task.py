@@ -0,0 +1,67 @@
+"""add last_task_run_id to task
+
+Revision ID: 2dcee6dfae9d
+Revises: 4c2b6bd01a52
+Create Date: 2015-07-08 09:47:13.902611
+
+Keep the id of the last answer of every task, so the incremental scheduler
+does not need to sort the task runs of a task to find it.
+
+Once the column is added the migration transaction is committed and the
+backfill is run in autocommit: the last answers of every batch of
+BATCH_SIZE tasks are read with task_run_task_id_idx and committed on their
+own, without locking the tables for long. If the migration is interrupted,
+running it again skips the tasks that already have it set.
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2dcee6dfae9d'
+down_revision = '4c2b6bd01a52'
+
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+
+BATCH_SIZE = 10000
+
+
+# Migration scripts are loaded by alembic by path, not as a package, so
+# they cannot import each other: every migration that needs to run
+# statements outside of its transaction carries its own copy of this helper.
+@contextmanager
+def autocommit():
+    """Commit the migration transaction and run the block in autocommit."""
+    connection = op.get_bind().connection.connection
+    connection.commit()
+    connection.autocommit = True
+    try:
+        yield
+    finally:
+        connection.autocommit = False
+
+
+def upgrade():
+    conn = op.get_bind()
+    existing = [c['name'] for c in sa.inspect(conn).get_columns('task')]
+    if 'last_task_run_id' not in existing:
+        op.add_column('task', sa.Column('last_task_run_id', sa.Integer))
+    update_last_task_run_id = '''
+        WITH last_task_runs AS (
+        SELECT task_id, MAX(id) AS last_task_run_id FROM task_run
+        WHERE task_id > %(start)s AND task_id <= %(end)s
+        GROUP BY task_id
+        )
+        UPDATE task SET last_task_run_id=last_task_runs.last_task_run_id
+        FROM last_task_runs WHERE last_task_runs.task_id=task.id
+        AND task.last_task_run_id IS NULL;
+    '''
+    with autocommit():
+        max_id = conn.execute('SELECT MAX(id) FROM task').scalar() or 0
+        for start in xrange(0, max_id, BATCH_SIZE):
+            conn.execute(update_last_task_run_id
+                         % dict(start=start, end=start + BATCH_SIZE))
+
+
+def downgrade():
+    op.drop_column('task', 'last_task_run_id')
@@ -0,0 +1,66 @@
+"""add scheduler indexes
+
+Revision ID: 3a9a6a2a5b0e
+Revises: 2dcee6dfae9d
+Create Date: 2015-07-10 12:03:27.518342
+
+Composite and partial indexes for the task and task_run queries of the
+schedulers. They are built CONCURRENTLY, so the tables are not locked while
+building them, which cannot be done inside a transaction: env.py runs every
+migration in its own transaction, and this one is run in autocommit. If it
+is interrupted, running it again builds the indexes left behind again.
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3a9a6a2a5b0e'
+down_revision = '2dcee6dfae9d'
+
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+
+indexes = [
+    ('task_project_id_state_idx',
+     'task (project_id, state)'),
+    ('task_open_priority_idx',
+     "task (project_id, priority_0 DESC, id) WHERE state != 'completed'"),
+    ('task_open_n_task_runs_idx',
+     "task (project_id, n_task_runs, id) WHERE state != 'completed'"),
+    ('task_open_id_idx',
+     "task (project_id, id) WHERE state != 'completed'"),
+    ('task_run_project_id_user_id_task_id_idx',
+     'task_run (project_id, user_id, task_id)'),
+    ('task_run_project_id_user_ip_task_id_idx',
+     'task_run (project_id, user_ip, task_id)'),
+]
+
+
+# Migration scripts are loaded by alembic by path, not as a package, so
+# they cannot import each other: every migration that needs to run
+# statements outside of its transaction carries its own copy of this helper.
+@contextmanager
+def autocommit():
+    """Commit the migration transaction and run the block in autocommit."""
+    connection = op.get_bind().connection.connection
+    connection.commit()
+    connection.autocommit = True
+    try:
+        yield
+    finally:
+        connection.autocommit = False
+
+
+def upgrade():
+    with autocommit():
+        for name, definition in indexes:
+            # Left invalid if a previous run was interrupted while building it
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
+            op.execute('CREATE INDEX CONCURRENTLY %s ON %s'
+                       % (name, definition))
+
+
+def downgrade():
+    with autocommit():
+        for name, definition in reversed(indexes):
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
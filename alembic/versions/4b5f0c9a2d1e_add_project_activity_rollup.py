@@ -0,0 +1,70 @@
+"""add project activity rollup
+
+Revision ID: 4b5f0c9a2d1e
+Revises: 3a9a6a2a5b0e
+Create Date: 2015-07-20 10:42:13.204518
+
+Answers and completed tasks of every project per hour, folded in from
+task_run by the rollup_project_activity job from the high-water mark kept
+in rollup_mark. The existing task runs are folded in by the first runs of
+the job, so this migration does not need to read them. It only creates the
+mark, at 0, so every run of the job has a row to lock.
+
+The stats read the task runs of a project not yet folded in (above the
+mark) with task_run_project_id_id_idx. Once the tables are created the
+migration transaction is committed, and the index is built CONCURRENTLY in
+autocommit, so task_run is not locked while building it.
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4b5f0c9a2d1e'
+down_revision = '3a9a6a2a5b0e'
+
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+
+# Migration scripts are loaded by alembic by path, not as a package, so
+# they cannot import each other: every migration that needs to run
+# statements outside of its transaction carries its own copy of this helper.
+@contextmanager
+def autocommit():
+    """Commit the migration transaction and run the block in autocommit."""
+    connection = op.get_bind().connection.connection
+    connection.commit()
+    connection.autocommit = True
+    try:
+        yield
+    finally:
+        connection.autocommit = False
+
+
+def upgrade():
+    op.create_table('project_activity',
+                    sa.Column('project_id', sa.Integer,
+                              sa.ForeignKey('project.id', ondelete='CASCADE'),
+                              primary_key=True),
+                    sa.Column('day', sa.Date, primary_key=True),
+                    sa.Column('hour', sa.Integer, primary_key=True),
+                    sa.Column('n_answers', sa.Integer, nullable=False),
+                    sa.Column('n_auth', sa.Integer, nullable=False),
+                    sa.Column('n_anon', sa.Integer, nullable=False),
+                    sa.Column('n_completed', sa.Integer, nullable=False))
+    op.create_table('rollup_mark',
+                    sa.Column('name', sa.Text, primary_key=True),
+                    sa.Column('last_id', sa.Integer, nullable=False))
+    op.execute("INSERT INTO rollup_mark (name, last_id) "
+               "VALUES ('project_activity', 0)")
+    with autocommit():
+        # Left invalid if a previous run was interrupted while building it
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS '
+                   'task_run_project_id_id_idx')
+        op.execute('CREATE INDEX CONCURRENTLY task_run_project_id_id_idx '
+                   'ON task_run (project_id, id)')
+
+
+def downgrade():
+    op.drop_index('task_run_project_id_id_idx', 'task_run')
+    op.drop_table('rollup_mark')
+    op.drop_table('project_activity')
@@ -0,0 +1,72 @@
+"""add n_task_runs to task
+
+Revision ID: 4c2b6bd01a52
+Revises: ac115763654
+Create Date: 2015-07-06 11:12:40.421317
+
+Keep the number of answers of every task in the task table, so the
+breadth_first scheduler does not need to count the task runs.
+
+Once the column is added the migration transaction is committed and the
+rest is run in autocommit: the index on task_run.task_id is built
+CONCURRENTLY, and then the answers of every batch of BATCH_SIZE tasks are
+counted with it and committed on their own, without locking the tables for
+long. If the migration is interrupted, running it again counts them again.
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4c2b6bd01a52'
+down_revision = 'ac115763654'
+
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+
+BATCH_SIZE = 10000
+
+
+# Migration scripts are loaded by alembic by path, not as a package, so
+# they cannot import each other: every migration that needs to run
+# statements outside of its transaction carries its own copy of this helper.
+@contextmanager
+def autocommit():
+    """Commit the migration transaction and run the block in autocommit."""
+    connection = op.get_bind().connection.connection
+    connection.commit()
+    connection.autocommit = True
+    try:
+        yield
+    finally:
+        connection.autocommit = False
+
+
+def upgrade():
+    conn = op.get_bind()
+    existing = [c['name'] for c in sa.inspect(conn).get_columns('task')]
+    if 'n_task_runs' not in existing:
+        op.add_column('task', sa.Column('n_task_runs', sa.Integer,
+                                        server_default='0', nullable=False))
+    update_n_task_runs = '''
+        WITH task_runs AS (
+        SELECT task_id, COUNT(id) AS n_task_runs FROM task_run
+        WHERE task_id > %(start)s AND task_id <= %(end)s
+        GROUP BY task_id
+        )
+        UPDATE task SET n_task_runs=task_runs.n_task_runs
+        FROM task_runs WHERE task_runs.task_id=task.id;
+    '''
+    with autocommit():
+        # Left invalid if a previous run was interrupted while building it
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS task_run_task_id_idx')
+        op.execute('CREATE INDEX CONCURRENTLY task_run_task_id_idx '
+                   'ON task_run (task_id)')
+        max_id = conn.execute('SELECT MAX(id) FROM task').scalar() or 0
+        for start in xrange(0, max_id, BATCH_SIZE):
+            conn.execute(update_n_task_runs
+                         % dict(start=start, end=start + BATCH_SIZE))
+
+
+def downgrade():
+    op.drop_index('task_run_task_id_idx', 'task_run')
+    op.drop_column('task', 'n_task_runs')
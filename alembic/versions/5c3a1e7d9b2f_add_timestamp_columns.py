@@ -0,0 +1,119 @@
+"""add timestamp columns
+
+Revision ID: 5c3a1e7d9b2f
+Revises: 4b5f0c9a2d1e
+Create Date: 2015-07-24 09:15:41.683120
+
+Native timestamps of the text columns task_run.created, task_run.finish_time,
+task.created and project.updated, kept up to date by the models, so they can
+be indexed and queried with ranges instead of parsing the text of every row.
+
+Once the columns are added the migration transaction is committed (env.py
+runs every migration in its own transaction) and the rest is run in
+autocommit, so every batch of BATCH_SIZE rows is backfilled and committed on
+its own, without locking the tables for long. If the migration is
+interrupted, running it again resumes the backfill, as the rows already
+backfilled are skipped. The indexes are built CONCURRENTLY afterwards.
+
+The previous version of the code keeps writing rows without the timestamps
+until it is replaced, so once the new version is deployed everywhere run:
+
+    python cli.py backfill_timestamps
+
+The rollup_project_activity job fills the task runs it folds in anyway.
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5c3a1e7d9b2f'
+down_revision = '4b5f0c9a2d1e'
+
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+
+BATCH_SIZE = 10000
+
+columns = [
+    ('task_run', 'created'),
+    ('task_run', 'finish_time'),
+    ('task', 'created'),
+    ('project', 'updated'),
+]
+
+indexes = [
+    ('task_run_finish_time_ts_idx',
+     'task_run (finish_time_ts)'),
+    ('task_run_user_id_finish_time_ts_idx',
+     'task_run (user_id, finish_time_ts)'),
+    ('task_created_ts_idx',
+     'task (created_ts)'),
+    ('project_updated_ts_idx',
+     'project (updated_ts)'),
+]
+
+# Created again by the dashboard jobs, with the timestamp columns
+views = [
+    'dashboard_week_users',
+    'dashboard_week_anon',
+    'dashboard_week_project_update',
+    'dashboard_week_new_task',
+    'dashboard_week_new_task_run',
+    'dashboard_week_returning_users',
+]
+
+# Only the values made by make_timestamp are converted, the rest are NULL
+TIMESTAMP = r"'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?$'"
+
+
+# Migration scripts are loaded by alembic by path, not as a package, so
+# they cannot import each other: every migration that needs to run
+# statements outside of its transaction carries its own copy of this helper.
+@contextmanager
+def autocommit():
+    """Commit the migration transaction and run the block in autocommit."""
+    connection = op.get_bind().connection.connection
+    connection.commit()
+    connection.autocommit = True
+    try:
+        yield
+    finally:
+        connection.autocommit = False
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    for table, column in columns:
+        existing = [c['name'] for c in inspector.get_columns(table)]
+        if column + '_ts' not in existing:
+            op.add_column(table, sa.Column(column + '_ts', sa.DateTime))
+    for view in views:
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % view)
+    with autocommit():
+        for table, column in columns:
+            max_id = conn.execute('SELECT MAX(id) FROM %s'
+                                  % table).scalar() or 0
+            for start in xrange(0, max_id, BATCH_SIZE):
+                conn.execute('UPDATE %(table)s '
+                             'SET %(column)s_ts=%(column)s::timestamp '
+                             'WHERE id > %(start)s AND id <= %(end)s '
+                             'AND %(column)s_ts IS NULL '
+                             'AND %(column)s ~ %(format)s'
+                             % dict(table=table, column=column, start=start,
+                                    end=start + BATCH_SIZE, format=TIMESTAMP))
+        for name, definition in indexes:
+            # Left invalid if a previous run was interrupted while building it
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
+            op.execute('CREATE INDEX CONCURRENTLY %s ON %s'
+                       % (name, definition))
+
+
+def downgrade():
+    with autocommit():
+        for name, definition in reversed(indexes):
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
+    for view in views:
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % view)
+    for table, column in reversed(columns):
+        op.drop_column(table, column + '_ts')
@@ -0,0 +1,133 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+#!/usr/bin/env python
+"""Benchmark the serializers of the cache with real cached values.
+
+Values are computed from the DB configured in the settings (read only).
+Usage:
+
+    python cache_benchmark.py serializers 1 1000
+
+computes the cached values of project 1 (browse_tasks, stats, ...) and
+the site (leaderboard, project lists), and prints, for every serializer
+and compression, the size of the values and the time (in microseconds)
+it takes to dump and load them 1000 times.
+"""
+import os
+import sys
+import time
+import optparse
+import inspect
+
+from pybossa.core import create_app
+from pybossa.cache.serializer import Serializer, FORMATS, COMPRESSIONS
+
+app = create_app(run_as_server=False)
+
+
+def serializers(project_id, n_times=1000):
+    '''Benchmark the serializers with the cached values of a project'''
+    n_times = int(n_times)
+    payloads = _payloads(int(project_id))
+    options = [(format, compression)
+               for format in sorted(FORMATS) if FORMATS[format][3]
+               for compression in [None] + sorted(COMPRESSIONS)
+               if compression is None or COMPRESSIONS[compression][3]]
+    print '%-18s %-16s %10s %10s %10s' % ('payload', 'serializer', 'bytes',
+                                          'dumps us', 'loads us')
+    for name, value in payloads:
+        for format, compression in options:
+            serializer = Serializer(format, compression)
+            data = serializer.dumps(value)
+            dumps = _time(serializer.dumps, value, n_times)
+            loads = _time(serializer.loads, data, n_times)
+            label = '%s+%s' % (format, compression) if compression else format
+            print '%-18s %-16s %10d %10.1f %10.1f' % (name, label, len(data),
+                                                      dumps, loads)
+
+
+def _payloads(project_id):
+    # Compute the values instead of reading them from Redis
+    os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = '1'
+    with app.app_context():
+        import pybossa.cache.projects as cached_projects
+        import pybossa.cache.users as cached_users
+        import pybossa.cache.project_stats as stats
+        from pybossa.core import project_repo
+        project = project_repo.get(project_id)
+        if project is None:
+            print "Project %s does not exist" % project_id
+            sys.exit(1)
+        category = project.category.short_name
+        return [
+            ('get_project', cached_projects.get_project(project.short_name)),
+            ('browse_tasks', cached_projects.browse_tasks(project_id)),
+            ('get_stats', stats.get_stats(project_id)),
+            ('get_all', cached_projects.get_all(category)),
+            ('get_leaderboard', cached_users.get_leaderboard(20, None))]
+
+
+def _time(function, arg, n_times):
+    start = time.time()
+    for i in xrange(n_times):
+        function(arg)
+    return (time.time() - start) / n_times * 10 ** 6
+
+
+## ==================================================
+## Misc stuff for setting up a command line interface
+
+def _module_functions(functions):
+    local_functions = dict(functions)
+    for k,v in local_functions.items():
+        if not inspect.isfunction(v) or k.startswith('_'):
+            del local_functions[k]
+    return local_functions
+
+def _main(functions_or_object):
+    isobject = inspect.isclass(functions_or_object)
+    if isobject:
+        _methods = _object_methods(functions_or_object)
+    else:
+        _methods = _module_functions(functions_or_object)
+
+    usage = '''%prog {action}
+
+Actions:
+    '''
+    usage += '\n    '.join(
+        [ '%s: %s' % (name, m.__doc__.split('\n')[0] if m.__doc__ else '') for (name,m)
+        in sorted(_methods.items()) ])
+    parser = optparse.OptionParser(usage)
+    options, args = parser.parse_args()
+
+    if not args or not args[0] in _methods:
+        parser.print_help()
+        sys.exit(1)
+
+    method = args[0]
+    if isobject:
+        getattr(functions_or_object(), method)(*args[1:])
+    else:
+        _methods[method](*args[1:])
+
+__all__ = [ '_main' ]
+
+if __name__ == '__main__':
+    _main(locals())
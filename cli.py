@@ -88,11 +88,58 @@ def fix_task_date():
             timestamp = int(re.findall(r'\d+', task.created)[0])
             print timestamp
             # Postgresql expects this format 2015-05-21T13:19:06.471074
-            fixed_created = datetime.fromtimestamp(timestamp/1000)\
-                                    .replace(microsecond=timestamp%1000*1000)\
-                                    .strftime('%Y-%m-%dT%H:%M:%S.%f')
-            query = text('''UPDATE task SET created=:created WHERE id=:id''')
-            db.engine.execute(query, created=fixed_created, id=task.id)
+            created_ts = datetime.fromtimestamp(timestamp/1000)\
+                                 .replace(microsecond=timestamp%1000*1000)
+            fixed_created = created_ts.strftime('%Y-%m-%dT%H:%M:%S.%f')
+            # created_ts is what the range queries read, so keep it in sync
+            query = text('''UPDATE task SET created=:created,
+                            created_ts=:created_ts WHERE id=:id''')
+            db.engine.execute(query, created=fixed_created,
+                              created_ts=created_ts, id=task.id)
+
+def backfill_timestamps(batch_size=10000):
+    '''Fill the timestamp columns of the rows written without them'''
+    from pybossa.model import TIMESTAMP_PATTERN
+    columns = [('task_run', 'created'), ('task_run', 'finish_time'),
+               ('task', 'created'), ('project', 'updated')]
+    batch_size = int(batch_size)
+    with app.app_context():
+        for table, column in columns:
+            # Only the rows written while deploying lack them, so start there
+            query = text('''SELECT MIN(id), MAX(id) FROM %(table)s
+                            WHERE %(column)s_ts IS NULL
+                            AND %(column)s ~ :pattern'''
+                         % dict(table=table, column=column))
+            first, last = db.engine.execute(query,
+                                            pattern=TIMESTAMP_PATTERN).first()
+            filled = 0
+            if first is not None:
+                query = text('''UPDATE %(table)s
+                                SET %(column)s_ts=%(column)s::timestamp
+                                WHERE id >= :start AND id < :end
+                                AND %(column)s_ts IS NULL
+                                AND %(column)s ~ :pattern'''
+                             % dict(table=table, column=column))
+                for start in xrange(first, last + 1, batch_size):
+                    filled += db.engine.execute(
+                        query, start=start, end=start + batch_size,
+                        pattern=TIMESTAMP_PATTERN).rowcount
+            print "%s.%s_ts: %s rows filled" % (table, column, filled)
+
+
+def backfill_volunteers(project_id=None):
+    '''Backfill the HyperLogLog sketches of the volunteers of the projects'''
+    from pybossa.jobs import backfill_project_volunteers
+    with app.app_context():
+        if project_id is not None:
+            project_ids = [int(project_id)]
+        else:
+            query = text('''SELECT id FROM project ORDER BY id''')
+            project_ids = [row.id for row in db.engine.execute(query)]
+        for _id in project_ids:
+            counts = backfill_project_volunteers(_id)
+            print "Project %s: %s registered and %s anonymous volunteers" % (
+                _id, counts['registered'], counts['anonymous'])
 
 
 def delete_hard_bounces():
@@ -0,0 +1,62 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Sampled counts of the accesses to projects and users, kept in Redis."""
+import random
+
+
+class AccessLog(object):
+
+    """Keep, per kind of item (project, user...), a Redis sorted set with
+    how often every item is accessed.
+
+    Only a sample of the accesses is recorded, so busy pages cost one
+    ZINCRBY every few requests. Scores are decayed regularly by the cache
+    warming job, so they reflect recent traffic.
+    """
+
+    KEY = 'pybossa:access:%s'
+    DECAY = 0.9
+    MIN_SCORE = 0.1
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def record(self, kind, member, sample_rate=1.0):
+        """Record, with probability sample_rate, an access to member."""
+        if random.random() < sample_rate:
+            self.conn.zincrby(self.KEY % kind, member, 1)
+
+    def scores(self, kind, members):
+        """Return the recorded accesses of members (0 if never recorded)."""
+        pipe = self.conn.pipeline(transaction=False)
+        for member in members:
+            pipe.zscore(self.KEY % kind, member)
+        return [score or 0 for score in pipe.execute()]
+
+    def top(self, kind, n):
+        """Return the n most accessed members."""
+        return self.conn.zrevrange(self.KEY % kind, 0, n - 1)
+
+    def decay(self, kind):
+        """Multiply the scores by DECAY, dropping the members not accessed
+        for long."""
+        key = self.KEY % kind
+        pipe = self.conn.pipeline()
+        pipe.zunionstore(key, {key: self.DECAY})
+        pipe.zremrangebyscore(key, '-inf', '(%s' % self.MIN_SCORE)
+        pipe.execute()
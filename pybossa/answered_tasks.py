@@ -0,0 +1,91 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Redis sets with the tasks already answered by every user of a project."""
+from pybossa.util import get_volunteer_key
+
+
+class AnsweredTasks(object):
+
+    """Keep, per project and user (or IP), a Redis set of answered task ids.
+
+    Sets are loaded lazily from the DB the first time they are needed, and
+    every loaded set contains the LOADED member (task ids start at 1), so a
+    user with no answers is not mistaken for a set that was never loaded.
+    Sets expire TTL seconds after they were last loaded or updated.
+
+    New answers are always added, and loading only adds to the set, so an
+    answer committed while its set was being loaded is never lost: it is in
+    the set whichever write comes first.
+    """
+
+    KEY = 'pybossa:sched:answered:project:%s:%s'
+    LOADED = 0
+    TTL = 24 * 60 * 60
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def get(self, project_id, user_id=None, user_ip=None):
+        """Return the set of answered task ids, or None if it isn't loaded."""
+        members = self.conn.smembers(self._key(project_id, user_id, user_ip))
+        answered = set(int(member) for member in members)
+        if self.LOADED not in answered:
+            return None
+        answered.discard(self.LOADED)
+        return answered
+
+    def contains(self, project_id, task_ids, user_id=None, user_ip=None):
+        """Return whether every task id was answered, or None if the set
+        isn't loaded.
+
+        Task ids are checked with pipelined SISMEMBERs, so the cost does not
+        depend on how many tasks the user has answered.
+        """
+        key = self._key(project_id, user_id, user_ip)
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.sismember(key, self.LOADED)
+        for task_id in task_ids:
+            pipe.sismember(key, task_id)
+        result = pipe.execute()
+        if not result[0]:
+            return None
+        return [bool(answered) for answered in result[1:]]
+
+    def load(self, project_id, task_ids, user_id=None, user_ip=None):
+        """Add the answered task ids of a user read from the DB to its set,
+        and mark it as loaded."""
+        key = self._key(project_id, user_id, user_ip)
+        pipe = self.conn.pipeline()
+        pipe.sadd(key, self.LOADED, *task_ids)
+        pipe.expire(key, self.TTL)
+        pipe.execute()
+
+    def add(self, project_id, task_id, user_id=None, user_ip=None):
+        """Record a new answer of a user, even if its set is not loaded."""
+        key = self._key(project_id, user_id, user_ip)
+        pipe = self.conn.pipeline()
+        pipe.sadd(key, task_id)
+        pipe.expire(key, self.TTL)
+        pipe.execute()
+
+    def remove(self, project_id, task_id, user_id=None, user_ip=None):
+        """Forget an answer of a user."""
+        self.conn.srem(self._key(project_id, user_id, user_ip), task_id)
+
+    def _key(self, project_id, user_id=None, user_ip=None):
+        return self.KEY % (project_id, get_volunteer_key(user_id, user_ip))
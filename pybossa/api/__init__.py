@@ -59,6 +59,9 @@ cors_headers = ['Content-Type', 'Authorization']
 
 error = ErrorStatus()
 
+# Maximum number of tasks returned by a single newtask request
+MAX_NEW_TASKS = 20
+
 
 @blueprint.route('/')
 @crossdomain(origin='*', headers=cors_headers)
@@ -105,9 +108,22 @@ register_api(TokenAPI, 'api_token', '/token', pk='token', pk_type='string')
 @crossdomain(origin='*', headers=cors_headers)
 @ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'))
 def new_task(project_id):
-    """Return a new task for a project."""
+    """Return a new task for a project.
+
+    If the request has a limit arg, return a list with up to limit new tasks
+    (at most MAX_NEW_TASKS) from a single run of the scheduler instead.
+    """
     # Check if the request has an arg:
     try:
+        limit = request.args.get('limit')
+        if limit is not None:
+            limit = min(max(int(limit), 1), MAX_NEW_TASKS)
+            tasks = _retrieve_new_task(project_id, limit=limit)
+            mark_tasks_as_requested_by_user(tasks, sentinel.master)
+            response = make_response(
+                json.dumps([task.dictize() for task in tasks]))
+            response.mimetype = "application/json"
+            return response
         task = _retrieve_new_task(project_id)
         # If there is a task for the user, return it
         if task is not None:
@@ -119,7 +135,7 @@ def new_task(project_id):
     except Exception as e:
         return error.format_exception(e, target='project', action='GET')
 
-def _retrieve_new_task(project_id):
+def _retrieve_new_task(project_id, limit=None):
     project = project_repo.get(project_id)
     if project is None:
         raise NotFound
@@ -127,7 +143,7 @@ def _retrieve_new_task(project_id):
         info = dict(
             error="This project does not allow anonymous contributors")
         error = model.task.Task(info=info)
-        return error
+        return error if limit is None else [error]
     if request.args.get('offset'):
         offset = int(request.args.get('offset'))
     else:
@@ -143,14 +159,24 @@ def _retrieve_new_task(project_id):
         user_id = fb_user.id    
     
     user_ip = request.remote_addr if current_user.is_anonymous() else None
+    if limit is not None:
+        return sched.new_tasks(project_id, project.info.get('sched'), user_id,
+                               user_ip, offset, limit)
     task = sched.new_task(project_id, project.info.get('sched'), user_id, user_ip, offset)
     return task
 
 def mark_task_as_requested_by_user(task, redis_conn):
+    mark_tasks_as_requested_by_user([task], redis_conn)
+
+
+def mark_tasks_as_requested_by_user(tasks, redis_conn):
     usr = get_user_id_or_ip()['user_id'] or get_user_id_or_ip()['user_ip']
-    key = 'pybossa:task_requested:user:%s:task:%s' % (usr, task.id)
     timeout = 60 * 60
-    redis_conn.setex(key, timeout, True)
+    pipe = redis_conn.pipeline()
+    for task in tasks:
+        key = 'pybossa:task_requested:user:%s:task:%s' % (usr, task.id)
+        pipe.setex(key, timeout, True)
+    pipe.execute()
 
 
 @jsonpify
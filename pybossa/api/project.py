@@ -44,7 +44,8 @@ class ProjectAPI(APIBase):
     """
 
     __class__ = Project
-    reserved_keys = set(['id', 'created', 'updated', 'completed', 'contacted'])
+    reserved_keys = set(['id', 'created', 'updated', 'updated_ts', 'completed',
+                         'contacted'])
 
     def _create_instance_from_request(self, data):
         inst = super(ProjectAPI, self)._create_instance_from_request(data)
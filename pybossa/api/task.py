@@ -32,7 +32,8 @@ class TaskAPI(APIBase):
     """Class for domain object Task."""
 
     __class__ = Task
-    reserved_keys = set(['id', 'created', 'state'])
+    reserved_keys = set(['id', 'created', 'created_ts', 'state',
+                         'n_task_runs', 'last_task_run_id'])
 
     def _forbidden_attributes(self, data):
         for key in data.keys():
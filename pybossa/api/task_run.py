@@ -37,7 +37,8 @@ class TaskRunAPI(APIBase):
     """Class API for domain object TaskRun."""
 
     __class__ = TaskRun
-    reserved_keys = set(['id', 'created', 'finish_time'])
+    reserved_keys = set(['id', 'created', 'created_ts', 'finish_time',
+                         'finish_time_ts'])
 
     def _update_object(self, taskrun):
         """Update task_run object with user id or ip."""
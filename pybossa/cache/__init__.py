@@ -24,17 +24,36 @@ It exports:
     * memoize: for caching functions using its arguments as part of the key
     * delete_cached: to remove a cached value
     * delete_memoized: to remove a cached value from the memoize decorator
+    * get_many: to get the memoized values of many calls at once
+    * invalidate_project: to invalidate the project scoped memoized values
+    * get_stats: to report the hit rate of every cache tier
+    * flush_stats: to add the hits and misses of this process to Redis
+    * warm: to recompute a cached value before it expires
+    * refresh_hot: to recompute the most accessed memoized values before
+      they expire
+    * prune_indexes: to remove the expired keys from the memoize indexes
+
+Values are stored in Redis and, if CACHE_LOCAL_ENABLED is set, also in an
+in-process LRU cache of every worker, which is kept up to date by
+publishing the deleted keys to the rest of workers.
+
+Expensive functions can be protected against cache stampedes with the
+single_flight, grace and early_refresh options of both decorators.
 
 """
 import os
+import json
+import math
+import time
+import random
 import hashlib
+import threading
+from collections import Counter
 from functools import wraps
 from pybossa.core import sentinel
-
-try:
-    import cPickle as pickle
-except ImportError:  # pragma: no cover
-    import pickle
+from pybossa.access_log import AccessLog
+from pybossa.cache.local import LocalCache
+from pybossa.cache.serializer import Serializer, FormatError, VERSION
 
 try:
     import settings_local as settings
@@ -47,6 +66,89 @@ ONE_HOUR = 60 * 60
 HALF_HOUR = 30 * 60
 FIVE_MINUTES = 5 * 60
 
+INVALIDATION_CHANNEL = '%s:invalidate' % settings.REDIS_KEYPREFIX
+
+# Values are stored under a prefix of their serialization format version,
+# so during a rolling deploy workers never read values in a format they do
+# not know, as the plain pickles of older versions
+KEY_PREFIX = '%s:v%d' % (settings.REDIS_KEYPREFIX, ord(VERSION))
+
+# The local tier keeps the serialized values, not the objects: callers
+# modify the values they get (e.g. add_custom_contrib_button_to sets the
+# contrib_button of the cached projects), so every hit must decode a copy
+if getattr(settings, 'CACHE_LOCAL_ENABLED', False):
+    local_cache = LocalCache(getattr(settings, 'CACHE_LOCAL_MAX_SIZE', 1000),
+                             getattr(settings, 'CACHE_LOCAL_TIMEOUT', 10))
+else:
+    local_cache = None
+
+LOCK_TIMEOUT = 60
+LOCK_WAIT = 0.05
+
+# Only delete the lock if it is still held by whom acquired it
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+serializer = Serializer(getattr(settings, 'CACHE_SERIALIZER', 'pickle'),
+                        getattr(settings, 'CACHE_COMPRESSION', None),
+                        getattr(settings, 'CACHE_COMPRESSION_THRESHOLD', 1024),
+                        check=getattr(settings, 'DEBUG', False))
+
+MISS = object()
+
+# Seconds a project scoped value is still served after being invalidated
+PROJECT_DEBOUNCE = getattr(settings, 'CACHE_PROJECT_DEBOUNCE', 0)
+
+# Values expiring later than this are not recomputed when warming the cache
+WARM_MIN_TTL = getattr(settings, 'CACHE_WARM_MIN_TTL', 10 * 60)
+# Nor values expiring later than this fraction of their timeout, so the ones
+# with a timeout shorter than the warming jobs interval are not recomputed
+# on every run
+WARM_TIMEOUT_FRACTION = 0.5
+
+# Fraction of the calls to memoized functions recorded by refresh_hot
+ACCESS_SAMPLE_RATE = getattr(settings, 'CACHE_ACCESS_SAMPLE_RATE', 0.01)
+ACCESS_KIND = 'cache'
+
+# Delete all the keys of an index, and the index, at once
+DELETE_INDEXED = """
+local keys = redis.call('smembers', KEYS[1])
+local deleted = 0
+for i = 1, #keys, 1000 do
+    deleted = deleted + redis.call('del', unpack(keys, i,
+                                                 math.min(i + 999, #keys)))
+end
+redis.call('del', KEYS[1])
+return deleted
+"""
+
+# Remove from an index the given keys that no longer exist
+PRUNE_INDEX = """
+local removed = 0
+for i, key in ipairs(ARGV) do
+    if redis.call('exists', key) == 0 then
+        removed = removed + redis.call('srem', KEYS[1], key)
+    end
+end
+return removed
+"""
+PRUNE_BATCH_SIZE = 1000
+
+# Hits and misses of every tier in this process, added to the ones of all
+# the processes in Redis every STATS_FLUSH_INTERVAL seconds
+STATS_KEY = '%s:cache:stats' % settings.REDIS_KEYPREFIX
+STATS_FLUSH_INTERVAL = 60
+
+stats = Counter()
+_unflushed = dict(stats=Counter(), at=time.time())
+_listener = dict(pid=None, lock=threading.Lock())
+# Memoized functions by name, to recompute the values of their calls
+_memoized = {}
+
 
 def get_key_to_hash(*args, **kwargs):
     """Return key to hash for *args and **kwargs."""
@@ -67,62 +169,562 @@ def get_hash_key(prefix, key_to_hash):
     return key
 
 
-def cache(key_prefix, timeout=300):
+def _memoize_key(function_name, *args, **kwargs):
+    """Return the key of a call to a memoized function."""
+    key = "%s:%s_args:" % (KEY_PREFIX, function_name)
+    key_to_hash = get_key_to_hash(*args, **kwargs)
+    return get_hash_key(key, key_to_hash)
+
+
+def _get(key):
+    """Return the stored value of key from the first tier that has it."""
+    if local_cache is not None:
+        _listen_for_invalidations()
+        output = local_cache.get(key)
+        if output is not None:
+            _count('local_hits')
+            return output
+        _count('local_misses')
+    output = sentinel.slave.get(key)
+    if output:
+        _count('redis_hits')
+        if local_cache is not None:
+            local_cache.set(key, output)
+    else:
+        _count('redis_misses')
+    return output
+
+
+def _count(name, n=1):
+    """Count n hits or misses of a tier, flushing the stats of this process
+    to Redis if they were last flushed STATS_FLUSH_INTERVAL seconds ago."""
+    stats[name] += n
+    _unflushed['stats'][name] += n
+    if time.time() - _unflushed['at'] >= STATS_FLUSH_INTERVAL:
+        flush_stats()
+
+
+def _lookup(key):
+    """Return the value of key, or MISS if missing or unreadable."""
+    output = _get(key)
+    if not output:
+        return MISS
+    try:
+        return serializer.loads(output)
+    except FormatError:
+        # Written by a newer version, so it is overwritten
+        return MISS
+
+
+def _record_access(function_name, args, kwargs):
+    """Record a call to a memoized function, if its arguments can be
+    stored as json."""
+    try:
+        member = json.dumps([function_name, args, kwargs], sort_keys=True)
+    except (TypeError, ValueError):
+        return
+    AccessLog(sentinel.master).record(ACCESS_KIND, member)
+
+
+def _index_key(function_name):
+    """Return the key of the set of memoized keys of a function."""
+    return "%s:%s_index" % (KEY_PREFIX, function_name)
+
+
+def _set(key, timeout, output, index=None, local=True):
+    """Store the value of key in every tier, and add key to index."""
+    if index is None:
+        sentinel.master.setex(key, timeout, output)
+    else:
+        pipe = sentinel.master.pipeline(transaction=False)
+        pipe.setex(key, timeout, output)
+        pipe.sadd(index, key)
+        # Keys expire in timeout, so the index lives as long as the last one
+        pipe.expire(index, timeout)
+        pipe.execute()
+    if local and local_cache is not None:
+        local_cache.set(key, output, timeout)
+
+
+def _generation_key(project_id):
+    """Return the key of the cache generation of a project."""
+    return "%s:project:%s:generation" % (settings.REDIS_KEYPREFIX, project_id)
+
+
+def _scoped_lookup(keys, project_ids):
+    """Return the values of project scoped keys and the generation of their
+    projects, read with a single MGET.
+
+    Values stored for an older generation are returned as MISS, unless
+    they were computed less than PROJECT_DEBOUNCE seconds ago, so the
+    invalidations of a busy project are coalesced.
+    """
+    outputs = sentinel.slave.mget(keys + [_generation_key(project_id)
+                                          for project_id in project_ids])
+    generations = [int(generation or 0)
+                   for generation in outputs[len(keys):]]
+    values = []
+    for output, generation in zip(outputs[:len(keys)], generations):
+        value = MISS
+        if output:
+            try:
+                value_generation, computed, value = serializer.loads(output)
+            except FormatError:
+                value_generation, computed = None, 0
+            if (value_generation != generation and
+                    time.time() - computed >= PROJECT_DEBOUNCE):
+                value = MISS
+        _count('redis_hits' if value is not MISS else 'redis_misses')
+        values.append(value)
+    return values, generations
+
+
+def _scoped_dumps(output, generation):
+    return serializer.dumps((generation, time.time(), output))
+
+
+def _invalidate(key, prefix=False):
+    """Drop key (or every key starting with it) from the local caches."""
+    if local_cache is None:
+        return
+    _evict(key + '*' if prefix else key)
+    sentinel.master.publish(INVALIDATION_CHANNEL, key + '*' if prefix else key)
+
+
+def _evict(message):
+    if message.endswith('*'):
+        local_cache.delete_prefix(message[:-1])
+    else:
+        local_cache.delete(message)
+
+
+def _listen_for_invalidations():
+    """Start, once per process, a thread evicting the keys other workers
+    publish as deleted."""
+    if _listener['pid'] == os.getpid():
+        return
+    with _listener['lock']:
+        if _listener['pid'] == os.getpid():
+            return
+        _listener['pid'] = os.getpid()
+        thread = threading.Thread(target=_invalidation_loop)
+        thread.daemon = True
+        thread.start()
+
+
+def _invalidation_loop():  # pragma: no cover
+    while True:
+        try:
+            pubsub = sentinel.master.pubsub()
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Keys deleted while not subscribed would never be evicted
+            local_cache.clear()
+            for message in pubsub.listen():
+                if message['type'] == 'message':
+                    _evict(message['data'])
+        except Exception:
+            time.sleep(1)
+
+
+def _acquire_lock(key):
+    """Return a token if the lock to recompute key is acquired, else None."""
+    token = os.urandom(8).encode('hex')
+    if sentinel.master.set(key + ':lock', token, nx=True, ex=LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release_lock(key, token):
+    sentinel.master.eval(RELEASE_LOCK, 1, key + ':lock', token)
+
+
+def _is_expired(expires, delta, early_refresh):
+    """Return True if a value must be recomputed.
+
+    With early_refresh, values are recomputed before they expire with a
+    probability that grows as the expiry approaches and with the time
+    (delta) they take to compute.
+    """
+    now = time.time()
+    if early_refresh:
+        now -= delta * early_refresh * math.log(1 - random.random())
+    return now >= expires
+
+
+def _compute(key, timeout, grace, f, args, kwargs, index=None):
+    """Call f and store its value with its expiry and computation time."""
+    start = time.time()
+    output = f(*args, **kwargs)
+    delta = time.time() - start
+    _set(key, timeout + grace,
+         serializer.dumps((time.time() + timeout, delta, output)), index)
+    return output
+
+
+def _cached_call(key, timeout, grace, early_refresh, f, args, kwargs,
+                 index=None):
+    """Return the value of f from the cache, recomputing it in one worker.
+
+    Values are kept grace seconds after they expire, so while a worker
+    recomputes them the rest keep serving the stale value. If there is no
+    value at all, the rest wait for it up to LOCK_TIMEOUT seconds.
+    """
+    output = _lookup(key)
+    if output is not MISS:
+        expires, delta, output = output
+        if not _is_expired(expires, delta, early_refresh):
+            return output
+        stale = True
+    else:
+        stale = False
+    token = _acquire_lock(key)
+    if token is None:
+        if stale:
+            return output
+        deadline = time.time() + LOCK_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(LOCK_WAIT)
+            output = sentinel.master.get(key)
+            if output:
+                try:
+                    return serializer.loads(output)[2]
+                except FormatError:
+                    # Written by a newer version, so it is recomputed
+                    break
+            if not sentinel.master.exists(key + ':lock'):
+                break
+        return _compute(key, timeout, grace, f, args, kwargs, index)
+    try:
+        return _compute(key, timeout, grace, f, args, kwargs, index)
+    finally:
+        _release_lock(key, token)
+
+
+def _protected_call(key, timeout, grace, early_refresh, f, args, kwargs,
+                    index=None):
+    if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
+        return _cached_call(key, timeout, grace, early_refresh, f, args,
+                            kwargs, index)
+    return _compute(key, timeout, grace, f, args, kwargs, index)
+
+
+def _scoped_call(key, timeout, project_id, f, args, kwargs, index):
+    if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
+        (output,), (generation,) = _scoped_lookup([key], [project_id])
+        if output is not MISS:
+            return output
+    else:
+        generation = int(sentinel.master.get(_generation_key(project_id))
+                         or 0)
+    output = f(*args, **kwargs)
+    _set(key, timeout, _scoped_dumps(output, generation), index, local=False)
+    return output
+
+
+def flush_stats():
+    """Add the hits and misses of this process not flushed yet to the ones
+    of all the processes in Redis."""
+    unflushed, _unflushed['stats'] = _unflushed['stats'], Counter()
+    _unflushed['at'] = time.time()
+    if not unflushed:
+        return
+    pipe = sentinel.master.pipeline(transaction=False)
+    for name, n in unflushed.iteritems():
+        pipe.hincrby(STATS_KEY, name, n)
+    pipe.execute()
+
+
+def get_stats(aggregated=False):
+    """Return the hits, misses and hit rate of every tier in this process,
+    or in all the processes, as last flushed to Redis, if aggregated."""
+    counts = stats
+    if aggregated:
+        flush_stats()
+        counts = Counter(dict((name, int(n)) for name, n in
+                              sentinel.master.hgetall(STATS_KEY).iteritems()))
+    report = {}
+    for tier in ('local', 'redis'):
+        hits = counts['%s_hits' % tier]
+        misses = counts['%s_misses' % tier]
+        total = hits + misses
+        report[tier] = dict(hits=hits, misses=misses,
+                            hit_rate=float(hits) / total if total else None)
+    return report
+
+
+def cache(key_prefix, timeout=300, single_flight=False, grace=0,
+          early_refresh=0):
     """
     Decorator for caching functions.
 
     Returns the function value from cache, or the function if cache disabled
 
+    With single_flight, only one worker recomputes the value when it is
+    missing or expired. With grace (seconds), expired values are served
+    while it does, and with early_refresh (usually 1, higher for sooner)
+    values are recomputed at random shortly before they expire.
+
     """
     if timeout is None:
         timeout = 300
+    protected = single_flight or grace or early_refresh
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            key = "%s::%s" % (settings.REDIS_KEYPREFIX, key_prefix)
+            key = "%s::%s" % (KEY_PREFIX, key_prefix)
+            if protected:
+                return _protected_call(key, timeout, grace, early_refresh,
+                                       f, args, kwargs)
             if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-                output = sentinel.slave.get(key)
-                if output:
-                    return pickle.loads(output)
+                output = _lookup(key)
+                if output is not MISS:
+                    return output
                 output = f(*args, **kwargs)
-                sentinel.master.setex(key, timeout, pickle.dumps(output))
+                _set(key, timeout, serializer.dumps(output))
                 return output
             output = f(*args, **kwargs)
-            sentinel.master.setex(key, timeout, pickle.dumps(output))
+            sentinel.master.setex(key, timeout, serializer.dumps(output))
             return output
+        wrapper.uncached = f
+        wrapper.key_prefix = key_prefix
+        wrapper.timeout = timeout
+        wrapper.grace = grace
+        wrapper.protected = protected
+        wrapper.project_scoped = False
         return wrapper
     return decorator
 
 
-def memoize(timeout=300):
+def memoize(timeout=300, single_flight=False, grace=0, early_refresh=0,
+            project_scoped=False):
     """
     Decorator for caching functions using its arguments as part of the key.
 
     Returns the cached value, or the function if the cache is disabled
 
+    The single_flight, grace and early_refresh options work as in cache.
+
+    Keys are added to an index of the function, so delete_memoized can
+    delete all of them without scanning the keyspace.
+
+    With project_scoped, the first argument of the function is a project id,
+    and values are stored with the cache generation of the project, so
+    invalidate_project invalidates all of them at once. They are not kept
+    in the in-process tier.
+
     """
     if timeout is None:
         timeout = 300
+    protected = single_flight or grace or early_refresh
+    if protected and project_scoped:
+        raise ValueError('Project scoped values cannot be protected')
     def decorator(f):
+        index = _index_key(f.__name__)
         @wraps(f)
         def wrapper(*args, **kwargs):
-            key = "%s:%s_args:" % (settings.REDIS_KEYPREFIX, f.__name__)
-            key_to_hash = get_key_to_hash(*args, **kwargs)
-            key = get_hash_key(key, key_to_hash)
+            key = _memoize_key(f.__name__, *args, **kwargs)
+            if (random.random() < ACCESS_SAMPLE_RATE and
+                    os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None):
+                _record_access(f.__name__, args, kwargs)
+            if project_scoped:
+                project_id = args[0] if args else kwargs['project_id']
+                return _scoped_call(key, timeout, project_id, f, args,
+                                    kwargs, index)
+            if protected:
+                return _protected_call(key, timeout, grace, early_refresh,
+                                       f, args, kwargs, index)
             if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-                output = sentinel.slave.get(key)
-                if output:
-                    return pickle.loads(output)
+                output = _lookup(key)
+                if output is not MISS:
+                    return output
                 output = f(*args, **kwargs)
-                sentinel.master.setex(key, timeout, pickle.dumps(output))
+                _set(key, timeout, serializer.dumps(output), index)
                 return output
             output = f(*args, **kwargs)
-            sentinel.master.setex(key, timeout, pickle.dumps(output))
+            _set(key, timeout, serializer.dumps(output), index)
             return output
+        wrapper.uncached = f
+        wrapper.timeout = timeout
+        wrapper.grace = grace
+        wrapper.protected = protected
+        wrapper.project_scoped = project_scoped
+        _memoized[f.__name__] = wrapper
         return wrapper
     return decorator
 
 
+def _lookup_many(keys):
+    """Return the values of keys, reading the ones missing in the
+    in-process tier with a single MGET."""
+    outputs = [None] * len(keys)
+    if local_cache is not None:
+        _listen_for_invalidations()
+        outputs = [local_cache.get(key) for key in keys]
+        _count('local_hits', len([o for o in outputs if o is not None]))
+        _count('local_misses', len([o for o in outputs if o is None]))
+    pending = [i for i, output in enumerate(outputs) if output is None]
+    if pending:
+        values = sentinel.slave.mget([keys[i] for i in pending])
+        for i, value in zip(pending, values):
+            if value:
+                outputs[i] = value
+                if local_cache is not None:
+                    local_cache.set(keys[i], value)
+        _count('redis_hits', len([v for v in values if v]))
+        _count('redis_misses', len([v for v in values if not v]))
+    results = []
+    for output in outputs:
+        try:
+            results.append(serializer.loads(output) if output else MISS)
+        except FormatError:
+            results.append(MISS)
+    return results
+
+
+def get_many(function, args_list, compute=None):
+    """
+    Return the values of a memoized function for a list of argument tuples.
+
+    Values are read with a single MGET. The missing ones are computed with
+    compute, which gets the list of their argument tuples and returns their
+    values in the same order (or else calling function for each of them),
+    and stored with a single pipeline.
+
+    """
+    args_list = [tuple(args) for args in args_list]
+    if (os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is not None or
+            function.protected):
+        return [function(*args) for args in args_list]
+    keys = [_memoize_key(function.__name__, *args) for args in args_list]
+    if function.project_scoped:
+        results, generations = _scoped_lookup(keys, [args[0] for args in
+                                                     args_list])
+    else:
+        results = _lookup_many(keys)
+    misses = [i for i, result in enumerate(results) if result is MISS]
+    if not misses:
+        return results
+    if compute is not None:
+        values = compute([args_list[i] for i in misses])
+    else:
+        values = [function.uncached(*args_list[i]) for i in misses]
+    index = _index_key(function.__name__)
+    pipe = sentinel.master.pipeline(transaction=False)
+    for i, value in zip(misses, values):
+        results[i] = value
+        if function.project_scoped:
+            output = _scoped_dumps(value, generations[i])
+        else:
+            output = serializer.dumps(value)
+            if local_cache is not None:
+                local_cache.set(keys[i], output, function.timeout)
+        pipe.setex(keys[i], function.timeout, output)
+        pipe.sadd(index, keys[i])
+    pipe.expire(index, function.timeout)
+    pipe.execute()
+    return results
+
+
+def warm(function, *args, **kwargs):
+    """
+    Compute and store the value of a call to a cached or memoized function,
+    unless it is fresh: it does not expire in the next WARM_MIN_TTL seconds
+    (or WARM_TIMEOUT_FRACTION of its timeout, if less) and, if project
+    scoped, it is for the current generation of the project.
+
+    Returns True if the value was computed.
+
+    """
+    if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is not None:
+        return False
+    if hasattr(function, 'key_prefix'):
+        key = "%s::%s" % (KEY_PREFIX, function.key_prefix)
+        index = None
+    else:
+        key = _memoize_key(function.__name__, *args, **kwargs)
+        index = _index_key(function.__name__)
+    pipe = sentinel.master.pipeline(transaction=False)
+    pipe.ttl(key)
+    if function.project_scoped:
+        project_id = args[0] if args else kwargs['project_id']
+        pipe.get(key)
+        pipe.get(_generation_key(project_id))
+    results = pipe.execute()
+    # Protected values are kept grace seconds after they expire
+    min_ttl = min(WARM_MIN_TTL, function.timeout * WARM_TIMEOUT_FRACTION)
+    fresh = (results[0] or 0) - function.grace > min_ttl
+    if function.project_scoped:
+        generation = int(results[2] or 0)
+        try:
+            fresh = fresh and serializer.loads(results[1])[0] == generation
+        except (TypeError, FormatError):
+            fresh = False
+    if fresh:
+        return False
+    if function.project_scoped:
+        output = function.uncached(*args, **kwargs)
+        _set(key, function.timeout, _scoped_dumps(output, generation), index,
+             local=False)
+    elif function.protected:
+        _compute(key, function.timeout, function.grace, function.uncached,
+                 args, kwargs, index)
+    else:
+        output = function.uncached(*args, **kwargs)
+        _set(key, function.timeout, serializer.dumps(output), index)
+    _invalidate(key)
+    return True
+
+
+def refresh_hot(n):
+    """
+    Recompute the values of the n most accessed memoized calls, if they are
+    about to expire (see warm), so they are never missed. The rest are left
+    to expire.
+
+    Access counts are decayed afterwards, so calls not accessed for long
+    are forgotten.
+
+    Returns the number of values recomputed.
+
+    """
+    access_log = AccessLog(sentinel.master)
+    refreshed = 0
+    for member in access_log.top(ACCESS_KIND, n):
+        function_name, args, kwargs = json.loads(member)
+        function = _memoized.get(function_name)
+        if function is not None:
+            refreshed += warm(function, *args, **kwargs)
+    access_log.decay(ACCESS_KIND)
+    return refreshed
+
+
+def prune_indexes():
+    """
+    Remove from the indexes of the memoized functions the keys that have
+    expired, as they are only removed when deleted. Otherwise the index of
+    a function called with many different arguments (e.g. per user) would
+    grow without bound.
+
+    Indexes are scanned in batches, so Redis is not blocked while pruning.
+
+    Returns the number of keys removed.
+
+    """
+    removed = 0
+    for function_name in _memoized:
+        index = _index_key(function_name)
+        cursor = 0
+        while True:
+            cursor, keys = sentinel.master.sscan(index, cursor,
+                                                 count=PRUNE_BATCH_SIZE)
+            if keys:
+                removed += sentinel.master.eval(PRUNE_INDEX, 1, index,
+                                                *keys)
+            if int(cursor) == 0:
+                break
+    return removed
+
+
 def delete_cached(key):
     """
     Delete a cached value from the cache.
@@ -131,8 +733,22 @@ def delete_cached(key):
 
     """
     if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-        key = "%s::%s" % (settings.REDIS_KEYPREFIX, key)
-        return bool(sentinel.master.delete(key))
+        key = "%s::%s" % (KEY_PREFIX, key)
+        deleted = bool(sentinel.master.delete(key))
+        _invalidate(key)
+        return deleted
+    return True
+
+
+def invalidate_project(project_id):
+    """
+    Invalidate all the project scoped memoized values of a project.
+
+    Returns True if success or no cache is enabled
+
+    """
+    if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
+        sentinel.master.incr(_generation_key(project_id))
     return True
 
 
@@ -144,13 +760,17 @@ def delete_memoized(function, *args, **kwargs):
 
     """
     if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-        key = "%s:%s_args:" % (settings.REDIS_KEYPREFIX, function.__name__)
+        key = "%s:%s_args:" % (KEY_PREFIX, function.__name__)
+        index = _index_key(function.__name__)
         if args or kwargs:
-            key_to_hash = get_key_to_hash(*args, **kwargs)
-            key = get_hash_key(key, key_to_hash)
-            return bool(sentinel.master.delete(key))
-        keys_to_delete = sentinel.slave.keys(pattern=key + '*')
-        if not keys_to_delete:
-            return False
-        return bool(sentinel.master.delete(*keys_to_delete))
+            key = _memoize_key(function.__name__, *args, **kwargs)
+            pipe = sentinel.master.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.srem(index, key)
+            deleted = bool(pipe.execute()[0])
+            _invalidate(key)
+            return deleted
+        deleted = sentinel.master.eval(DELETE_INDEXED, 1, index)
+        _invalidate(key, prefix=True)
+        return bool(deleted)
     return True
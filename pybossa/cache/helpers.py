@@ -21,6 +21,7 @@ from sqlalchemy.sql import text
 from pybossa.core import db
 from pybossa.cache import memoize, ONE_HOUR
 from pybossa.cache.projects import overall_progress
+from pybossa.sched import get_answered_task_ids
 
 
 session = db.slave_session
@@ -33,25 +34,17 @@ def n_available_tasks(project_id, user_id=None, user_ip=None):
     based on the completion of the project tasks, and previous task_runs
     submitted by the user.
     """
-    if user_id and not user_ip:
-        query = text('''SELECT COUNT(id) AS n_tasks FROM task WHERE NOT EXISTS
-                       (SELECT task_id FROM task_run WHERE
-                       project_id=:project_id AND user_id=:user_id
-                       AND task_id=task.id)
-                       AND project_id=:project_id AND state !='completed';''')
-        result = session.execute(query, dict(project_id=project_id,
-                                             user_id=user_id))
-    else:
-        if not user_ip:
-            user_ip = '127.0.0.1'
-        query = text('''SELECT COUNT(id) AS n_tasks FROM task WHERE NOT EXISTS
-                       (SELECT task_id FROM task_run WHERE
-                       project_id=:project_id AND user_ip=:user_ip
-                       AND task_id=task.id)
-                       AND project_id=:project_id AND state !='completed';''')
-
-        result = session.execute(query, dict(project_id=project_id,
-                                             user_ip=user_ip))
+    answered = get_answered_task_ids(project_id, user_id, user_ip)
+    # The answered tasks still open are looked up by primary key, instead
+    # of checking every open task against the whole answered array
+    query = text('''SELECT
+                   (SELECT COUNT(id) FROM task
+                    WHERE project_id=:project_id AND state !='completed') -
+                   (SELECT COUNT(id) FROM task WHERE id = ANY(:answered)
+                    AND project_id=:project_id AND state !='completed')
+                   AS n_tasks;''')
+    result = session.execute(query, dict(project_id=project_id,
+                                         answered=list(answered)))
     n_tasks = 0
     for row in result:
         n_tasks = row.n_tasks
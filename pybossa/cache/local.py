@@ -0,0 +1,78 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""In-process LRU cache used as a first tier in front of Redis."""
+import time
+import threading
+from collections import OrderedDict
+
+
+class LocalCache(object):
+
+    """Size bounded LRU cache of the values of a worker process.
+
+    Every entry expires after at most ttl seconds, so a value changed by
+    another worker is never served for longer than that, even if the
+    invalidation message is lost.
+    """
+
+    def __init__(self, max_size=1000, ttl=10):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value of key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                return None
+            # Most recently used entries are kept at the end
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value for at most ttl (or timeout, if lower) seconds."""
+        ttl = self.ttl if timeout is None else min(timeout, self.ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Drop the value of key."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        """Drop the values of all the keys starting with prefix."""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop all the values."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
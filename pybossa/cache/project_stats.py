@@ -19,7 +19,8 @@
 from flask import current_app
 from sqlalchemy.sql import text
 from pybossa.core import db
-from pybossa.cache import memoize, ONE_DAY
+from pybossa.cache import memoize, ONE_DAY, ONE_HOUR
+from pybossa.model.project_activity import ProjectActivity
 
 import pygeoip
 import operator
@@ -30,11 +31,10 @@ import datetime
 session = db.slave_session
 
 
-@memoize(timeout=ONE_DAY)
 def n_tasks(project_id):
     """Return number of tasks of project.
 
-    Data is cached for one day.
+    Read from the counters of the project, so it is always up to date.
     """
     from pybossa.cache import projects
     return projects.n_tasks(project_id)
@@ -47,50 +47,31 @@ def stats_users(project_id):
     auth_users = []
     anon_users = []
 
-    # Get Authenticated Users
+    # Get the answers of every user, authenticated or anonymous, at once
     sql = text('''SELECT task_run.user_id AS user_id,
+               task_run.user_ip AS user_ip,
                COUNT(task_run.id) as n_tasks FROM task_run
-               WHERE task_run.user_id IS NOT NULL AND
-               task_run.user_ip IS NULL AND
-               task_run.project_id=:project_id
-               GROUP BY task_run.user_id ORDER BY n_tasks DESC
-               LIMIT 5;''')
-    results = session.execute(sql, dict(project_id=project_id))
-
-    for row in results:
-        auth_users.append([row.user_id, row.n_tasks])
-
-    sql = text('''SELECT count(distinct(task_run.user_id)) AS user_id
-               FROM task_run WHERE task_run.user_id IS NOT NULL AND
-               task_run.user_ip IS NULL AND
-               task_run.project_id=:project_id;''')
-
-    results = session.execute(sql, dict(project_id=project_id))
-    for row in results:
-        users['n_auth'] = row[0]
-
-    # Get all Anonymous Users
-    sql = text('''SELECT task_run.user_ip AS user_ip,
-               COUNT(task_run.id) as n_tasks FROM task_run
-               WHERE task_run.user_ip IS NOT NULL AND
-               task_run.user_id IS NULL AND
-               task_run.project_id=:project_id
-               GROUP BY task_run.user_ip ORDER BY n_tasks DESC;''')\
+               WHERE task_run.project_id=:project_id AND
+               ((task_run.user_id IS NOT NULL AND task_run.user_ip IS NULL)
+               OR (task_run.user_ip IS NOT NULL AND task_run.user_id IS NULL))
+               GROUP BY task_run.user_id, task_run.user_ip
+               ORDER BY n_tasks DESC;''')\
         .execution_options(stream=True)
     results = session.execute(sql, dict(project_id=project_id))
 
+    n_auth = 0
     for row in results:
-        anon_users.append([row.user_ip, row.n_tasks])
-
-    sql = text('''SELECT COUNT(DISTINCT(task_run.user_ip)) AS user_ip
-               FROM task_run WHERE task_run.user_ip IS NOT NULL AND
-               task_run.user_id IS NULL AND
-               task_run.project_id=:project_id;''')
-
-    results = session.execute(sql, dict(project_id=project_id))
+        if row.user_id is not None:
+            n_auth += 1
+            if len(auth_users) < 5:
+                auth_users.append([row.user_id, row.n_tasks])
+        else:
+            anon_users.append([row.user_ip, row.n_tasks])
 
-    for row in results:
-        users['n_anon'] = row[0]
+    # All the users have just been listed, so there is no need to count
+    # them again
+    users['n_auth'] = n_auth
+    users['n_anon'] = len(anon_users)
 
     return users, anon_users, auth_users
 
@@ -104,34 +85,55 @@ def stats_dates(project_id):
 
     n_tasks(project_id)
 
-    # Get all completed tasks
+    # Get the answers and completed tasks per date, from the activity of
+    # the project and its task runs not folded in yet
     sql = text('''
-            WITH answers AS (
-             SELECT
-             TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-             AS day, task.id, task.n_answers AS n_answers,
-             COUNT(task_run.id) AS day_answers
-             FROM task_run, task WHERE task_run.project_id=:project_id
-             AND task.id=task_run.task_id AND
-             TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US') >= NOW()
-               - '2 week':: INTERVAL GROUP BY day, task.id)
-            SELECT to_char(day_of_completion, 'YYYY-MM-DD') AS day,
-               COUNT(task_id) AS completed_tasks FROM (
-                SELECT MIN(day) AS day_of_completion, task_id FROM (
-                    SELECT ans1.day, ans1.id as task_id,
-                    floor(avg(ans1.n_answers)) AS n_answers,
-                    sum(ans2.day_answers) AS accum_answers
-                    FROM answers AS ans1 INNER JOIN answers AS ans2
-                    ON ans1.id=ans2.id WHERE ans1.day >= ans2.day
-                    GROUP BY ans1.id, ans1.day) AS answers_day_task
-                WHERE n_answers <= accum_answers
-                GROUP BY task_id) AS completed_tasks_by_day
-            GROUP BY day;
+               WITH mark AS (
+                SELECT COALESCE(MAX(last_id), 0) AS last_id FROM rollup_mark
+                WHERE name=:name),
+               tail AS (
+                SELECT id, task_id, user_id, user_ip, finish_time_ts
+                FROM task_run
+                WHERE project_id=:project_id AND finish_time_ts IS NOT NULL
+                AND id > (SELECT last_id FROM mark)),
+               completions AS (
+                SELECT numbered.finish_time_ts FROM (
+                    SELECT task_run.id, task_run.task_id,
+                    task_run.finish_time_ts,
+                    ROW_NUMBER() OVER (PARTITION BY task_run.task_id
+                                       ORDER BY task_run.id) AS n
+                    FROM task_run
+                    WHERE task_run.task_id IN (SELECT task_id FROM tail))
+                    AS numbered
+                JOIN task ON task.id=numbered.task_id
+                WHERE numbered.id > (SELECT last_id FROM mark)
+                AND numbered.n=task.n_answers),
+               activity AS (
+                SELECT day, n_auth, n_anon, n_completed
+                FROM project_activity WHERE project_id=:project_id
+                UNION ALL
+                SELECT finish_time_ts::date,
+                CASE WHEN user_ip IS NULL THEN 1 ELSE 0 END,
+                CASE WHEN user_id IS NULL THEN 1 ELSE 0 END, 0 FROM tail
+                UNION ALL
+                SELECT finish_time_ts::date, 0, 0, 1 FROM completions)
+               SELECT to_char(day, 'YYYY-MM-DD') AS d, SUM(n_auth) AS n_auth,
+               SUM(n_anon) AS n_anon, SUM(n_completed) AS n_completed
+               FROM activity GROUP BY day;
                ''').execution_options(stream=True)
 
-    results = session.execute(sql, dict(project_id=project_id))
+    # Only the tasks completed in the last two weeks are shown
+    since = datetime.datetime.utcnow() - datetime.timedelta(weeks=2)
+    since = since.strftime('%Y-%m-%d')
+    results = session.execute(sql, dict(project_id=project_id,
+                                        name=ProjectActivity.__tablename__))
     for row in results:
-        dates[row.day] = row.completed_tasks
+        if row.n_completed and row.d > since:
+            dates[row.d] = row.n_completed
+        if row.n_auth:
+            dates_auth[row.d] = row.n_auth
+        if row.n_anon:
+            dates_anon[row.d] = row.n_anon
 
     # No completed tasks in the last 15 days
     if len(dates.keys()) == 0:
@@ -140,34 +142,6 @@ def stats_dates(project_id):
             tmp_date = base - datetime.timedelta(days=x)
             dates[tmp_date.strftime('%Y-%m-%d')] = 0
 
-    # Get all answers per date for auth
-    sql = text('''
-                WITH myquery AS (
-                    SELECT TO_DATE(finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    as d, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL GROUP BY d)
-                SELECT to_char(d, 'YYYY-MM-DD') as d, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-    for row in results:
-        dates_auth[row.d] = row.count
-
-    # Get all answers per date for anon
-    sql = text('''
-                WITH myquery AS (
-                    SELECT TO_DATE(finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    as d, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL GROUP BY d)
-               SELECT to_char(d, 'YYYY-MM-DD') as d, count  from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-    for row in results:
-        dates_anon[row.d] = row.count
-
     return dates, dates_anon, dates_auth
 
 
@@ -187,108 +161,40 @@ def stats_hours(project_id):
         hours_anon[str(i).zfill(2)] = 0
         hours_auth[str(i).zfill(2)] = 0
 
-    # Get hour stats for all users
+    # Get hour stats for all, Anonymous and Auth users at once, from the
+    # activity of the project and its task runs not folded in yet
     sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id GROUP BY h)
-               SELECT h, count from myquery;
+               WITH mark AS (
+                SELECT COALESCE(MAX(last_id), 0) AS last_id FROM rollup_mark
+                WHERE name=:name),
+               activity AS (
+                SELECT hour, n_answers, n_anon, n_auth
+                FROM project_activity WHERE project_id=:project_id
+                UNION ALL
+                SELECT EXTRACT(HOUR FROM finish_time_ts)::integer, 1,
+                CASE WHEN user_id IS NULL THEN 1 ELSE 0 END,
+                CASE WHEN user_ip IS NULL THEN 1 ELSE 0 END
+                FROM task_run WHERE project_id=:project_id
+                AND finish_time_ts IS NOT NULL
+                AND id > (SELECT last_id FROM mark))
+               SELECT hour, SUM(n_answers) AS n_all, SUM(n_anon) AS n_anon,
+               SUM(n_auth) AS n_auth FROM activity GROUP BY hour;
                ''').execution_options(stream=True)
 
-    results = session.execute(sql, dict(project_id=project_id))
+    results = session.execute(sql, dict(project_id=project_id,
+                                        name=ProjectActivity.__tablename__))
 
     for row in results:
-        hours[row.h] = row.count
+        h = str(row.hour).zfill(2)
+        hours[h] = row.n_all
+        hours_anon[h] = row.n_anon
+        hours_auth[h] = row.n_auth
 
-    # Get maximum stats for all users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-    for row in results:
-        max_hours = row.max
-
-    # Get hour stats for Anonymous users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-
-    for row in results:
-        hours_anon[row.h] = row.count
-
-    # Get maximum stats for Anonymous users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-    for row in results:
-        max_hours_anon = row.max
-
-    # Get hour stats for Auth users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-
-    for row in results:
-        hours_auth[row.h] = row.count
-
-    # Get hour stats for Anon users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, dict(project_id=project_id))
-    for row in results:
-        max_hours_auth = row.max
+    # Hours without answers are not taken into account, so the maximum is
+    # None if there are no answers, as it was with MAX in SQL
+    max_hours = max(hours.values()) or None
+    max_hours_anon = max(hours_anon.values()) or None
+    max_hours_auth = max(hours_auth.values()) or None
 
     return hours, hours_anon, hours_auth, max_hours, max_hours_anon, \
         max_hours_auth
@@ -441,7 +347,7 @@ def stats_format_users(project_id, users, anon_users, auth_users, geo=False):
                 n_anon=users['n_anon'], n_auth=users['n_auth'])
 
 
-@memoize(timeout=ONE_DAY)
+@memoize(timeout=ONE_DAY, grace=ONE_HOUR)
 def get_stats(project_id, geo=False):
     """Return the stats of a given project."""
     hours, hours_anon, hours_auth, max_hours, \
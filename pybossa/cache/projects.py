@@ -16,16 +16,23 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 """Cache module for projects."""
+from flask import current_app
 from sqlalchemy.sql import text
-from pybossa.core import db, timeouts
+from pybossa.core import db, timeouts, sentinel
 from pybossa.model.project import Project
 from pybossa.util import pretty_date
-from pybossa.cache import memoize, cache, delete_memoized, delete_cached
+from pybossa.cache import (memoize, cache, delete_memoized, delete_cached,
+                           get_many, invalidate_project)
+from pybossa.project_counters import ProjectCounters
+from pybossa.project_volunteers import ProjectVolunteers
 
+import os
 import json
 
 
 session = db.slave_session
+project_counters = ProjectCounters(sentinel.master)
+project_volunteers = ProjectVolunteers(sentinel.slave)
 
 
 @memoize(timeout=timeouts.get('APP_TIMEOUT'))
@@ -56,7 +63,8 @@ def get_top(n=4):
     return top_projects
 
 
-@memoize(timeout=timeouts.get('BROWSE_TASKS_TIMEOUT'))
+@memoize(timeout=timeouts.get('BROWSE_TASKS_TIMEOUT'),
+         project_scoped=True)
 def browse_tasks(project_id):
     """Cache browse tasks view for a project."""
     sql = text('''
@@ -85,34 +93,71 @@ def _pct_status(n_task_runs, n_answers):
     return float(0)
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+def count_counters(project_ids):
+    """Return the number of tasks, completed tasks and task runs of many
+    projects, counting them in the DB.
+
+    They are counted in the master, as the counters are kept in Redis from
+    then on, and a lagging replica would leave them behind for good.
+    """
+    sql = text('''
+               WITH task_runs AS (
+               SELECT project_id, COUNT(id) AS n_task_runs FROM task_run
+               WHERE project_id = ANY(:project_ids) GROUP BY project_id)
+               SELECT task.project_id, COUNT(task.id) AS n_tasks,
+               COUNT(CASE WHEN task.state=\'completed\' THEN 1 END)
+               AS n_completed_tasks,
+               COALESCE(MAX(task_runs.n_task_runs), 0) AS n_task_runs
+               FROM task LEFT JOIN task_runs
+               ON task.project_id=task_runs.project_id
+               WHERE task.project_id = ANY(:project_ids)
+               GROUP BY task.project_id''')
+    results = db.session.execute(sql, dict(project_ids=project_ids))
+    counters = {}
+    for row in results:
+        counters[row.project_id] = dict(n_tasks=row.n_tasks,
+                                        n_completed_tasks=row.n_completed_tasks,
+                                        n_task_runs=row.n_task_runs)
+    empty = dict(n_tasks=0, n_completed_tasks=0, n_task_runs=0)
+    return [counters.get(project_id, empty) for project_id in project_ids]
+
+
+def _counters_many(project_ids):
+    """Return the counters of many projects, loading the missing ones."""
+    if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is not None:
+        return count_counters(project_ids)
+    counters = project_counters.get_many(project_ids)
+    missing = [project_id for project_id, values
+               in zip(project_ids, counters) if values is None]
+    if missing:
+        loaded = dict(zip(missing, count_counters(missing)))
+        project_counters.load(loaded)
+        counters = [values if values is not None else loaded[project_id]
+                    for project_id, values in zip(project_ids, counters)]
+    return counters
+
+
+def _progress(counters):
+    if counters['n_tasks'] != 0:
+        return (counters['n_completed_tasks'] * 100) / counters['n_tasks']
+    return 0
+
+
 def n_tasks(project_id):
     """Return number of tasks of a project."""
-    sql = text('''SELECT COUNT(task.id) AS n_tasks FROM task
-                  WHERE task.project_id=:project_id''')
-    results = session.execute(sql, dict(project_id=project_id))
-    n_tasks = 0
-    for row in results:
-        n_tasks = row.n_tasks
-    return n_tasks
+    return _counters_many([project_id])[0]['n_tasks']
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
 def n_completed_tasks(project_id):
     """Return number of completed tasks of a project."""
-    sql = text('''SELECT COUNT(task.id) AS n_completed_tasks FROM task
-                WHERE task.project_id=:project_id AND task.state=\'completed\';''')
-
-    results = session.execute(sql, dict(project_id=project_id))
-    n_completed_tasks = 0
-    for row in results:
-        n_completed_tasks = row.n_completed_tasks
-    return n_completed_tasks
+    return _counters_many([project_id])[0]['n_completed_tasks']
 
 
-@memoize(timeout=timeouts.get('REGISTERED_USERS_TIMEOUT'))
-def n_registered_volunteers(project_id):
-    """Return number of registered users that have participated in a project."""
+@memoize(timeout=timeouts.get('REGISTERED_USERS_TIMEOUT'),
+         project_scoped=True)
+def _n_registered_volunteers_exact(project_id):
+    """Return number of registered users that have participated in a project,
+    counting them in the DB."""
     sql = text('''SELECT COUNT(DISTINCT(task_run.user_id))
                AS n_registered_volunteers FROM task_run
                WHERE task_run.user_id IS NOT NULL AND
@@ -126,9 +171,11 @@ def n_registered_volunteers(project_id):
     return n_registered_volunteers
 
 
-@memoize(timeout=timeouts.get('ANON_USERS_TIMEOUT'))
-def n_anonymous_volunteers(project_id):
-    """Return number of anonymous users that have participated in a project."""
+@memoize(timeout=timeouts.get('ANON_USERS_TIMEOUT'),
+         project_scoped=True)
+def _n_anonymous_volunteers_exact(project_id):
+    """Return number of anonymous users that have participated in a project,
+    counting them in the DB."""
     sql = text('''SELECT COUNT(DISTINCT(task_run.user_ip))
                AS n_anonymous_volunteers FROM task_run
                WHERE task_run.user_ip IS NOT NULL AND
@@ -142,36 +189,56 @@ def n_anonymous_volunteers(project_id):
     return n_anonymous_volunteers
 
 
+def _volunteers_many(project_ids):
+    """Return dicts with the registered and anonymous volunteers of many
+    projects, approximated with their HyperLogLog sketches if they have
+    been backfilled, or counted in the DB otherwise."""
+    counts = [None] * len(project_ids)
+    if (os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None and
+            not current_app.config.get('EXACT_VOLUNTEER_COUNTS')):
+        counts = project_volunteers.count_many(project_ids)
+    args_list = [(project_id,) for project_id, count
+                 in zip(project_ids, counts) if count is None]
+    if args_list:
+        registered = get_many(_n_registered_volunteers_exact, args_list,
+                              _n_registered_volunteers_many)
+        anonymous = get_many(_n_anonymous_volunteers_exact, args_list,
+                             _n_anonymous_volunteers_many)
+        exact = iter(dict(registered=r, anonymous=a)
+                     for r, a in zip(registered, anonymous))
+        counts = [count if count is not None else next(exact)
+                  for count in counts]
+    return counts
+
+
+def n_registered_volunteers(project_id):
+    """Return number of registered users that have participated in a project."""
+    return _volunteers_many([project_id])[0]['registered']
+
+
+def n_anonymous_volunteers(project_id):
+    """Return number of anonymous users that have participated in a project."""
+    return _volunteers_many([project_id])[0]['anonymous']
+
+
 def n_volunteers(project_id):
     """Return total number of volunteers of a project."""
-    total = (n_anonymous_volunteers(project_id) +
-             n_registered_volunteers(project_id))
-    return total
+    counts = _volunteers_many([project_id])[0]
+    return counts['anonymous'] + counts['registered']
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
 def n_task_runs(project_id):
     """Return number of task_runs of a project."""
-    sql = text('''SELECT COUNT(task_run.id) AS n_task_runs FROM task_run
-                  WHERE task_run.project_id=:project_id''')
+    return _counters_many([project_id])[0]['n_task_runs']
 
-    results = session.execute(sql, dict(project_id=project_id))
-    n_task_runs = 0
-    for row in results:
-        n_task_runs = row.n_task_runs
-    return n_task_runs
 
-
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
 def overall_progress(project_id):
     """Return the percentage of completed tasks for a project."""
-    if n_tasks(project_id) != 0:
-        return ((n_completed_tasks(project_id) * 100) / n_tasks(project_id))
-    else:
-        return 0
+    return _progress(_counters_many([project_id])[0])
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@memoize(timeout=timeouts.get('APP_TIMEOUT'),
+         project_scoped=True)
 def last_activity(project_id):
     """Return last activity, date, from a project."""
     sql = text('''SELECT finish_time FROM task_run WHERE project_id=:project_id
@@ -185,6 +252,55 @@ def last_activity(project_id):
             return None
 
 
+def _count_many(sql, args_list):
+    """Return the counts of sql, grouped by project_id, for many projects."""
+    project_ids = [args[0] for args in args_list]
+    results = session.execute(sql, dict(project_ids=project_ids))
+    counts = dict((row.project_id, row.count) for row in results)
+    return [counts.get(project_id, 0) for project_id in project_ids]
+
+
+def _n_registered_volunteers_many(args_list):
+    sql = text('''SELECT project_id, COUNT(DISTINCT(user_id)) AS count
+                  FROM task_run WHERE user_id IS NOT NULL
+                  AND user_ip IS NULL AND project_id = ANY(:project_ids)
+                  GROUP BY project_id''')
+    return _count_many(sql, args_list)
+
+
+def _n_anonymous_volunteers_many(args_list):
+    sql = text('''SELECT project_id, COUNT(DISTINCT(user_ip)) AS count
+                  FROM task_run WHERE user_ip IS NOT NULL
+                  AND user_id IS NULL AND project_id = ANY(:project_ids)
+                  GROUP BY project_id''')
+    return _count_many(sql, args_list)
+
+
+def _last_activity_many(args_list):
+    project_ids = [args[0] for args in args_list]
+    sql = text('''SELECT DISTINCT ON (project_id) project_id, finish_time
+               FROM task_run WHERE project_id = ANY(:project_ids)
+               ORDER BY project_id, finish_time DESC''')
+    results = session.execute(sql, dict(project_ids=project_ids))
+    last = dict((row.project_id, row.finish_time) for row in results)
+    return [last.get(project_id) for project_id in project_ids]
+
+
+def _stats_many(project_ids):
+    """Return last_activity, overall_progress, n_tasks and n_volunteers of
+    many projects, reading the cached values and counters (and computing
+    the missing ones) in batch."""
+    args_list = [(project_id,) for project_id in project_ids]
+    activity = get_many(last_activity, args_list, _last_activity_many)
+    counters = _counters_many(project_ids)
+    progress = [_progress(values) for values in counters]
+    tasks = [values['n_tasks'] for values in counters]
+    volunteers = [counts['anonymous'] + counts['registered']
+                  for counts in _volunteers_many(project_ids)]
+    return dict((project_id, stats) for project_id, stats in
+                zip(project_ids, zip(activity, progress, tasks, volunteers)))
+
+
 # This function does not change too much, so cache it for a longer time
 @cache(timeout=timeouts.get('STATS_FRONTPAGE_TIMEOUT'),
        key_prefix="number_featured_projects")
@@ -208,18 +324,20 @@ def get_all_featured(category=None):
                WHERE project.featured=true AND project.hidden=0
                AND "user".id=project.owner_id GROUP BY project.id, "user".id;''')
 
-    results = session.execute(sql)
+    results = session.execute(sql).fetchall()
+    stats = _stats_many([row.id for row in results])
     projects = []
     for row in results:
+        activity, progress, tasks, volunteers = stats[row.id]
         project = dict(id=row.id, name=row.name, short_name=row.short_name,
                        created=row.created, description=row.description,
                        updated=row.updated,
-                       last_activity=pretty_date(last_activity(row.id)),
-                       last_activity_raw=last_activity(row.id),
+                       last_activity=pretty_date(activity),
+                       last_activity_raw=activity,
                        owner=row.owner,
-                       overall_progress=overall_progress(row.id),
-                       n_tasks=n_tasks(row.id),
-                       n_volunteers=n_volunteers(row.id),
+                       overall_progress=progress,
+                       n_tasks=tasks,
+                       n_volunteers=volunteers,
                        info=dict(json.loads(row.info)))
         projects.append(project)
     return projects
@@ -344,9 +462,11 @@ def get_all(category):
                AND task.project_id=project.id
                GROUP BY project.id, "user".id ORDER BY project.name;''')
 
-    results = session.execute(sql, dict(category=category))
+    results = session.execute(sql, dict(category=category)).fetchall()
+    stats = _stats_many([row.id for row in results])
     projects = []
     for row in results:
+        activity, progress, tasks, volunteers = stats[row.id]
         project = dict(id=row.id,
                        name=row.name, short_name=row.short_name,
                        created=row.created,
@@ -354,11 +474,11 @@ def get_all(category):
                        description=row.description,
                        owner=row.owner,
                        featured=row.featured,
-                       last_activity=pretty_date(last_activity(row.id)),
-                       last_activity_raw=last_activity(row.id),
-                       overall_progress=overall_progress(row.id),
-                       n_tasks=n_tasks(row.id),
-                       n_volunteers=n_volunteers(row.id),
+                       last_activity=pretty_date(activity),
+                       last_activity_raw=activity,
+                       overall_progress=progress,
+                       n_tasks=tasks,
+                       n_volunteers=volunteers,
                        info=dict(json.loads(row.info)))
         projects.append(project)
     return projects
@@ -409,26 +529,6 @@ def delete_browse_tasks(project_id):
     delete_memoized(browse_tasks, project_id)
 
 
-def delete_n_tasks(project_id):
-    """Reset n_tasks value in cache"""
-    delete_memoized(n_tasks, project_id)
-
-
-def delete_n_completed_tasks(project_id):
-    """Reset n_completed_tasks value in cache"""
-    delete_memoized(n_completed_tasks, project_id)
-
-
-def delete_n_task_runs(project_id):
-    """Reset n_tasks value in cache"""
-    delete_memoized(n_task_runs, project_id)
-
-
-def delete_overall_progress(project_id):
-    """Reset overall_progress value in cache"""
-    delete_memoized(overall_progress, project_id)
-
-
 def delete_last_activity(project_id):
     """Reset last_activity value in cache"""
     delete_memoized(last_activity, project_id)
@@ -436,12 +536,12 @@ def delete_last_activity(project_id):
 
 def delete_n_registered_volunteers(project_id):
     """Reset n_registered_volunteers value in cache"""
-    delete_memoized(n_registered_volunteers, project_id)
+    delete_memoized(_n_registered_volunteers_exact, project_id)
 
 
 def delete_n_anonymous_volunteers(project_id):
     """Reset n_anonymous_volunteers value in cache"""
-    delete_memoized(n_anonymous_volunteers, project_id)
+    delete_memoized(_n_anonymous_volunteers_exact, project_id)
 
 
 def delete_n_volunteers(project_id):
@@ -457,12 +557,6 @@ def clean(project_id):
 
 def clean_project(project_id):
     """Clean cache for a specific project"""
-    delete_browse_tasks(project_id)
-    delete_n_tasks(project_id)
-    delete_n_completed_tasks(project_id)
-    delete_n_registered_volunteers(project_id)
-    delete_n_anonymous_volunteers(project_id)
-    delete_n_volunteers(project_id)
-    delete_last_activity(project_id)
-    delete_n_task_runs(project_id)
-    delete_overall_progress(project_id)
+    # browse_tasks, n_tasks, n_volunteers, last_activity... are project
+    # scoped, so a single INCR invalidates all of them
+    invalidate_project(project_id)
@@ -0,0 +1,151 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Serialization of the cached values.
+
+Values are stored with a three bytes header: the format version, the
+serializer and the compression used, so any worker can read the values
+written by others with different settings. Values without a header were
+written by older versions with pickle, and are still read. They are stored
+under a key prefix of the format version (see pybossa.cache), as older
+versions cannot read the values with a header.
+"""
+import json
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:  # pragma: no cover
+    import pickle
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import lz4
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+VERSION = '\x01'
+
+
+class FormatError(ValueError):
+
+    """Raised for values written in an unknown format."""
+
+    pass
+
+
+def _pickle_dumps(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _msgpack_dumps(value):
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_loads(data):
+    return msgpack.unpackb(data, encoding='utf-8')
+
+
+def _lz4_compress(data):
+    return lz4.dumps(data)
+
+
+def _lz4_decompress(data):
+    return lz4.loads(data)
+
+
+# name: (code, dumps, loads, available)
+FORMATS = {
+    'pickle': ('p', _pickle_dumps, pickle.loads, True),
+    'json': ('j', json.dumps, json.loads, True),
+    'msgpack': ('m', _msgpack_dumps, _msgpack_loads, msgpack is not None)}
+
+# name: (code, compress, decompress, available)
+COMPRESSIONS = {
+    'zlib': ('z', zlib.compress, zlib.decompress, True),
+    'lz4': ('l', _lz4_compress, _lz4_decompress, lz4 is not None)}
+
+NO_COMPRESSION = 'n'
+
+
+class Serializer(object):
+
+    """Serialize values with pickle, json or msgpack.
+
+    Values json or msgpack cannot serialize (as model objects or datetimes)
+    are pickled. As they turn tuples into lists or integer keys into
+    strings, with check the values are also loaded back and pickled if they
+    change; as it doubles the cost of every write, it is meant for debug
+    mode and the tests. Serialized values larger than threshold bytes are
+    compressed.
+    """
+
+    def __init__(self, format='pickle', compression=None, threshold=1024,
+                 check=False):
+        for name, options in ((format, FORMATS),
+                              (compression, COMPRESSIONS)):
+            if name is not None and not options[name][3]:
+                raise ImportError('%s is not installed' % name)
+        self.format = FORMATS[format]
+        self.compression = COMPRESSIONS.get(compression)
+        self.threshold = threshold
+        self.check = check
+
+    def dumps(self, value):
+        """Return value serialized, with its header."""
+        code, dumps, loads, _ = self.format
+        try:
+            data = dumps(value)
+            if self.check and code != 'p' and loads(data) != value:
+                raise ValueError('%r changes when serialized' % value)
+        except (TypeError, ValueError):
+            code, dumps, loads, _ = FORMATS['pickle']
+            data = dumps(value)
+        compression = NO_COMPRESSION
+        if self.compression is not None and len(data) > self.threshold:
+            compression, compress, _, _ = self.compression
+            data = compress(data)
+        return VERSION + code + compression + data
+
+    def loads(self, data):
+        """Return the value of serialized data.
+
+        Raises FormatError if it was written in an unknown format, or with
+        a library not installed in this worker.
+        """
+        if data[0] != VERSION:
+            # Versions are below any pickle opcode
+            if data[0] < ' ':
+                raise FormatError('Unknown format version %r' % data[0])
+            return pickle.loads(data)
+        loads = _find(FORMATS, data[1])[2]
+        if data[2] != NO_COMPRESSION:
+            data = _find(COMPRESSIONS, data[2])[2](data[3:])
+        else:
+            data = data[3:]
+        return loads(data)
+
+
+def _find(options, code):
+    for option in options.values():
+        if option[0] == code and option[3]:
+            return option
+    raise FormatError('Unknown or unavailable serialization %r' % code)
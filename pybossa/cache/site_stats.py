@@ -87,8 +87,8 @@ def get_top5_projects_24_hours():
                COUNT(task_run.project_id) AS n_answers FROM project, task_run
                WHERE project.id=task_run.project_id
                AND project.hidden=0
-               AND DATE(task_run.finish_time) > NOW() - INTERVAL '24 hour'
-               AND DATE(task_run.finish_time) <= NOW()
+               AND task_run.finish_time_ts > NOW() - INTERVAL '24 hour'
+               AND task_run.finish_time_ts <= NOW()
                GROUP BY project.id
                ORDER BY n_answers DESC LIMIT 5;''')
 
@@ -108,8 +108,8 @@ def get_top5_users_24_hours():
     sql = text('''SELECT "user".id, "user".fullname, "user".name,
                COUNT(task_run.project_id) AS n_answers FROM "user", task_run
                WHERE "user".id=task_run.user_id
-               AND DATE(task_run.finish_time) > NOW() - INTERVAL '24 hour'
-               AND DATE(task_run.finish_time) <= NOW()
+               AND task_run.finish_time_ts > NOW() - INTERVAL '24 hour'
+               AND task_run.finish_time_ts <= NOW()
                GROUP BY "user".id
                ORDER BY n_answers DESC LIMIT 5;''')
 
@@ -18,7 +18,7 @@
 """Cache module for users."""
 from sqlalchemy.sql import text
 from pybossa.core import db, timeouts
-from pybossa.cache import cache, memoize, delete_memoized
+from pybossa.cache import cache, memoize, delete_memoized, FIVE_MINUTES
 from pybossa.util import pretty_date
 from pybossa.model.user import User
 from pybossa.cache.projects import overall_progress, n_tasks, n_volunteers
@@ -28,7 +28,8 @@ import json
 session = db.slave_session
 
 
-@memoize(timeout=timeouts.get('USER_TIMEOUT'))
+@memoize(timeout=timeouts.get('USER_TIMEOUT'), grace=FIVE_MINUTES,
+         early_refresh=1)
 def get_leaderboard(n, user_id):
     """Return the top n users with their rank."""
     sql = text('''
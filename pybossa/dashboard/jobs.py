@@ -43,13 +43,11 @@ def active_users_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_users AS
                    WITH crafters_per_day AS
-                        (select to_date(task_run.finish_time,
-                                        'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                        (select task_run.finish_time_ts::date AS day,
                                 user_id, COUNT(task_run.user_id) AS day_crafters
                         FROM task_run
-                        WHERE to_date(task_run.finish_time,
-                                      'YYYY-MM-DD\THH24:MI:SS.US')
-                            >= NOW() - ('1 week'):: INTERVAL
+                        WHERE task_run.finish_time_ts
+                            >= (NOW() - ('1 week'):: INTERVAL)::date + 1
                         GROUP BY day, task_run.user_id)
                    SELECT day, COUNT(crafters_per_day.user_id) AS n_users
                    FROM crafters_per_day GROUP BY day ORDER BY day;''')
@@ -65,13 +63,11 @@ def active_anon_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_anon AS
                    WITH crafters_per_day AS
-                        (select to_date(task_run.finish_time,
-                                        'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                        (select task_run.finish_time_ts::date AS day,
                                 user_ip, COUNT(task_run.user_ip) AS day_crafters
                         FROM task_run
-                        WHERE to_date(task_run.finish_time,
-                                      'YYYY-MM-DD\THH24:MI:SS.US')
-                            >= NOW() - ('1 week'):: INTERVAL
+                        WHERE task_run.finish_time_ts
+                            >= (NOW() - ('1 week'):: INTERVAL)::date + 1
                         GROUP BY day, task_run.user_ip)
                    SELECT day, COUNT(crafters_per_day.user_ip) AS n_users
                    FROM crafters_per_day GROUP BY day ORDER BY day;''')
@@ -106,13 +102,12 @@ def update_projects_week():
         return _refresh_materialized_view('dashboard_week_project_update')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_project_update AS
-                   SELECT TO_DATE(project.updated, 'YYYY-MM-DD\THH24:MI:SS.US') as day,
+                   SELECT project.updated_ts::date as day,
                    project.id, short_name, project.name,
                    owner_id, "user".name as u_name, "user".email_addr
                    FROM project, "user"
-                   WHERE TO_DATE(project.updated,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE project.updated_ts >= (now() -
+                                ('1 week')::INTERVAL)::date + 1
                    AND "user".id=project.owner_id
                    GROUP BY project.id, "user".name, "user".email_addr;''')
         db.session.execute(sql)
@@ -126,12 +121,10 @@ def new_tasks_week():
         return _refresh_materialized_view('dashboard_week_new_task')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_new_task AS
-                      SELECT TO_DATE(task.created,
-                                     'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                      SELECT task.created_ts::date AS day,
                       COUNT(task.id) AS day_tasks
-                      FROM task WHERE TO_DATE(task.created,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM task WHERE task.created_ts
+                                      >= (now() - ('1 week'):: INTERVAL)::date + 1
                       GROUP BY day ORDER BY day ASC;''')
         db.session.execute(sql)
         db.session.commit()
@@ -144,12 +137,10 @@ def new_task_runs_week():
         return _refresh_materialized_view('dashboard_week_new_task_run')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_new_task_run AS
-                      SELECT TO_DATE(task_run.finish_time,
-                                     'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                      SELECT task_run.finish_time_ts::date AS day,
                       COUNT(task_run.id) AS day_task_runs
-                      FROM task_run WHERE TO_DATE(task_run.finish_time,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM task_run WHERE task_run.finish_time_ts
+                                      >= (now() - ('1 week'):: INTERVAL)::date + 1
                       GROUP BY day;''')
         db.session.execute(sql)
         db.session.commit()
@@ -181,12 +172,11 @@ def returning_users_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_returning_users AS
                    WITH data AS (
-                    SELECT user_id, TO_DATE(task_run.finish_time,
-                    'YYYY-MM-DD\THH24:MI:SS.US') AS day
+                    SELECT user_id, task_run.finish_time_ts::date AS day
                    FROM task_run
-                   WHERE TO_DATE(task_run.finish_time,
-                   'YYYY-MM-DD\THH24:MI:SS.US') >= NOW()
-                   - ('1 week')::INTERVAL GROUP BY day, task_run.user_id)
+                   WHERE task_run.finish_time_ts >= (NOW()
+                   - ('1 week')::INTERVAL)::date + 1
+                   GROUP BY day, task_run.user_id)
                    SELECT user_id, COUNT(user_id) AS n_days
                    FROM data GROUP BY user_id HAVING(count(user_id) > 1)
                    ORDER by n_days;
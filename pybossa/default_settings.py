@@ -61,6 +61,31 @@ REDIS_DB = 0
 
 REDIS_KEYPREFIX = 'pybossa_cache'
 
+# In-process cache in front of Redis
+CACHE_LOCAL_ENABLED = False
+CACHE_LOCAL_MAX_SIZE = 1000
+CACHE_LOCAL_TIMEOUT = 10
+
+# Serialization of cached values: pickle, json or msgpack
+CACHE_SERIALIZER = 'pickle'
+CACHE_COMPRESSION = 'zlib'
+CACHE_COMPRESSION_THRESHOLD = 1024
+
+# Seconds project scoped cached values are served after being invalidated
+CACHE_PROJECT_DEBOUNCE = 0
+
+# Count the volunteers of the projects in the DB instead of with HyperLogLog
+EXACT_VOLUNTEER_COUNTS = False
+
+# Cache warming: values expiring later than this (seconds) are not warmed
+CACHE_WARM_MIN_TTL = 10 * 60
+# Fraction of the visits to projects and users recorded to prioritize them
+ACCESS_LOG_SAMPLE_RATE = 0.1
+# Refresh-ahead: fraction of the cache calls recorded, and how many of the
+# most accessed values are recomputed before they expire
+CACHE_ACCESS_SAMPLE_RATE = 0.01
+CACHE_REFRESH_HOT_KEYS = 1000
+
 ## Default cache timeouts
 # Project cache
 AVATAR_TIMEOUT = 30 * 24 * 60 * 60
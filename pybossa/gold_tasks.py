@@ -0,0 +1,54 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Cached pool of the calibration (gold) tasks of every project."""
+import json
+
+
+class GoldTasks(object):
+
+    """Keep, per project, its calibration_frac and its gold task ids.
+
+    Both are read together with a single GET, so the calibration scheduler
+    decides whether to serve a gold task without querying the DB. The pool
+    is dropped whenever a task or the project is changed, and loaded again
+    by the next request.
+    """
+
+    KEY = 'pybossa:sched:gold:project:%s'
+    TTL = 60 * 60
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def get(self, project_id):
+        """Return (calibration_frac, gold task ids), or None if not cached."""
+        value = self.conn.get(self.KEY % project_id)
+        if value is None:
+            return None
+        value = json.loads(value)
+        return value['calibration_frac'], value['task_ids']
+
+    def set(self, project_id, calibration_frac, task_ids):
+        """Store the calibration_frac and gold task ids of a project."""
+        value = json.dumps(dict(calibration_frac=calibration_frac or 0,
+                                task_ids=list(task_ids)))
+        self.conn.setex(self.KEY % project_id, self.TTL, value)
+
+    def invalidate(self, project_id):
+        """Drop the gold pool of a project."""
+        self.conn.delete(self.KEY % project_id)
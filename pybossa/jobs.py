@@ -16,8 +16,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 """Jobs module for running background tasks in PyBossa server."""
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict
 import math
+import time
 import requests
 from flask import current_app, render_template
 from flask.ext.mail import Message
@@ -28,6 +30,13 @@ import pybossa.dashboard.jobs as dashboard
 
 MINUTE = 60
 HOUR = 60 * 60
+WARM_BATCH_SIZE = 10
+# Task runs created in the last ROLLUP_LAG seconds are not folded in yet,
+# as they may be committed after others with higher IDs
+ROLLUP_LAG = MINUTE
+# Projects whose activity has to be folded in again, as answers already
+# folded in were deleted
+ROLLUP_STALE_KEY = 'pybossa:rollup:project_activity:stale'
 
 
 def schedule_job(function, scheduler):
@@ -102,8 +111,11 @@ def get_periodic_jobs(queue):
     non_contrib_jobs = get_non_contributors_users_jobs() \
         if queue == 'quaterly' else []
     dashboard_jobs = get_dashboard_jobs() if queue == 'low' else []
+    task_pool_jobs = get_task_pool_jobs() if queue == 'super' else []
+    volunteers_jobs = get_volunteers_jobs() if queue == 'low' else []
     _all = [zip_jobs, jobs, project_jobs, autoimport_jobs,
-            engage_jobs, non_contrib_jobs, dashboard_jobs]
+            engage_jobs, non_contrib_jobs, dashboard_jobs, task_pool_jobs,
+            volunteers_jobs]
     return (job for sublist in _all for job in sublist if job['queue'] == queue)
 
 
@@ -115,6 +127,12 @@ def get_default_jobs():  # pragma: no cover
                timeout=(10 * MINUTE), queue='low')
     yield dict(name=warm_cache, args=[], kwargs={},
                timeout=(10 * MINUTE), queue='super')
+    yield dict(name=reconcile_project_counters, args=[], kwargs={},
+               timeout=(10 * MINUTE), queue='high')
+    yield dict(name=refresh_hot_cache, args=[], kwargs={},
+               timeout=(10 * MINUTE), queue='super')
+    yield dict(name=rollup_project_activity, args=[], kwargs={},
+               timeout=(10 * MINUTE), queue='super')
 
 
 def get_export_task_jobs(queue):
@@ -164,6 +182,39 @@ def create_dict_jobs(data, function, timeout=(10 * MINUTE), queue='low'):
         yield jobs
 
 
+def get_task_pool_jobs(queue='super'):
+    """Return a job to refill the task pool of every project using it."""
+    from sqlalchemy.sql import text
+    from pybossa.core import db
+    sql = text('''SELECT id FROM project
+               WHERE info LIKE('%"sched": "pool"%')
+               OR info LIKE('%"sched": "random"%');''')
+    results = db.slave_session.execute(sql)
+    for row in results:
+        yield dict(name=fill_task_pool,
+                   args=[row.id], kwargs={},
+                   timeout=(10 * MINUTE),
+                   queue=queue)
+
+
+def get_volunteers_jobs(queue='low'):
+    """Return a job to backfill the volunteer sketches of every project
+    whose sketches are not trusted (yet, or since answers were deleted)."""
+    from sqlalchemy.sql import text
+    from pybossa.core import db, sentinel
+    from pybossa.project_volunteers import ProjectVolunteers
+    sql = text('''SELECT id FROM project ORDER BY id''')
+    project_ids = [row.id for row in db.slave_session.execute(sql)]
+    volunteers = ProjectVolunteers(sentinel.slave)
+    for project_id, ready in zip(project_ids,
+                                 volunteers.ready_many(project_ids)):
+        if not ready:
+            yield dict(name=backfill_project_volunteers,
+                       args=[project_id], kwargs={},
+                       timeout=(10 * MINUTE),
+                       queue=queue)
+
+
 def get_inactive_users_jobs(queue='quaterly'):
     """Return a list of inactive users that have contributed to a project."""
     from sqlalchemy.sql import text
@@ -172,8 +223,9 @@ def get_inactive_users_jobs(queue='quaterly'):
     # First users that have participated once but more than 3 months ago
     sql = text('''SELECT user_id FROM task_run
                WHERE user_id IS NOT NULL
-               AND TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               <= NOW() - '3 month'::INTERVAL GROUP BY task_run.user_id;''')
+               AND task_run.finish_time_ts
+               < (NOW() - '3 month'::INTERVAL)::date + 1
+               GROUP BY task_run.user_id;''')
     results = db.slave_session.execute(sql)
     for row in results:
 
@@ -311,71 +363,326 @@ def warm_up_stats():  # pragma: no cover
     return True
 
 
-@with_cache_disabled
-def warm_cache():  # pragma: no cover
-    """Background job to warm cache."""
-    from pybossa.core import create_app
-    app = create_app(run_as_server=False)
-    projects_cached = []
+def warm_lists():
+    """Warm the project lists and the leaderboard.
+
+    Return the [id, short_name, featured] of the projects in the first pages
+    of the lists, the [id, name] of the users in the leaderboard (both the
+    most visited first) and the seconds it took.
+    """
     import pybossa.cache.projects as cached_projects
     import pybossa.cache.categories as cached_cat
     import pybossa.cache.users as cached_users
-    import pybossa.cache.project_stats as stats
+    from pybossa.cache import warm
     from pybossa.util import rank
+    start = time.time()
+    projects = OrderedDict()
 
-    def warm_project(_id, short_name, featured=False):
-        if _id not in projects_cached:
-            cached_projects.get_project(short_name)
-            cached_projects.n_tasks(_id)
-            n_task_runs = cached_projects.n_task_runs(_id)
-            cached_projects.overall_progress(_id)
-            cached_projects.last_activity(_id)
-            cached_projects.n_completed_tasks(_id)
-            cached_projects.n_volunteers(_id)
-            if n_task_runs >= 1000 or featured:
-                # print ("Getting stats for %s as it has %s task runs" %
-                #        (short_name, n_task_runs))
-                stats.get_stats(_id, app.config.get('GEO'))
-            projects_cached.append(_id)
-
-    # Cache top projects
-    projects = cached_projects.get_top()
-    for p in projects:
-        warm_project(p['id'], p['short_name'])
+    # Top projects
+    warm(cached_projects.get_top)
+    for p in cached_projects.get_top():
+        projects.setdefault(p['id'], [p['id'], p['short_name'], False])
 
     # Cache 3 pages
-    to_cache = 3 * app.config['APPS_PER_PAGE']
-    projects = rank(cached_projects.get_all_featured('featured'))[:to_cache]
-    for p in projects:
-        warm_project(p['id'], p['short_name'], featured=True)
+    to_cache = 3 * current_app.config['APPS_PER_PAGE']
+    warm(cached_projects.get_all_featured, 'featured')
+    featured = rank(cached_projects.get_all_featured('featured'))[:to_cache]
+    for p in featured:
+        projects[p['id']] = [p['id'], p['short_name'], True]
 
     # Categories
-    categories = cached_cat.get_used()
-    for c in categories:
-        projects = rank(cached_projects.get_all(c['short_name']))[:to_cache]
-        for p in projects:
-            warm_project(p['id'], p['short_name'])
+    for c in cached_cat.get_used():
+        warm(cached_projects.get_all, c['short_name'])
+        for p in rank(cached_projects.get_all(c['short_name']))[:to_cache]:
+            projects.setdefault(p['id'], [p['id'], p['short_name'], False])
+
     # Users
-    users = cached_users.get_leaderboard(app.config['LEADERBOARD'], 'anonymous')
-    for user in users:
-        # print "Getting stats for %s" % user['name']
-        cached_users.get_user_summary(user['name'])
-        cached_users.projects_contributed_cached(user['id'])
-        cached_users.published_projects_cached(user['id'])
-        cached_users.draft_projects_cached(user['id'])
+    leaderboard = (current_app.config['LEADERBOARD'], 'anonymous')
+    warm(cached_users.get_leaderboard, *leaderboard)
+    users = [[u['id'], u['name']]
+             for u in cached_users.get_leaderboard(*leaderboard)]
+    warm(cached_users.get_top)
+
+    projects = _by_access('project', projects.values())
+    users = _by_access('user', users)
+    return projects, users, time.time() - start
 
-    cached_users.get_top()
 
+def _by_access(kind, items):
+    """Sort items ([id, ...] lists) by how often they are visited, keeping
+    the order of the ones visited as often."""
+    from pybossa.core import sentinel
+    from pybossa.access_log import AccessLog
+    scores = AccessLog(sentinel.slave).scores(kind, [i[0] for i in items])
+    order = sorted(range(len(items)), key=lambda i: -scores[i])
+    return [items[i] for i in order]
+
+
+def warm_projects(projects):
+    """Warm the cached values of a batch of [id, short_name, featured]
+    projects."""
+    import pybossa.cache.projects as cached_projects
+    import pybossa.cache.project_stats as stats
+    from pybossa.cache import warm
+    start = time.time()
+    n_warmed = 0
+    for _id, short_name, featured in projects:
+        n_warmed += warm(cached_projects.get_project, short_name)
+        n_warmed += warm(cached_projects.last_activity, _id)
+        # Counters and volunteers are read from Redis, and loaded if needed
+        cached_projects.n_volunteers(_id)
+        if cached_projects.n_task_runs(_id) >= 1000 or featured:
+            n_warmed += warm(stats.get_stats, _id,
+                             current_app.config.get('GEO'))
+    elapsed = time.time() - start
+    print ("warm_projects: %s values of %s projects warmed in %.2fs" %
+           (n_warmed, len(projects), elapsed))
+    return elapsed
+
+
+def warm_users(users):
+    """Warm the cached values of a batch of [id, name] users."""
+    import pybossa.cache.users as cached_users
+    from pybossa.cache import warm
+    start = time.time()
+    n_warmed = 0
+    for _id, name in users:
+        n_warmed += warm(cached_users.get_user_summary, name)
+        n_warmed += warm(cached_users.projects_contributed_cached, _id)
+        n_warmed += warm(cached_users.published_projects_cached, _id)
+        n_warmed += warm(cached_users.draft_projects_cached, _id)
+    elapsed = time.time() - start
+    print ("warm_users: %s values of %s users warmed in %.2fs" %
+           (n_warmed, len(users), elapsed))
+    return elapsed
+
+
+def get_warm_jobs(projects, users, queue='super'):
+    """Return jobs to warm projects and users in batches of WARM_BATCH_SIZE,
+    in the given order."""
+    for start in xrange(0, len(projects), WARM_BATCH_SIZE):
+        yield dict(name=warm_projects,
+                   args=[projects[start:start + WARM_BATCH_SIZE]], kwargs={},
+                   timeout=(10 * MINUTE), queue=queue)
+    for start in xrange(0, len(users), WARM_BATCH_SIZE):
+        yield dict(name=warm_users,
+                   args=[users[start:start + WARM_BATCH_SIZE]], kwargs={},
+                   timeout=(10 * MINUTE), queue=queue)
+
+
+def refresh_hot_cache():
+    """Recompute the most accessed memoized values about to expire, remove
+    the expired keys from the memoize indexes, and log the hit rates of the
+    cache tiers of all the processes."""
+    # Functions can only be recomputed once their modules are imported
+    import pybossa.cache.projects
+    import pybossa.cache.project_stats
+    import pybossa.cache.users
+    import pybossa.cache.helpers
+    from pybossa.cache import refresh_hot, prune_indexes, get_stats
+    start = time.time()
+    refreshed = refresh_hot(current_app.config.get('CACHE_REFRESH_HOT_KEYS'))
+    pruned = prune_indexes()
+    print ("refresh_hot_cache: %s values refreshed and %s expired keys "
+           "pruned in %.2fs" % (refreshed, pruned, time.time() - start))
+    for tier, tier_stats in sorted(get_stats(aggregated=True).items()):
+        print ("refresh_hot_cache: %s cache tier: %s hits, %s misses, "
+               "hit rate %s" % (tier, tier_stats['hits'],
+                                tier_stats['misses'], tier_stats['hit_rate']))
+    return refreshed
+
+
+def warm_cache():  # pragma: no cover
+    """Background job to warm cache.
+
+    Only the lists are warmed here. Their projects and users are warmed in
+    parallel by all the workers of the queue, with jobs enqueued in batches,
+    the most visited first. Values still fresh are not recomputed.
+    """
+    from pybossa.core import sentinel
+    from pybossa.access_log import AccessLog
+    from rq import Queue
+    projects, users, elapsed = warm_lists()
+    queue = Queue('super', connection=sentinel.master)
+    for job in get_warm_jobs(projects, users):
+        queue.enqueue_call(func=job['name'], args=job['args'],
+                           kwargs=job['kwargs'], timeout=job['timeout'])
+    access_log = AccessLog(sentinel.master)
+    access_log.decay('project')
+    access_log.decay('user')
+    print ("warm_cache: lists warmed in %.2fs, warming %s projects and %s "
+           "users" % (elapsed, len(projects), len(users)))
     return True
 
 
+def fill_task_pool(project_id):
+    """Fill the Redis pool of open tasks of a project."""
+    from pybossa.core import sentinel
+    from pybossa.sched import get_open_tasks
+    from pybossa.task_pool import TaskPool
+    pool = TaskPool(sentinel.master)
+    pool.fill(project_id, get_open_tasks(project_id))
+    return pool.size(project_id)
+
+
+def reconcile_project_counters(batch_size=1000):
+    """Count again the tasks and task runs of every project, fixing any
+    drift of the counters kept up to date by the event listeners.
+
+    The counters of a project that changed while counting it are left as
+    they are, as the increments would be lost, and fixed in the next run.
+    """
+    from sqlalchemy.sql import text
+    from pybossa.core import db, sentinel
+    from pybossa.project_counters import ProjectCounters
+    import pybossa.cache.projects as cached_projects
+    counters = ProjectCounters(sentinel.master)
+    sql = text('''SELECT id FROM project ORDER BY id''')
+    project_ids = [row.id for row in db.slave_session.execute(sql)]
+    for start in xrange(0, len(project_ids), batch_size):
+        batch = project_ids[start:start + batch_size]
+        before = counters.get_many(batch)
+        counted = cached_projects.count_counters(batch)
+        after = counters.get_many(batch)
+        stable = [i for i, project_id in enumerate(batch)
+                  if before[i] == after[i]]
+        counters.reconcile(dict((batch[i], counted[i]) for i in stable),
+                           dict((batch[i], after[i]) for i in stable))
+    return len(project_ids)
+
+
+def backfill_project_volunteers(project_id):
+    """Add the volunteers of a project to its HyperLogLog sketches."""
+    from sqlalchemy.sql import text
+    from pybossa.core import db, sentinel
+    from pybossa.project_volunteers import ProjectVolunteers
+    sql = text('''SELECT DISTINCT user_id FROM task_run
+               WHERE project_id=:project_id
+               AND user_id IS NOT NULL AND user_ip IS NULL''')
+    results = db.slave_session.execute(sql, dict(project_id=project_id))
+    user_ids = [row.user_id for row in results]
+    sql = text('''SELECT DISTINCT user_ip FROM task_run
+               WHERE project_id=:project_id
+               AND user_ip IS NOT NULL AND user_id IS NULL''')
+    results = db.slave_session.execute(sql, dict(project_id=project_id))
+    user_ips = [row.user_ip for row in results]
+    volunteers = ProjectVolunteers(sentinel.master)
+    volunteers.backfill(project_id, user_ids, user_ips)
+    return volunteers.count(project_id)
+
+
+def rollup_project_activity(batch_size=10000):
+    """Fold the task runs submitted since the last run into the activity
+    of their projects per hour, batch_size task runs at a time.
+
+    The task runs written without timestamp columns (by a previous version
+    still running while deploying) get them before being folded in.
+
+    Deleting an answer already folded in discounts it straight away, but
+    the tasks it completed are only discounted here: the activity of the
+    projects flagged in ROLLUP_STALE_KEY is folded in again from scratch.
+
+    Return the ID of the last task run folded in.
+    """
+    from sqlalchemy.sql import text
+    from pybossa.core import db, sentinel
+    from pybossa.model import TIMESTAMP_PATTERN
+    from pybossa.model.project_activity import ProjectActivity, RollupMark
+    name = ProjectActivity.__tablename__
+    cutoff = datetime.utcnow() - timedelta(seconds=ROLLUP_LAG)
+    last_sql = text('''SELECT COALESCE(
+                           (SELECT MIN(id) - 1 FROM task_run
+                            WHERE id > :mark AND created_ts >= :cutoff),
+                           (SELECT MAX(id) FROM task_run), 0) AS last_id''')
+    fill_sql = text('''
+        UPDATE task_run SET created_ts=COALESCE(created_ts,
+            CASE WHEN created ~ :pattern THEN created::timestamp END),
+        finish_time_ts=COALESCE(finish_time_ts,
+            CASE WHEN finish_time ~ :pattern THEN finish_time::timestamp END)
+        WHERE id > :mark AND id <= :last_id
+        AND (created_ts IS NULL OR finish_time_ts IS NULL)''')
+    fold_sql = '''
+        WITH runs AS (
+            SELECT id, project_id, task_id, user_id, user_ip,
+            finish_time_ts AS finished FROM task_run
+            WHERE id > :mark AND id <= :last_id
+            AND finish_time_ts IS NOT NULL %s),
+        completions AS (
+            SELECT numbered.id FROM (
+                SELECT task_run.id, task_run.task_id, ROW_NUMBER() OVER (
+                    PARTITION BY task_run.task_id ORDER BY task_run.id) AS n
+                FROM task_run WHERE task_run.id <= :last_id
+                AND task_run.task_id IN (SELECT task_id FROM runs))
+                AS numbered
+            JOIN task ON task.id=numbered.task_id
+            WHERE numbered.id > :mark AND numbered.n=task.n_answers),
+        deltas AS (
+            SELECT project_id, finished::date AS day,
+            EXTRACT(HOUR FROM finished)::integer AS hour,
+            COUNT(runs.id) AS n_answers,
+            COUNT(CASE WHEN user_ip IS NULL THEN 1 END) AS n_auth,
+            COUNT(CASE WHEN user_id IS NULL THEN 1 END) AS n_anon,
+            COUNT(completions.id) AS n_completed
+            FROM runs LEFT JOIN completions ON completions.id=runs.id
+            GROUP BY project_id, day, hour),
+        updated AS (
+            UPDATE project_activity SET
+            n_answers=project_activity.n_answers + deltas.n_answers,
+            n_auth=project_activity.n_auth + deltas.n_auth,
+            n_anon=project_activity.n_anon + deltas.n_anon,
+            n_completed=project_activity.n_completed + deltas.n_completed
+            FROM deltas WHERE project_activity.project_id=deltas.project_id
+            AND project_activity.day=deltas.day
+            AND project_activity.hour=deltas.hour
+            RETURNING project_activity.project_id, project_activity.day,
+            project_activity.hour)
+        INSERT INTO project_activity (project_id, day, hour, n_answers,
+                                      n_auth, n_anon, n_completed)
+        SELECT deltas.* FROM deltas WHERE NOT EXISTS (
+            SELECT 1 FROM updated WHERE updated.project_id=deltas.project_id
+            AND updated.day=deltas.day AND updated.hour=deltas.hour)'''
+    fold_project_sql = text(fold_sql % 'AND project_id=:project_id')
+    fold_sql = text(fold_sql % '')
+    clear_sql = text('''DELETE FROM project_activity
+                        WHERE project_id=:project_id''')
+    while True:
+        # The mark is locked until the batch is committed, so the batches
+        # are folded in once even if the job runs twice at the same time
+        mark = db.session.query(RollupMark).filter_by(name=name)\
+            .with_for_update().one()
+        last_id = db.session.execute(last_sql, dict(mark=mark.last_id,
+                                                    cutoff=cutoff)).scalar()
+        last_id = min(last_id, mark.last_id + batch_size)
+        if last_id <= mark.last_id:
+            db.session.commit()
+            break
+        db.session.execute(fill_sql, dict(mark=mark.last_id,
+                                          last_id=last_id,
+                                          pattern=TIMESTAMP_PATTERN))
+        db.session.execute(fold_sql, dict(mark=mark.last_id,
+                                          last_id=last_id))
+        mark.last_id = last_id
+        db.session.commit()
+    for project_id in sentinel.master.smembers(ROLLUP_STALE_KEY):
+        # Removed first, so a deletion committed meanwhile flags it again
+        sentinel.master.srem(ROLLUP_STALE_KEY, project_id)
+        mark = db.session.query(RollupMark).filter_by(name=name)\
+            .with_for_update().one()
+        db.session.execute(clear_sql, dict(project_id=project_id))
+        db.session.execute(fold_project_sql, dict(mark=0,
+                                                  last_id=mark.last_id,
+                                                  project_id=project_id))
+        db.session.commit()
+    return mark.last_id
+
+
 def get_non_updated_projects():
     """Return a list of non updated projects."""
     from sqlalchemy.sql import text
     from pybossa.model.project import Project
     from pybossa.core import db
-    sql = text('''SELECT id FROM project WHERE TO_DATE(updated,
-                'YYYY-MM-DD\THH24:MI:SS.US') <= NOW() - '3 month':: INTERVAL
+    sql = text('''SELECT id FROM project
+               WHERE updated_ts < (NOW() - '3 month'::INTERVAL)::date + 1
                AND contacted != True LIMIT 25''')
     results = db.slave_session.execute(sql)
     projects = []
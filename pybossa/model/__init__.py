@@ -20,7 +20,8 @@ import datetime
 import json
 import uuid
 
-from sqlalchemy import Text
+from sqlalchemy import Text, DateTime
+from sqlalchemy.schema import Column
 from sqlalchemy.orm import class_mapper
 from sqlalchemy.ext.mutable import Mutable
 from sqlalchemy.types import TypeDecorator
@@ -36,6 +37,10 @@ class DomainObject(object):
     def dictize(self):
         out = {}
         for col in self.__table__.c:
+            # Internal columns, as the timestamps of the text ones, are not
+            # part of the API
+            if col.info.get('internal'):
+                continue
             out[col.name] = getattr(self, col.name)
         return out
 
@@ -136,12 +141,42 @@ def make_timestamp():
     return now.isoformat()
 
 
+# SQL regular expression of the timestamps made by make_timestamp
+TIMESTAMP_PATTERN = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?$'
+
+
+def parse_timestamp(value):
+    """Return the datetime of a timestamp made by make_timestamp, or None
+    if value is not one."""
+    for format in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value, format)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def timestamp_column(name, onupdate=False):
+    """Return an internal column with the timestamp of the text column
+    name as a datetime, so it can be queried with ranges and indexed.
+
+    It is set whenever the row is inserted (or updated, with onupdate) from
+    the value of name, which must be declared before it.
+    """
+    def default(context):
+        return parse_timestamp(context.current_parameters.get(name))
+    return Column(DateTime, default=default,
+                  onupdate=default if onupdate else None,
+                  info=dict(internal=True))
+
+
 def make_uuid():
     return str(uuid.uuid4())
 
 
 def update_project_timestamp(mapper, conn, target):
     """Update method to be used by the relationship objects."""
-    sql_query = ("update project set updated='%s' where id=%s" %
-                 (make_timestamp(), target.project_id))
+    now = make_timestamp()
+    sql_query = ("update project set updated='%s', updated_ts='%s' "
+                 "where id=%s" % (now, now, target.project_id))
     conn.execute(sql_query)
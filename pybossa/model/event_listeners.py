@@ -18,19 +18,56 @@
 from datetime import datetime
 
 from rq import Queue
-from sqlalchemy import event
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
 
 from pybossa.feed import update_feed
-from pybossa.model import update_project_timestamp
+from pybossa.model import update_project_timestamp, parse_timestamp
 from pybossa.model.blogpost import Blogpost
 from pybossa.model.project import Project
+from pybossa.model.project_activity import ProjectActivity
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from pybossa.model.user import User
-from pybossa.jobs import webhook
+from pybossa.jobs import webhook, ROLLUP_STALE_KEY
 from pybossa.core import sentinel
+from pybossa.task_pool import TaskPool
+from pybossa.answered_tasks import AnsweredTasks
+from pybossa.task_leases import TaskLeases
+from pybossa.task_candidates import TaskCandidates
+from pybossa.gold_tasks import GoldTasks
+from pybossa.project_counters import ProjectCounters
+from pybossa.project_volunteers import ProjectVolunteers
 
 webhook_queue = Queue('high', connection=sentinel.master)
+task_pool = TaskPool(sentinel.master)
+answered_tasks = AnsweredTasks(sentinel.master)
+task_leases = TaskLeases(sentinel.master)
+task_candidates = TaskCandidates(sentinel.master)
+gold_tasks = GoldTasks(sentinel.master)
+project_counters = ProjectCounters(sentinel.master)
+project_volunteers = ProjectVolunteers(sentinel.master)
+
+AFTER_COMMIT = 'pybossa_after_commit'
+
+
+def after_commit(target, function, *args):
+    """Call function(*args) once the session flushing target is committed,
+    for the Redis writes that must not be seen before the DB changes."""
+    session = object_session(target)
+    session.info.setdefault(AFTER_COMMIT, []).append((function, args))
+
+
+@event.listens_for(Session, 'after_commit')
+def run_after_commit(session):
+    for function, args in session.info.pop(AFTER_COMMIT, []):
+        function(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_after_commit(session):
+    session.info.pop(AFTER_COMMIT, None)
 
 
 @event.listens_for(Blogpost, 'after_insert')
@@ -79,6 +116,72 @@ def add_task_event(mapper, conn, target):
     update_feed(obj)
 
 
+@event.listens_for(Task, 'after_insert')
+@event.listens_for(Task, 'after_update')
+@event.listens_for(Task, 'after_delete')
+def on_task_change(mapper, conn, target):
+    """Drop the cached candidate and gold tasks of the project, and the
+    cached lease limit of the task."""
+    task_candidates.invalidate_project(target.project_id)
+    gold_tasks.invalidate(target.project_id)
+    task_leases.forget_limits(target.project_id, target.id)
+
+
+@event.listens_for(Task, 'after_insert')
+def on_task_insert(mapper, conn, target):
+    """Count the new task in the counters of its project."""
+    project_counters.incr(target.project_id, n_tasks=1,
+                          n_completed_tasks=int(target.state == 'completed'))
+
+
+@event.listens_for(Task, 'before_update')
+@event.listens_for(TaskRun, 'before_update')
+def sync_timestamps(mapper, conn, target):
+    """Update the timestamp columns whose text column is updated."""
+    for name in ('created', 'finish_time'):
+        if (hasattr(target, name + '_ts') and
+                get_history(target, name).has_changes()):
+            setattr(target, name + '_ts',
+                    parse_timestamp(getattr(target, name)))
+
+
+@event.listens_for(Task, 'after_update')
+def on_task_update(mapper, conn, target):
+    """Update the completed tasks counter if the task state changed."""
+    history = get_history(target, 'state')
+    if not history.added:
+        return
+    if not history.deleted:
+        # The previous state is unknown, so the counters are loaded again
+        project_counters.invalidate(target.project_id)
+        return
+    delta = (int(target.state == 'completed') -
+             int(history.deleted[0] == 'completed'))
+    project_counters.incr(target.project_id, n_completed_tasks=delta)
+
+
+@event.listens_for(Task, 'after_delete')
+def on_task_delete(mapper, conn, target):
+    """Discount the deleted task from the counters of its project."""
+    project_counters.incr(target.project_id, n_tasks=-1,
+                          n_completed_tasks=-int(target.state == 'completed'))
+
+
+@event.listens_for(Project, 'after_update')
+def on_project_update(mapper, conn, target):
+    """Drop the cached gold tasks and lease limits, as calibration_frac and
+    time_limit may have changed."""
+    gold_tasks.invalidate(target.id)
+    task_leases.forget_limits(target.id)
+
+
+@event.listens_for(Project, 'after_delete')
+def on_project_delete(mapper, conn, target):
+    """Drop the counters and volunteer sketches of the project."""
+    project_counters.invalidate(target.id)
+    project_volunteers.invalidate(target.id)
+
+
 @event.listens_for(User, 'after_insert')
 def add_user_event(mapper, conn, target):
     """Update PyBossa feed with new user."""
@@ -113,10 +216,52 @@ def is_task_completed(conn, task_id):
     return (n_answers) >= task_n_answers
 
 
-def update_task_state(conn, task_id):
-    sql_query = ("UPDATE task SET state=\'completed\' \
+def add_task_run_to_task(conn, task_id, task_run_id):
+    sql_query = ("UPDATE task SET n_task_runs=n_task_runs + 1, \
+                 last_task_run_id=%s where id=%s") % (task_run_id, task_id)
+    conn.execute(sql_query)
+
+
+def remove_task_run_from_task(conn, task_id, task_run_id):
+    sql_query = ("UPDATE task SET n_task_runs=GREATEST(n_task_runs - 1, 0) \
                  where id=%s") % task_id
     conn.execute(sql_query)
+    sql_query = ("UPDATE task SET last_task_run_id=(select max(id) \
+                 from task_run where task_id=%s) \
+                 where id=%s and last_task_run_id=%s") % (task_id, task_id,
+                                                          task_run_id)
+    conn.execute(sql_query)
+
+
+def remove_task_run_from_activity(conn, target):
+    """Discount a deleted task run from the activity of its project, if it
+    has already been folded in, and flag the project to be folded in again
+    by the rollup job, as the run may have completed its task."""
+    if target.finish_time_ts is None:
+        return
+    sql_query = text('''
+        UPDATE project_activity SET n_answers=n_answers - 1,
+        n_auth=n_auth - :auth, n_anon=n_anon - :anon
+        WHERE project_id=:project_id AND day=:day AND hour=:hour
+        AND :task_run_id <= (SELECT last_id FROM rollup_mark
+                             WHERE name=:name)''')
+    result = conn.execute(sql_query, project_id=target.project_id,
+                          day=target.finish_time_ts.date(),
+                          hour=target.finish_time_ts.hour,
+                          task_run_id=target.id,
+                          auth=int(target.user_ip is None),
+                          anon=int(target.user_id is None),
+                          name=ProjectActivity.__tablename__)
+    if result.rowcount > 0:
+        after_commit(target, sentinel.master.sadd, ROLLUP_STALE_KEY,
+                     target.project_id)
+
+
+def update_task_state(conn, task_id):
+    """Mark a task as completed. Return False if it already was."""
+    sql_query = ("UPDATE task SET state=\'completed\' \
+                 where id=%s and state!=\'completed\'") % task_id
+    return conn.execute(sql_query).rowcount > 0
 
 
 def push_webhook(project_obj, task_id):
@@ -149,10 +294,43 @@ def on_taskrun_submit(mapper, conn, target):
         project_obj['id'] = target.project_id
 
     add_user_contributed_to_feed(conn, target.user_id, project_obj)
+    add_task_run_to_task(conn, target.task_id, target.id)
+    task_leases.forget_limits(target.project_id, target.task_id)
+    project_volunteers.add(target.project_id, target.user_id, target.user_ip)
+    if target.user_id or target.user_ip:
+        # Only once committed, so an answer rolled back is not recorded (a
+        # load racing with the commit keeps it anyway, see AnsweredTasks)
+        after_commit(target, answered_tasks.add, target.project_id,
+                     target.task_id, target.user_id, target.user_ip)
+        task_candidates.invalidate(target.project_id,
+                                   target.user_id, target.user_ip)
+        # The answer counts now, so the user's lease is no longer needed
+        task_leases.release(target.task_id,
+                            task_leases.holder(target.user_id, target.user_ip))
+    completed = False
     if is_task_completed(conn, target.task_id):
-        update_task_state(conn, target.task_id)
+        completed = update_task_state(conn, target.task_id)
+        task_pool.remove(target.project_id, target.task_id)
+        task_leases.release_all(target.task_id)
         update_feed(project_obj)
         push_webhook(project_obj, target.task_id)
+    project_counters.incr(target.project_id, n_task_runs=1,
+                          n_completed_tasks=int(completed))
+
+
+@event.listens_for(TaskRun, 'after_delete')
+def on_taskrun_delete(mapper, conn, target):
+    """Update the task answer count and the user's set of answered tasks."""
+    remove_task_run_from_task(conn, target.task_id, target.id)
+    task_leases.forget_limits(target.project_id, target.task_id)
+    remove_task_run_from_activity(conn, target)
+    project_counters.incr(target.project_id, n_task_runs=-1)
+    # The volunteer may have no other answers, and cannot be removed from
+    # the sketches
+    project_volunteers.invalidate(target.project_id)
+    if target.user_id or target.user_ip:
+        after_commit(target, answered_tasks.remove, target.project_id,
+                     target.task_id, target.user_id, target.user_ip)
 
 
 @event.listens_for(Blogpost, 'after_insert')
@@ -17,11 +17,12 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 
 from sqlalchemy import Integer, Boolean, Unicode, Float, UnicodeText, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship, backref
 
 from pybossa.core import db, signer
-from pybossa.model import DomainObject, JSONEncodedDict, make_timestamp
+from pybossa.model import DomainObject, JSONEncodedDict, make_timestamp, \
+    timestamp_column
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from pybossa.model.category import Category
@@ -40,6 +41,7 @@ class Project(db.Model, DomainObject):
     created = Column(Text, default=make_timestamp)
     #: UTC timestamp when the project is updated (or any of its relationships)
     updated = Column(Text, default=make_timestamp, onupdate=make_timestamp)
+    updated_ts = timestamp_column('updated', onupdate=True)
     #: Project name
     name = Column(Unicode(length=255), unique=True, nullable=False)
     #: Project slug for the URL
@@ -111,3 +113,7 @@ class Project(db.Model, DomainObject):
 
     def delete_autoimporter(self):
         del self.info['autoimporter']
+
+
+# Index used to find the projects not updated for a period
+Index('project_updated_ts_idx', Project.updated_ts)
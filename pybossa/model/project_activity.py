@@ -0,0 +1,64 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2013 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from sqlalchemy import Integer, Text, Date, event
+from sqlalchemy.schema import Column, ForeignKey
+
+from pybossa.core import db
+from pybossa.model import DomainObject
+
+
+class ProjectActivity(db.Model, DomainObject):
+    '''Answers submitted to a project and tasks completed per hour, folded
+    in from task_run by the rollup_project_activity job.
+    '''
+    __tablename__ = 'project_activity'
+
+    #: Project.id of the project
+    project_id = Column(Integer, ForeignKey('project.id', ondelete='CASCADE'),
+                        primary_key=True)
+    #: UTC day of the answers
+    day = Column(Date, primary_key=True)
+    #: UTC hour of the answers (0 to 23)
+    hour = Column(Integer, primary_key=True)
+    #: Number of answers
+    n_answers = Column(Integer, nullable=False, default=0)
+    #: Number of answers of authenticated users (without IP)
+    n_auth = Column(Integer, nullable=False, default=0)
+    #: Number of answers of anonymous users (without user ID)
+    n_anon = Column(Integer, nullable=False, default=0)
+    #: Number of tasks completed by these answers
+    n_completed = Column(Integer, nullable=False, default=0)
+
+
+class RollupMark(db.Model, DomainObject):
+    '''The high-water mark of a rollup table: the last row folded in.'''
+    __tablename__ = 'rollup_mark'
+
+    #: Name of the rollup table
+    name = Column(Text, primary_key=True)
+    #: ID of the last row folded in
+    last_id = Column(Integer, nullable=False, default=0)
+
+
+@event.listens_for(RollupMark.__table__, 'after_create')
+def seed_rollup_marks(target, connection, **kw):
+    """Create the mark of every rollup table, so the rollup jobs always
+    have a row to lock, even the first time they run."""
+    connection.execute(target.insert(), name=ProjectActivity.__tablename__,
+                       last_id=0)
@@ -17,12 +17,12 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 
 from sqlalchemy import Integer, Boolean, Float, UnicodeText, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship, backref
 
 from pybossa.core import db
 from pybossa.model import DomainObject, JSONType, JSONEncodedDict, \
-    make_timestamp
+    make_timestamp, timestamp_column
 from pybossa.model.task_run import TaskRun
 
 
@@ -37,6 +37,7 @@ class Task(db.Model, DomainObject):
     id = Column(Integer, primary_key=True)
     #: UTC timestamp when the task was created.
     created = Column(Text, default=make_timestamp)
+    created_ts = timestamp_column('created')
     #: Project.ID that this task is associated with.
     project_id = Column(Integer, ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
     #: Task.state: ongoing or completed.
@@ -50,6 +51,10 @@ class Task(db.Model, DomainObject):
     info = Column(JSONType, default=dict)
     #: Number of answers to collect for this task.
     n_answers = Column(Integer, default=30)
+    #: Number of answers collected so far, kept by the TaskRun listeners.
+    n_task_runs = Column(Integer, default=0, nullable=False)
+    #: TaskRun.ID of the last answer, kept by the TaskRun listeners.
+    last_task_run_id = Column(Integer)
 
     task_runs = relationship(TaskRun, cascade='all, delete, delete-orphan', backref='task')
 
@@ -60,3 +65,15 @@ class Task(db.Model, DomainObject):
             return float(len(self.task_runs)) / self.n_answers
         else:  # pragma: no cover
             return float(0)
+
+
+# Indexes used by the schedulers, that only look for tasks not completed yet
+Index('task_project_id_state_idx', Task.project_id, Task.state)
+Index('task_open_priority_idx', Task.project_id, Task.priority_0.desc(),
+      Task.id, postgresql_where=(Task.state != u'completed'))
+Index('task_open_n_task_runs_idx', Task.project_id, Task.n_task_runs,
+      Task.id, postgresql_where=(Task.state != u'completed'))
+Index('task_open_id_idx', Task.project_id, Task.id,
+      postgresql_where=(Task.state != u'completed'))
+# Index used by the dashboards to find the tasks created in a period
+Index('task_created_ts_idx', Task.created_ts)
@@ -17,10 +17,11 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 
 from sqlalchemy import Integer, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 
 from pybossa.core import db
-from pybossa.model import DomainObject, JSONType, make_timestamp
+from pybossa.model import DomainObject, JSONType, make_timestamp, \
+    timestamp_column
 
 
 
@@ -33,6 +34,7 @@ class TaskRun(db.Model, DomainObject):
     id = Column(Integer, primary_key=True)
     #: UTC timestamp for when TaskRun is created.
     created = Column(Text, default=make_timestamp)
+    created_ts = timestamp_column('created')
     #: Project.id of the project associated with this TaskRun.
     project_id = Column(Integer, ForeignKey('project.id'), nullable=False)
     #: Task.id of the task associated with this TaskRun.
@@ -43,6 +45,7 @@ class TaskRun(db.Model, DomainObject):
     #: User.ip of the user contributing the TaskRun (only if anonymous)
     user_ip = Column(Text)
     finish_time = Column(Text, default=make_timestamp)
+    finish_time_ts = timestamp_column('finish_time')
     timeout = Column(Integer)
     calibration = Column(Integer)
     #: Value of the answer.
@@ -54,3 +57,17 @@ class TaskRun(db.Model, DomainObject):
             whatever information should be recorded -- up to task presenter
         }
     '''
+
+
+# Indexes used to find the tasks a user has answered, and the answers of a task
+Index('task_run_project_id_user_id_task_id_idx', TaskRun.project_id,
+      TaskRun.user_id, TaskRun.task_id)
+Index('task_run_project_id_user_ip_task_id_idx', TaskRun.project_id,
+      TaskRun.user_ip, TaskRun.task_id)
+Index('task_run_task_id_idx', TaskRun.task_id)
+# Index used by the stats to find the answers not yet in project_activity
+Index('task_run_project_id_id_idx', TaskRun.project_id, TaskRun.id)
+# Indexes used by the stats and dashboards to find the answers of a period
+Index('task_run_finish_time_ts_idx', TaskRun.finish_time_ts)
+Index('task_run_user_id_finish_time_ts_idx', TaskRun.user_id,
+      TaskRun.finish_time_ts)
@@ -0,0 +1,136 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Redis backed counters of the tasks and task runs of the projects."""
+
+
+class ProjectCounters(object):
+
+    """Keep, per project, a Redis hash with its number of tasks, completed
+    tasks and task runs.
+
+    The counters are loaded from the DB the first time they are read, and
+    then kept up to date by the event listeners of Task and TaskRun, so the
+    project pages do not need to count rows. Increments to counters not
+    loaded are ignored, as they will be counted when they are loaded. A
+    background job counts them again regularly to fix any drift (for
+    instance, from transactions rolled back after the listeners ran), and
+    stores them with reconcile, which does not overwrite increments made
+    while counting them.
+    """
+
+    KEY = 'pybossa:project:counters:%s'
+    TTL = 24 * 60 * 60
+    FIELDS = ('n_tasks', 'n_completed_tasks', 'n_task_runs')
+
+    # Only increment the counters of a project if they are loaded
+    INCR = """
+    if redis.call('exists', KEYS[1]) == 0 then
+        return 0
+    end
+    for i = 1, #ARGV, 2 do
+        redis.call('hincrby', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    return 1
+    """
+
+    # Only store the counters of a project if they are still the expected
+    # ones, joined with ':' ('' if not loaded)
+    # KEYS[1]: counters; ARGV: expected, TTL, field, value, field, value...
+    RECONCILE = """
+    local current = {}
+    for i = 3, #ARGV, 2 do
+        local value = redis.call('hget', KEYS[1], ARGV[i])
+        if not value then
+            current = {}
+            break
+        end
+        table.insert(current, value)
+    end
+    if table.concat(current, ':') ~= ARGV[1] then
+        return 0
+    end
+    for i = 3, #ARGV, 2 do
+        redis.call('hset', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('expire', KEYS[1], ARGV[2])
+    return 1
+    """
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def get(self, project_id):
+        """Return a dict with the counters of a project, or None if they are
+        not loaded."""
+        return self.get_many([project_id])[0]
+
+    def get_many(self, project_ids):
+        """Return the counters of many projects, reading them at once."""
+        pipe = self.conn.pipeline(transaction=False)
+        for project_id in project_ids:
+            pipe.hgetall(self.KEY % project_id)
+        return [self._counters(values) for values in pipe.execute()]
+
+    def load(self, counters):
+        """Store the counters of many projects, given as a dict of project
+        id: dict of counters."""
+        pipe = self.conn.pipeline()
+        for project_id, values in counters.items():
+            key = self.KEY % project_id
+            pipe.hmset(key, dict((field, values[field])
+                                 for field in self.FIELDS))
+            pipe.expire(key, self.TTL)
+        pipe.execute()
+
+    def reconcile(self, counters, expected):
+        """Store the counters of many projects like load, but only the ones
+        whose counters in Redis are still the expected ones (None if not
+        loaded), given as a dict of project id: dict of counters.
+
+        Return the ids of the projects whose counters were stored.
+        """
+        reconcile = self.conn.register_script(self.RECONCILE)
+        pipe = self.conn.pipeline()
+        project_ids = list(counters)
+        for project_id in project_ids:
+            values = expected.get(project_id)
+            args = [':'.join(str(values[field]) for field in self.FIELDS)
+                    if values is not None else '', self.TTL]
+            for field in self.FIELDS:
+                args.extend([field, counters[project_id][field]])
+            reconcile(keys=[self.KEY % project_id], args=args, client=pipe)
+        return [project_id for project_id, stored
+                in zip(project_ids, pipe.execute()) if stored]
+
+    def incr(self, project_id, **deltas):
+        """Add the given deltas to the counters of a project, if loaded."""
+        args = []
+        for field, delta in deltas.items():
+            if delta:
+                args.extend([field, delta])
+        if args:
+            self.conn.eval(self.INCR, 1, self.KEY % project_id, *args)
+
+    def invalidate(self, project_id):
+        """Drop the counters of a project, so they are loaded again."""
+        self.conn.delete(self.KEY % project_id)
+
+    def _counters(self, values):
+        if not values or any(field not in values for field in self.FIELDS):
+            return None
+        return dict((field, int(values[field])) for field in self.FIELDS)
@@ -0,0 +1,102 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Redis HyperLogLog sketches of the volunteers of the projects."""
+
+
+class ProjectVolunteers(object):
+
+    """Keep, per project, HyperLogLog sketches of its registered and
+    anonymous volunteers, to count them in constant time (with a standard
+    error of 0.81%).
+
+    Volunteers are added to the sketches when their answers are submitted,
+    but the sketches of a project are only trusted once its existing
+    volunteers have been backfilled, which is flagged by READY_KEY.
+    Volunteers cannot be removed from a sketch, so deleting answers drops
+    the sketches of the project until it is backfilled again.
+    """
+
+    KEY = 'pybossa:project:volunteers:%s:%s'
+    READY_KEY = 'pybossa:project:volunteers:ready:%s'
+    KINDS = ('registered', 'anonymous')
+    CHUNK_SIZE = 1000
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def add(self, project_id, user_id=None, user_ip=None):
+        """Add the volunteer who submitted an answer to the project."""
+        # Volunteers are classified the same way they are counted in SQL
+        if user_id is not None and user_ip is None:
+            self._pfadd(self.KEY % ('registered', project_id), [user_id])
+        elif user_ip is not None and user_id is None:
+            self._pfadd(self.KEY % ('anonymous', project_id), [user_ip])
+
+    def backfill(self, project_id, user_ids, user_ips):
+        """Add the existing volunteers of a project and start trusting its
+        sketches. Volunteers added meanwhile are kept."""
+        for kind, members in (('registered', user_ids),
+                              ('anonymous', user_ips)):
+            key = self.KEY % (kind, project_id)
+            chunk = []
+            for member in members:
+                chunk.append(member)
+                if len(chunk) >= self.CHUNK_SIZE:
+                    self._pfadd(key, chunk)
+                    chunk = []
+            if chunk:
+                self._pfadd(key, chunk)
+        self.conn.set(self.READY_KEY % project_id, 1)
+
+    def ready_many(self, project_ids):
+        """Return whether the sketches of many projects are backfilled."""
+        pipe = self.conn.pipeline(transaction=False)
+        for project_id in project_ids:
+            pipe.exists(self.READY_KEY % project_id)
+        return [bool(ready) for ready in pipe.execute()]
+
+    def count(self, project_id):
+        """Return a dict with the approximate number of registered and
+        anonymous volunteers of a project, or None if not backfilled."""
+        return self.count_many([project_id])[0]
+
+    def count_many(self, project_ids):
+        """Return the approximate volunteers of many projects at once."""
+        pipe = self.conn.pipeline(transaction=False)
+        for project_id in project_ids:
+            pipe.exists(self.READY_KEY % project_id)
+            for kind in self.KINDS:
+                pipe.execute_command('PFCOUNT', self.KEY % (kind, project_id))
+        results = pipe.execute()
+        counts = []
+        for i in xrange(0, len(results), 1 + len(self.KINDS)):
+            if not results[i]:
+                counts.append(None)
+            else:
+                counts.append(dict(zip(self.KINDS, results[i + 1:i + 3])))
+        return counts
+
+    def invalidate(self, project_id):
+        """Drop the sketches of a project, until it is backfilled again."""
+        self.conn.delete(self.READY_KEY % project_id,
+                         *[self.KEY % (kind, project_id)
+                           for kind in self.KINDS])
+
+    def _pfadd(self, key, members):
+        # redis-py does not wrap the HyperLogLog commands yet
+        self.conn.execute_command('PFADD', key, *members)
@@ -23,7 +23,11 @@ from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from pybossa.exc import WrongObjectError, DBIntegrityError
 from pybossa.cache import projects as cached_projects
-from pybossa.core import uploader
+from pybossa.core import uploader, sentinel
+from pybossa.task_pool import TaskPool
+from pybossa.task_candidates import TaskCandidates
+from pybossa.task_leases import TaskLeases
+from pybossa.project_counters import ProjectCounters
 
 
 class TaskRepository(object):
@@ -74,6 +78,7 @@ class TaskRepository(object):
             self.db.session.add(element)
             self.db.session.commit()
             cached_projects.clean_project(element.project_id)
+            self._update_task_pool(element)
         except IntegrityError as e:
             self.db.session.rollback()
             raise DBIntegrityError(e)
@@ -84,6 +89,7 @@ class TaskRepository(object):
             self.db.session.merge(element)
             self.db.session.commit()
             cached_projects.clean_project(element.project_id)
+            self._update_task_pool(element)
         except IntegrityError as e:
             self.db.session.rollback()
             raise DBIntegrityError(e)
@@ -93,6 +99,7 @@ class TaskRepository(object):
         project = element.project
         self.db.session.commit()
         cached_projects.clean_project(element.project_id)
+        self._remove_from_task_pool([element])
         self._delete_zip_files_from_store(project)
 
     def delete_all(self, elements):
@@ -103,6 +110,7 @@ class TaskRepository(object):
         project = elements[0].project
         self.db.session.commit()
         cached_projects.clean_project(element.project_id)
+        self._remove_from_task_pool(elements)
         self._delete_zip_files_from_store(project)
 
     def update_tasks_redundancy(self, project, n_answer):
@@ -128,6 +136,13 @@ class TaskRepository(object):
         self.db.session.execute(sql, dict(n_answers=n_answer, project_id=project.id))
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        # Many tasks may have been reopened or completed, so the pool has to
+        # be refilled, and the cached candidates, lease limits and counters
+        # dropped
+        TaskPool(sentinel.master).invalidate(project.id)
+        TaskCandidates(sentinel.master).invalidate_project(project.id)
+        TaskLeases(sentinel.master).forget_limits(project.id)
+        ProjectCounters(sentinel.master).invalidate(project.id)
 
     def _validate_can_be(self, action, element):
         if not isinstance(element, Task) and not isinstance(element, TaskRun):
@@ -141,6 +156,26 @@ class TaskRepository(object):
         inst = self.db.session.query(table).filter(table.id==element.id).first()
         self.db.session.delete(inst)
 
+    def _update_task_pool(self, element):
+        """Add, re-score or remove a task from the pool of its project, so
+        priority and state changes are used by the scheduler straight away.
+        Cold pools are left alone, as they are fully refilled when needed."""
+        if not isinstance(element, Task):
+            return
+        pool = TaskPool(sentinel.master)
+        if not pool.is_warm(element.project_id):
+            return
+        if element.state == 'completed':
+            pool.remove(element.project_id, element.id)
+        else:
+            pool.add(element.project_id, element.id, element.priority_0)
+
+    def _remove_from_task_pool(self, elements):
+        pool = TaskPool(sentinel.master)
+        for element in elements:
+            if isinstance(element, Task):
+                pool.remove(element.project_id, element.id)
+
     def _delete_zip_files_from_store(self, project):
         from pybossa.core import json_exporter, csv_exporter
         global uploader
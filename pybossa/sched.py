@@ -19,29 +19,72 @@
 from sqlalchemy.sql import text
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
-from pybossa.core import db
+from pybossa.core import db, sentinel
+from pybossa.task_pool import TaskPool
+from pybossa.answered_tasks import AnsweredTasks
+from pybossa.task_leases import TaskLeases
+from pybossa.task_candidates import TaskCandidates
+from pybossa.gold_tasks import GoldTasks
+import itertools
 import random
 
 
 session = db.slave_session
 
+LEASE_BATCH_SIZE = 10
+RANDOM_SAMPLE_SIZE = 20
+CANDIDATES_PAGE_SIZE = 100
+
+# Per scheduling order: the column tasks are sorted by, the ORDER BY, and
+# the condition to read the tasks after the last (sort_key, id) seen. The
+# conditions start with a range on the sort key, so the scan starts there.
+TASK_ORDERS = {
+    'depth_first': ('priority_0', 'priority_0 DESC, id ASC',
+                    'priority_0 <= :sort_key AND '
+                    '(priority_0 < :sort_key OR id > :id)'),
+    'breadth_first': ('n_task_runs', 'n_task_runs ASC, id ASC',
+                      'n_task_runs >= :sort_key AND '
+                      '(n_task_runs > :sort_key OR id > :id)')}
+
 
 def new_task(project_id, sched, user_id=None, user_ip=None, offset=0):
     """Get a new task by calling the appropriate scheduler function."""
+    scheduler = _get_scheduler(sched)
+    return scheduler(project_id, user_id, user_ip, offset=offset)
+
+
+def new_tasks(project_id, sched, user_id=None, user_ip=None, offset=0,
+              limit=1):
+    """Get up to limit new tasks from a single run of the scheduler."""
+    scheduler = _get_scheduler(sched)
+    return scheduler(project_id, user_id, user_ip, offset=offset, limit=limit)
+
+
+def _get_scheduler(sched):
     sched_map = {
         'default': get_depth_first_task,
         'breadth_first': get_breadth_first_task,
         'depth_first': get_depth_first_task,
-        'incremental': get_incremental_task}
-    scheduler = sched_map.get(sched, sched_map['default'])
-    return scheduler(project_id, user_id, user_ip, offset=offset)
+        'incremental': get_incremental_task,
+        'random': get_random_task,
+        'pool': get_pool_task,
+        'calibration': get_calibration_task}
+    return sched_map.get(sched, sched_map['default'])
+
+
+def _first_or_all(tasks, limit):
+    """Return the list of tasks if a limit is given, else the first one."""
+    if limit is not None:
+        return tasks
+    return tasks[0] if tasks else None
 
 
 def get_breadth_first_task(project_id, user_id=None, user_ip=None,
-                           n_answers=30, offset=0):
+                           n_answers=30, offset=0, limit=None):
     """Get a new task which have the least number of task runs.
 
-    It excludes the current user.
+    It excludes the current user. If limit is given, a list with up to limit
+    tasks is returned instead.
 
     Note that it **ignores** the number of answers limit for efficiency reasons
     (this is not a big issue as all it means is that you may end up with some
@@ -52,39 +95,15 @@ def get_breadth_first_task(project_id, user_id=None, user_ip=None,
     # T = timeit.Timer(lambda: get_candidate_task_ids(project_id, user_id,
     #                   user_ip, n_answers))
     # print "First algorithm: %s" % T.timeit(number=1)
-    if user_id and not user_ip:
-        sql = text('''
-                   SELECT task.id, COUNT(task_run.task_id) AS taskcount
-                   FROM task
-                   LEFT JOIN task_run ON (task.id = task_run.task_id)
-                   WHERE NOT EXISTS
-                   (SELECT 1 FROM task_run WHERE project_id=:project_id AND
-                   user_id=:user_id AND task_id=task.id)
-                   AND task.project_id=:project_id AND task.state !='completed'
-                   group by task.id ORDER BY taskcount, id ASC LIMIT 10;
-                   ''')
-        tasks = session.execute(sql, dict(project_id=project_id,
-                                          user_id=user_id))
-    else:
-        if not user_ip:  # pragma: no cover
-            user_ip = '127.0.0.1'
-        sql = text('''
-                   SELECT task.id, COUNT(task_run.task_id) AS taskcount
-                   FROM task
-                   LEFT JOIN task_run ON (task.id = task_run.task_id)
-                   WHERE NOT EXISTS
-                   (SELECT 1 FROM task_run WHERE project_id=:project_id AND
-                   user_ip=:user_ip AND task_id=task.id)
-                   AND task.project_id=:project_id AND task.state !='completed'
-                   group by task.id ORDER BY taskcount, id ASC LIMIT 10;
-                   ''')
-
-        # results will be list of (taskid, count)
-        tasks = session.execute(sql, dict(project_id=project_id,
-                                          user_ip=user_ip))
+    # task.n_task_runs is kept by the TaskRun listeners, so the tasks with
+    # less answers are read from the index without counting the task runs
+    n_candidates = 10 if limit is None else max(10, offset + limit)
+    task_ids = iter_open_task_ids(project_id, user_id, user_ip,
+                                  order='breadth_first',
+                                  page_size=n_candidates)
     # ignore n_answers for the present - we will just keep going once we've
     # done as many as we need
-    tasks = [x[0] for x in tasks]
+    tasks = list(itertools.islice(task_ids, n_candidates))
     #dados = open("/tmp/dados.log", "w")
     #for task in tasks:
     #      dados.write(str(len(task.taskcount))+"\n")
@@ -94,6 +113,8 @@ def get_breadth_first_task(project_id, user_id=None, user_ip=None,
     #      dados.write(str(len(task.taskcount))+"\n")
     #dados.close()
 
+    if limit is not None:
+        return get_tasks(tasks[offset:offset + limit])
 
     if tasks:
         if (offset == 0):
@@ -108,105 +129,401 @@ def get_breadth_first_task(project_id, user_id=None, user_ip=None,
 
 
 def get_depth_first_task(project_id, user_id=None, user_ip=None,
-                         n_answers=30, offset=0):
+                         n_answers=30, offset=0, limit=None):
     """Get a new task for a given project."""
     # Uncomment the next three lines to profile the sched function
     # import timeit
     # T = timeit.Timer(lambda: get_candidate_task_ids(project_id, user_id,
     #                   user_ip, n_answers))
     # print "First algorithm: %s" % T.timeit(number=1)
-    candidate_task_ids = get_candidate_task_ids(project_id, user_id, user_ip,
-                                                n_answers, offset=offset)
-    total_remaining = len(candidate_task_ids)
-    # print "Available tasks %s " % total_remaining
-    if total_remaining == 0:
-        return None
-    if (offset == 0):
-        return session.query(Task).get(candidate_task_ids[0])
-    else:
-        if (offset < len(candidate_task_ids)):
-            return session.query(Task).get(candidate_task_ids[offset])
-        else:
-            return None
-
+    candidate_task_ids = iter_candidate_task_ids(project_id, user_id, user_ip,
+                                                 n_answers, offset=offset)
+    tasks = lease_tasks(project_id, candidate_task_ids, user_id, user_ip,
+                        offset=offset, limit=limit or 1)
+    return _first_or_all(tasks, limit)
 
 
-def get_random_task(app_id, user_id=None, user_ip=None, n_answers=30, offset=0):
-    """Returns a random task for the user"""
-#    app = db.slave_session.query(App).get(app_id)
-#    from random import choice
-#    if len(app.tasks) > 0:
-#        return choice(app.tasks)
-#    else:
-#        return None
+def get_random_task(project_id, user_id=None, user_ip=None, n_answers=30,
+                    offset=0, limit=None):
+    """Get a random task among the open tasks the user has not answered.
 
-    from random import randint
-    candidate_tasks = get_candidate_tasks(app_id, user_id, user_ip, n_answers, offset=0)
-    total_remaining = len(candidate_tasks)
-    #print "Available tasks %s " % total_remaining
-
-    if total_remaining == 0:
-        return None
+    Tasks are sampled from the Redis pool of the project, so the list of
+    candidates is never built. While the pool is cold, they are sampled
+    from a random id onwards in the DB instead. The offset is ignored, as
+    every request already gets a different task.
+    """
+    pool = TaskPool(sentinel.master)
+    if pool.is_warm(project_id):
+        task_ids = pool.random_task_ids(project_id, RANDOM_SAMPLE_SIZE)
     else:
-        t = randint(0, total_remaining-1)
-        return candidate_tasks[t]
+        _request_pool_fill(project_id, pool)
+        task_ids = get_random_task_ids(project_id, RANDOM_SAMPLE_SIZE)
+    task_ids = filter_answered(project_id, task_ids, user_id, user_ip)
+    tasks = lease_tasks(project_id, task_ids, user_id, user_ip,
+                        limit=limit or 1)
+    if len(tasks) < (limit or 1):
+        # The sample was not enough, as the user has answered (or others
+        # have leased) most of the tasks, so try the remaining ones
+        leased = set(task.id for task in tasks)
+        task_ids = (task_id for task_id in
+                    iter_shuffled_candidate_task_ids(project_id, user_id,
+                                                     user_ip)
+                    if task_id not in leased)
+        tasks += lease_tasks(project_id, task_ids, user_id, user_ip,
+                             limit=(limit or 1) - len(tasks))
+    return _first_or_all(tasks, limit)
 
 
 def get_incremental_task(project_id, user_id=None, user_ip=None,
-                         n_answers=30, offset=0):
+                         n_answers=30, offset=0, limit=None):
     """Get a new task for a given project with its last given answer.
->>>>>>> upstream/master
 
     It is an important strategy when dealing with large tasks, as
-    transcriptions.
+    transcriptions. Tasks are picked at random among the cached candidates,
+    so volunteers are spread over them, and their last answer is read using
+    task.last_task_run_id. The offset is ignored, as every request already
+    gets a different task.
     """
-    candidate_task_ids = get_candidate_task_ids(project_id, user_id, user_ip,
-                                                n_answers, offset=0)
-    total_remaining = len(candidate_task_ids)
-    if total_remaining == 0:
-        return None
-    rand = random.randrange(0, total_remaining)
-    task_id = candidate_task_ids[rand]
-    task = session.query(Task).get(task_id)
-    # Find last answer for the task
-    q = session.query(TaskRun)\
-        .filter(TaskRun.task_id == task.id)\
-        .order_by(TaskRun.finish_time.desc())
-    last_task_run = q.first()
-    if last_task_run:
-        task.info['last_answer'] = last_task_run.info
-        # TODO: As discussed in GitHub #53
-        # it is necessary to create a lock in the task!
-    return task
+    # Leases make sure a task is only being transcribed by as many users as
+    # answers it still needs
+    task_ids = iter_shuffled_candidate_task_ids(project_id, user_id, user_ip,
+                                                n_answers)
+    tasks = lease_tasks(project_id, task_ids, user_id, user_ip,
+                        limit=limit or 1)
+    last_task_run_ids = [task.last_task_run_id for task in tasks
+                         if task.last_task_run_id is not None]
+    if last_task_run_ids:
+        task_runs = session.query(TaskRun)\
+            .filter(TaskRun.id.in_(last_task_run_ids))
+        last_answers = dict((tr.id, tr.info) for tr in task_runs)
+        for task in tasks:
+            if task.last_task_run_id in last_answers:
+                task.info['last_answer'] = last_answers[task.last_task_run_id]
+    return _first_or_all(tasks, limit)
+
+
+def get_pool_task(project_id, user_id=None, user_ip=None,
+                  n_answers=30, offset=0, limit=None):
+    """Get a new task from the Redis pool of open tasks of a project.
+
+    Tasks are handed out in depth_first order. While the pool is cold the
+    depth_first SQL scheduler is used instead, and a background job is
+    requested to fill the pool.
+    """
+    pool = TaskPool(sentinel.master)
+    if not pool.is_warm(project_id):
+        _request_pool_fill(project_id, pool)
+        return get_depth_first_task(project_id, user_id, user_ip,
+                                    n_answers, offset=offset, limit=limit)
+    candidate_task_ids = (task_id
+                          for task_ids in pool.iter_task_ids(project_id)
+                          for task_id in filter_answered(project_id, task_ids,
+                                                         user_id, user_ip))
+    tasks = lease_tasks(project_id, candidate_task_ids, user_id, user_ip,
+                        offset=offset, limit=limit or 1)
+    return _first_or_all(tasks, limit)
+
+
+def get_calibration_task(project_id, user_id=None, user_ip=None,
+                         n_answers=30, offset=0, limit=None):
+    """Get a new task, being a gold one with probability calibration_frac.
+
+    Gold tasks (task.calibration) are picked from the cached gold pool of
+    the project among the ones the user has not answered, and are not
+    leased, as every volunteer can answer them. The rest of the tasks are
+    served in depth_first order, skipping the gold ones.
+    """
+    calibration_frac, gold_task_ids = get_gold_task_ids(project_id)
+    gold = set(gold_task_ids)
+    gold_task_ids = filter_answered(project_id, gold_task_ids, user_id,
+                                    user_ip)
+    n_tasks = limit or 1
+    n_gold = len([i for i in range(n_tasks)
+                  if random.random() < calibration_frac])
+    gold_task_ids = random.sample(gold_task_ids,
+                                  min(n_gold, len(gold_task_ids)))
+    candidate_task_ids = (task_id for task_id in
+                          iter_candidate_task_ids(project_id, user_id,
+                                                  user_ip, n_answers,
+                                                  offset=offset)
+                          if task_id not in gold)
+    tasks = lease_tasks(project_id, candidate_task_ids, user_id, user_ip,
+                        offset=offset, limit=n_tasks - len(gold_task_ids))
+    tasks += get_tasks(gold_task_ids)
+    random.shuffle(tasks)
+    return _first_or_all(tasks, limit)
+
+
+def lease_tasks(project_id, task_ids, user_id=None, user_ip=None, offset=0,
+                limit=1):
+    """Return up to limit of task_ids that can be leased to the user.
+
+    A task is leased at most as many times as answers it still needs, and
+    leases last Project.time_limit seconds (or TaskLeases.TTL if it is not
+    set). The first offset leased tasks are skipped, so prefetching the
+    next tasks also reserves them.
+
+    Both limits are cached in Redis (see TaskLeases), so only the tasks
+    whose limits are not cached are read from the DB.
+    """
+    leases = TaskLeases(sentinel.master)
+    holder = leases.holder(user_id, user_ip)
+    task_ids = iter(task_ids)
+    leased = []
+    while len(leased) < limit:
+        batch = list(itertools.islice(task_ids, LEASE_BATCH_SIZE))
+        if not batch:
+            break
+        time_limit, max_leases = leases.get_limits(project_id, batch)
+        missing = [task_id for task_id in batch if task_id not in max_leases]
+        if missing or time_limit is None:
+            time_limit, missing_max_leases = get_lease_limits(project_id,
+                                                              missing)
+            leases.set_limits(project_id, time_limit, missing_max_leases)
+            max_leases.update(missing_max_leases)
+        for task_id in batch:
+            # Completed tasks can have no leases
+            if max_leases.get(task_id, 0) <= 0:
+                continue
+            if not leases.acquire(task_id, holder, max_leases[task_id],
+                                  timeout=time_limit):
+                continue
+            if offset > 0:
+                offset -= 1
+                continue
+            leased.append(task_id)
+            if len(leased) == limit:
+                break
+    return get_tasks(leased)
+
+
+def get_lease_limits(project_id, task_ids):
+    """Return the time_limit of a project and a dict with the max number of
+    leases of the given tasks of it: the answers they still need, or 0 if
+    completed."""
+    sql = text('''
+               SELECT project.time_limit, task.id, task.state, task.n_answers,
+               task.n_task_runs FROM project LEFT JOIN task
+               ON (task.project_id = project.id AND task.id = ANY(:task_ids))
+               WHERE project.id=:project_id;
+               ''')
+    rows = session.execute(sql, dict(task_ids=task_ids,
+                                     project_id=project_id)).fetchall()
+    time_limit = rows[0].time_limit if rows else None
+    max_leases = dict((row.id, 0 if row.state == 'completed' else
+                       (row.n_answers or 0) - row.n_task_runs)
+                      for row in rows if row.id is not None)
+    return time_limit, max_leases
+
+
+def get_tasks(task_ids):
+    """Return the tasks with the given ids, in the same order, in one query."""
+    if not task_ids:
+        return []
+    tasks = session.query(Task).filter(Task.id.in_(task_ids)).all()
+    tasks = dict((task.id, task) for task in tasks)
+    return [tasks[task_id] for task_id in task_ids if task_id in tasks]
+
+
+def _request_pool_fill(project_id, pool):
+    """Enqueue a job to fill the pool of a project, unless already done."""
+    if pool.start_filling(project_id):
+        from rq import Queue
+        from pybossa.jobs import fill_task_pool
+        queue = Queue('high', connection=sentinel.master)
+        queue.enqueue(fill_task_pool, project_id)
+
+
+def get_open_tasks(project_id):
+    """Return (id, priority_0) for all the open tasks of a project."""
+    query = text('''
+                 SELECT id, priority_0 FROM task
+                 WHERE project_id=:project_id AND state !='completed'
+                 ''').execution_options(stream=True)
+    rows = session.execute(query, dict(project_id=project_id))
+    return ((row.id, row.priority_0) for row in rows)
+
+
+def get_random_task_ids(project_id, limit):
+    """Return up to limit open task ids from a random task id onwards.
+
+    When there are less than limit tasks after the random id, the sample
+    wraps around to the lowest ids, so it is only short when the project has
+    less than limit open tasks.
+    """
+    query = text('''
+                 WITH start AS (
+                 SELECT MIN(id) + FLOOR(RANDOM() * (MAX(id) - MIN(id) + 1))
+                 AS id FROM task
+                 WHERE project_id=:project_id AND state !='completed')
+                 SELECT id FROM (
+                 (SELECT 0 AS wrapped, task.id FROM task, start
+                  WHERE project_id=:project_id AND state !='completed'
+                  AND task.id >= start.id ORDER BY task.id LIMIT :limit)
+                 UNION ALL
+                 (SELECT 1 AS wrapped, task.id FROM task, start
+                  WHERE project_id=:project_id AND state !='completed'
+                  AND task.id < start.id ORDER BY task.id LIMIT :limit)
+                 ) AS sample ORDER BY wrapped, id LIMIT :limit''')
+    rows = session.execute(query, dict(project_id=project_id, limit=limit))
+    task_ids = [row.id for row in rows]
+    random.shuffle(task_ids)
+    return task_ids
 
 
 def get_candidate_task_ids(project_id, user_id=None, user_ip=None,
-                        n_answers=30, offset=0):
-    """Get all available tasks for a given project and user."""
-    rows = None
+                           n_answers=30, offset=0):
+    """Get the first CANDIDATES_PAGE_SIZE available tasks for a given
+    project and user (see iter_candidate_task_ids for all of them).
+
+    The list is cached for a few seconds, so prefetching the next tasks with
+    offset does not query them again.
+    """
+    candidates = TaskCandidates(sentinel.master)
+    task_ids = candidates.get(project_id, user_id, user_ip)
+    if task_ids is not None:
+        return task_ids
+    version = candidates.version(project_id)
+    task_ids = list(itertools.islice(
+        iter_open_task_ids(project_id, user_id, user_ip),
+        CANDIDATES_PAGE_SIZE))
+    candidates.set(project_id, task_ids, version, user_id, user_ip)
+    return task_ids
+
+
+def iter_candidate_task_ids(project_id, user_id=None, user_ip=None,
+                            n_answers=30, offset=0):
+    """Yield all available tasks for a given project and user.
+
+    The first ones are the cached candidates of get_candidate_task_ids. The
+    rest are only read, page by page after them, if the first ones are not
+    enough (e.g. because other users have leased them).
+    """
+    task_ids = get_candidate_task_ids(project_id, user_id, user_ip,
+                                      n_answers, offset=offset)
+    for task_id in task_ids:
+        yield task_id
+    if len(task_ids) < CANDIDATES_PAGE_SIZE:
+        return
+    last = session.query(Task.priority_0, Task.id)\
+        .filter(Task.id == task_ids[-1]).first()
+    if last is None:
+        return
+    for task_id in iter_open_task_ids(project_id, user_id, user_ip,
+                                      after=tuple(last)):
+        yield task_id
+
+
+def iter_shuffled_candidate_task_ids(project_id, user_id=None, user_ip=None,
+                                     n_answers=30):
+    """Yield the tasks of iter_candidate_task_ids, the cached ones shuffled.
+
+    Only the cached first page is shuffled, so sampling does not cost any
+    query, and the rest of the tasks follow in order if it is not enough.
+    """
+    task_ids = iter_candidate_task_ids(project_id, user_id, user_ip,
+                                       n_answers)
+    first_page = list(itertools.islice(task_ids, CANDIDATES_PAGE_SIZE))
+    random.shuffle(first_page)
+    return itertools.chain(first_page, task_ids)
+
+
+def iter_open_task_ids(project_id, user_id=None, user_ip=None,
+                       order='depth_first', after=None, page_size=None):
+    """Yield the ids of the open tasks the user has not answered, in order.
+
+    Tasks are read in pages from the last (sort_key, id) seen, or from
+    after if given, and the answered ones are filtered out of every page, so
+    the cost does not grow with the number of tasks the user has answered.
+    """
+    sort_key, order_by, after_sql = TASK_ORDERS[order]
+    page_size = page_size or CANDIDATES_PAGE_SIZE
+    while True:
+        sql = '''
+              SELECT id, %s AS sort_key FROM task
+              WHERE project_id=:project_id AND state !='completed'
+              ''' % sort_key
+        params = dict(project_id=project_id, limit=page_size)
+        if after is not None:
+            sql += 'AND %s ' % after_sql
+            params.update(sort_key=after[0], id=after[1])
+        sql += 'ORDER BY %s LIMIT :limit' % order_by
+        rows = session.execute(text(sql), params).fetchall()
+        if not rows:
+            return
+        for task_id in filter_answered(project_id, [row.id for row in rows],
+                                       user_id, user_ip):
+            yield task_id
+        if len(rows) < page_size:
+            return
+        after = (rows[-1].sort_key, rows[-1].id)
+
+
+def filter_answered(project_id, task_ids, user_id=None, user_ip=None):
+    """Return the task_ids the user has not answered, in the same order."""
+    flags = AnsweredTasks(sentinel.master).contains(project_id, task_ids,
+                                                    user_id, user_ip)
+    if flags is None:
+        answered = get_answered_task_ids(project_id, user_id, user_ip)
+        return [task_id for task_id in task_ids if task_id not in answered]
+    return [task_id for task_id, answered in zip(task_ids, flags)
+            if not answered]
+
+
+def get_gold_task_ids(project_id):
+    """Return (calibration_frac, gold task ids) of a project.
+
+    Both are cached by GoldTasks, and loaded with a single query when they
+    are not there.
+    """
+    gold_tasks = GoldTasks(sentinel.master)
+    gold = gold_tasks.get(project_id)
+    if gold is not None:
+        return gold
+    query = text('''
+                 SELECT project.calibration_frac, task.id FROM project
+                 LEFT JOIN task ON (task.project_id = project.id
+                                    AND task.calibration = 1)
+                 WHERE project.id=:project_id ORDER BY task.id''')
+    rows = session.execute(query, dict(project_id=project_id)).fetchall()
+    calibration_frac = (rows[0].calibration_frac if rows else 0) or 0
+    task_ids = [row.id for row in rows if row.id is not None]
+    gold_tasks.set(project_id, calibration_frac, task_ids)
+    return calibration_frac, task_ids
+
+
+def get_answered_task_ids(project_id, user_id=None, user_ip=None):
+    """Return the set of task ids a user has already answered in a project.
+
+    The set is kept in Redis by the TaskRun listeners, and only loaded from
+    the DB when it is not there. It is loaded from the master, as an answer
+    missing from a lagging replica would be missing from the set until it
+    expires.
+    """
+    answered_tasks = AnsweredTasks(sentinel.master)
+    answered = answered_tasks.get(project_id, user_id, user_ip)
+    if answered is not None:
+        return answered
     if user_id and not user_ip:
         query = text('''
-                     SELECT id FROM task WHERE NOT EXISTS
-                     (SELECT task_id FROM task_run WHERE
-		     project_id=:project_id AND user_id=:user_id AND task_id=task.id)
-		     AND project_id=:project_id AND state !='completed'
-                     ORDER BY priority_0 DESC, id ASC LIMIT 100''')         
-        rows = session.execute(query, dict(project_id=project_id,
-                                           user_id=user_id))
+                     SELECT task_id FROM task_run WHERE
+                     project_id=:project_id AND user_id=:user_id''')
+        rows = db.session.execute(query, dict(project_id=project_id,
+                                              user_id=user_id))
     else:
         if not user_ip:
             user_ip = '127.0.0.1'
         query = text('''
-                     SELECT id FROM task WHERE NOT EXISTS
-                     (SELECT task_id FROM task_run WHERE
-		     project_id=:project_id AND user_ip=:user_ip AND task_id=task.id)
-	             AND project_id=:project_id AND state !='completed'
-                     ORDER BY priority_0 DESC, id ASC LIMIT 100''')
-        rows = session.execute(query, dict(project_id=project_id,
-                                           user_ip=user_ip))
+                     SELECT task_id FROM task_run WHERE
+                     project_id=:project_id AND user_ip=:user_ip''')
+        rows = db.session.execute(query, dict(project_id=project_id,
+                                              user_ip=user_ip))
+    answered = set(row.task_id for row in rows)
+    answered_tasks.load(project_id, answered, user_id, user_ip)
+    return answered
 
-    return [t.id for t in rows]
 
 def sched_variants():
     return [('default', 'Default'), ('breadth_first', 'Breadth First'),
-            ('depth_first', 'Depth First')]
+            ('depth_first', 'Depth First'), ('random', 'Random'),
+            ('pool', 'Task Pool'), ('calibration', 'Calibration')]
@@ -0,0 +1,79 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Short-lived cache of the candidate tasks of every user of a project."""
+import json
+from pybossa.util import get_volunteer_key
+
+
+class TaskCandidates(object):
+
+    """Keep, per project and user (or IP), the list of candidate task ids.
+
+    A volunteer requesting a task and then prefetching the next ones with
+    offset gets the same candidates, so they are only queried once. Lists
+    expire after TTL seconds, and are dropped as soon as the user submits
+    an answer, as the answered task must no longer be a candidate.
+
+    Lists are stored with the version of the project tasks, which is
+    incremented whenever a task is created or updated, so a new task or
+    priority is taken into account for every user with a single INCR.
+    """
+
+    KEY = 'pybossa:sched:candidates:project:%s:%s'
+    VERSION_KEY = 'pybossa:sched:candidates:version:project:%s'
+    TTL = 10
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def get(self, project_id, user_id=None, user_ip=None):
+        """Return the list of candidate task ids, or None if not cached."""
+        key = self._key(project_id, user_id, user_ip)
+        version, value = self.conn.mget(self.VERSION_KEY % project_id, key)
+        if value is None:
+            return None
+        value = json.loads(value)
+        if value['version'] != int(version or 0):
+            return None
+        return value['task_ids']
+
+    def version(self, project_id):
+        """Return the version of the project tasks.
+
+        It must be read before querying the candidates, and given to set, so
+        a change of the tasks while querying them is not missed.
+        """
+        return int(self.conn.get(self.VERSION_KEY % project_id) or 0)
+
+    def set(self, project_id, task_ids, version, user_id=None, user_ip=None):
+        """Store the list of candidate task ids of a user, queried when the
+        project tasks were at the given version."""
+        value = json.dumps(dict(version=version, task_ids=list(task_ids)))
+        self.conn.setex(self._key(project_id, user_id, user_ip), self.TTL,
+                        value)
+
+    def invalidate(self, project_id, user_id=None, user_ip=None):
+        """Drop the list of candidate task ids of a user."""
+        self.conn.delete(self._key(project_id, user_id, user_ip))
+
+    def invalidate_project(self, project_id):
+        """Drop the lists of candidate task ids of all the project users."""
+        self.conn.incr(self.VERSION_KEY % project_id)
+
+    def _key(self, project_id, user_id=None, user_ip=None):
+        return self.KEY % (project_id, get_volunteer_key(user_id, user_ip))
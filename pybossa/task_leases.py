@@ -0,0 +1,118 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Leases that limit how many users are working on a task at once."""
+import time
+from pybossa.util import get_volunteer_key
+
+
+class TaskLeases(object):
+
+    """Keep, per task, a Redis sorted set with the users holding a lease.
+
+    Every member is a user (or IP) and its score the time its lease expires.
+    A task can only be leased to as many users as answers it still needs,
+    so concurrent requests do not hand the same task out more times than
+    the answers it needs. Expired leases are purged on every acquisition.
+
+    The number of leases every task can have, and how long they last (the
+    time_limit of its project), are cached per project, so leasing the
+    tasks does not need to read them from the DB. A task limit is dropped
+    whenever its task or its answers change, and the whole hash expires
+    after LIMITS_TTL seconds in case a change raced with the caching.
+    """
+
+    KEY = 'pybossa:sched:leases:task:%s'
+    LIMITS_KEY = 'pybossa:sched:leases:limits:project:%s'
+    # Short, as an abandoned task is not handed out again until then
+    TTL = 10 * 60
+    LIMITS_TTL = 60
+
+    # KEYS[1]: leases of the task
+    # ARGV: now, expiration, holder, max number of leases, key TTL
+    ACQUIRE = """
+    redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+    if not redis.call('zscore', KEYS[1], ARGV[3]) and
+            redis.call('zcard', KEYS[1]) >= tonumber(ARGV[4]) then
+        return 0
+    end
+    redis.call('zadd', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('expire', KEYS[1], ARGV[5])
+    return 1
+    """
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+        self._acquire = self.conn.register_script(self.ACQUIRE)
+
+    def holder(self, user_id=None, user_ip=None):
+        """Return the lease holder name for a user or IP."""
+        return get_volunteer_key(user_id, user_ip)
+
+    def acquire(self, task_id, holder, max_leases, timeout=None):
+        """Lease a task to a holder if there are less than max_leases.
+
+        A holder that already has a lease on the task always gets it renewed.
+        Return True if the task is leased to the holder.
+        """
+        timeout = timeout or self.TTL
+        now = time.time()
+        args = [now, now + timeout, holder, max(max_leases, 0), int(timeout)]
+        return bool(self._acquire(keys=[self.KEY % task_id], args=args))
+
+    def release(self, task_id, holder):
+        """Release the lease of a holder on a task."""
+        self.conn.zrem(self.KEY % task_id, holder)
+
+    def release_all(self, task_id):
+        """Release all the leases on a task."""
+        self.conn.delete(self.KEY % task_id)
+
+    def count(self, task_id):
+        """Return the number of leases on a task that have not expired."""
+        return self.conn.zcount(self.KEY % task_id, time.time(), '+inf')
+
+    def get_limits(self, project_id, task_ids):
+        """Return the cached time limit of a project (None if not cached)
+        and a dict with the cached max number of leases of the given tasks.
+        """
+        values = self.conn.hmget(self.LIMITS_KEY % project_id,
+                                 ['time_limit'] + list(task_ids))
+        time_limit = int(values[0]) if values[0] is not None else None
+        max_leases = dict((task_id, int(value)) for task_id, value
+                          in zip(task_ids, values[1:]) if value is not None)
+        return time_limit, max_leases
+
+    def set_limits(self, project_id, time_limit, max_leases):
+        """Cache the time limit of a project (0 if it has none) and the max
+        number of leases of some of its tasks, given as a dict."""
+        key = self.LIMITS_KEY % project_id
+        mapping = dict(max_leases)
+        mapping['time_limit'] = time_limit or 0
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.hmset(key, mapping)
+        pipe.ttl(key)
+        if pipe.execute()[1] in (None, -1):
+            # Only set when created, so stale limits never outlive it
+            self.conn.expire(key, self.LIMITS_TTL)
+
+    def forget_limits(self, project_id, task_id=None):
+        """Drop the cached limits of a task, or of the whole project."""
+        if task_id is None:
+            self.conn.delete(self.LIMITS_KEY % project_id)
+        else:
+            self.conn.hdel(self.LIMITS_KEY % project_id, task_id)
@@ -0,0 +1,135 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+"""Redis backed pool of open tasks used by the task scheduler."""
+import random
+
+
+class TaskPool(object):
+
+    """Keep, per project, a Redis sorted set with the ids of its open tasks.
+
+    Members are sorted the same way the depth_first scheduler sorts tasks
+    (priority_0 DESC, id ASC): the score is the negated priority, and the
+    ids are zero padded so Redis lexicographical ordering of members with
+    the same score matches the numerical one.
+
+    A pool is only trusted while its "warm" flag exists. The flag expires
+    after WARM_TTL seconds, so a pool that stops being refilled by the
+    background job goes cold and the scheduler falls back to SQL.
+    """
+
+    POOL_KEY = 'pybossa:sched:pool:project:%s'
+    WARM_KEY = 'pybossa:sched:pool:warm:project:%s'
+    FILLING_KEY = 'pybossa:sched:pool:filling:project:%s'
+    WARM_TTL = 30 * 60
+    FILLING_TTL = 10 * 60
+    ID_WIDTH = 12
+    CHUNK_SIZE = 100
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+
+    def is_warm(self, project_id):
+        """Return whether the pool of a project can be used."""
+        return bool(self.conn.exists(self.WARM_KEY % project_id))
+
+    def fill(self, project_id, tasks):
+        """Replace the pool of a project with the given (id, priority) rows."""
+        key = self.POOL_KEY % project_id
+        tmp_key = '%s:tmp' % key
+        # Every chunk is sent on its own, so Redis is never blocked by the
+        # whole insert. The tmp key is only visible once renamed.
+        self.conn.delete(tmp_key)
+        pairs = []
+        for task_id, priority in tasks:
+            pairs.extend([self._score(priority), self._member(task_id)])
+            if len(pairs) >= 2 * self.CHUNK_SIZE:
+                self.conn.zadd(tmp_key, *pairs)
+                pairs = []
+        if pairs:
+            self.conn.zadd(tmp_key, *pairs)
+        # RENAME swaps the pools atomically, but fails if there were no open
+        # tasks to add, and then the pool must simply be emptied
+        if self.conn.exists(tmp_key):
+            self.conn.rename(tmp_key, key)
+        else:
+            self.conn.delete(key)
+        self.conn.setex(self.WARM_KEY % project_id, self.WARM_TTL, 1)
+        self.conn.delete(self.FILLING_KEY % project_id)
+
+    def start_filling(self, project_id):
+        """Flag the pool as being filled. Return False if it already was."""
+        key = self.FILLING_KEY % project_id
+        if self.conn.setnx(key, 1):
+            self.conn.expire(key, self.FILLING_TTL)
+            return True
+        return False
+
+    def add(self, project_id, task_id, priority=0):
+        """Add (or re-score) a task in the pool of a project."""
+        self.conn.zadd(self.POOL_KEY % project_id,
+                       self._score(priority), self._member(task_id))
+
+    def remove(self, project_id, task_id):
+        """Remove a task from the pool of a project."""
+        self.conn.zrem(self.POOL_KEY % project_id, self._member(task_id))
+
+    def invalidate(self, project_id):
+        """Drop the pool of a project, so it is cold until refilled."""
+        self.conn.delete(self.POOL_KEY % project_id,
+                         self.WARM_KEY % project_id)
+
+    def size(self, project_id):
+        """Return the number of tasks in the pool of a project."""
+        return self.conn.zcard(self.POOL_KEY % project_id)
+
+    def iter_task_ids(self, project_id, chunk_size=None):
+        """Yield lists with the task ids of the pool, in scheduling order."""
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        key = self.POOL_KEY % project_id
+        start = 0
+        while True:
+            members = self.conn.zrange(key, start, start + chunk_size - 1)
+            if not members:
+                return
+            yield [int(member) for member in members]
+            if len(members) < chunk_size:
+                return
+            start += chunk_size
+
+    def random_task_ids(self, project_id, count):
+        """Return up to count different task ids picked at random.
+
+        Every task is looked up by a random rank in the sorted set, so the
+        cost does not depend on the size of the pool.
+        """
+        key = self.POOL_KEY % project_id
+        size = self.size(project_id)
+        if not size:
+            return []
+        pipe = self.conn.pipeline()
+        for rank in random.sample(xrange(size), min(count, size)):
+            pipe.zrange(key, rank, rank)
+        return [int(member) for members in pipe.execute()
+                for member in members]
+
+    def _score(self, priority):
+        return -float(priority or 0)
+
+    def _member(self, task_id):
+        return str(task_id).zfill(self.ID_WIDTH)
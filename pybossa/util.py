@@ -361,6 +361,17 @@ def get_user_id_or_ip():
     return dict(user_id=user_id, user_ip=user_ip)
 
 
+def get_volunteer_key(user_id=None, user_ip=None):
+    """Return the name of a user or IP in the Redis keys of the schedulers.
+
+    Same precedence as the SQL schedulers: user_id is only used when no IP
+    is given, and the IP defaults to 127.0.0.1.
+    """
+    if user_id and not user_ip:
+        return 'user:%s' % user_id
+    return 'ip:%s' % (user_ip or '127.0.0.1')
+
+
 def with_cache_disabled(f):
     """Decorator that disables the cache for the execution of a function.
     It enables it back when the function call is done.
@@ -44,6 +44,7 @@ from pybossa.auth import ensure_authorized_to
 from pybossa.jobs import send_mail
 from pybossa.core import user_repo
 from pybossa.feed import get_update_feed
+from pybossa.access_log import AccessLog
 
 from pybossa.forms.account_view_forms import *
 
@@ -51,6 +52,7 @@ from pybossa.forms.account_view_forms import *
 blueprint = Blueprint('account', __name__)
 
 mail_queue = Queue('super', connection=sentinel.master)
+access_log = AccessLog(sentinel.master)
 
 
 @blueprint.route('/', defaults={'page': 1})
@@ -292,6 +294,9 @@ def profile(name):
     if user is None:
         raise abort(404)
     if current_user.is_anonymous() or (user.id != current_user.id):
+        # Visited profiles are warmed first by the cache warming job
+        access_log.record('user', user.id,
+                          current_app.config.get('ACCESS_LOG_SAMPLE_RATE'))
         return _show_public_profile(user)
     if current_user.is_authenticated() and user.id == current_user.id:
         return _show_own_profile(user)
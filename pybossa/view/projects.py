@@ -57,11 +57,13 @@ from pybossa.importers import BulkImportException
 from pybossa.core import project_repo, user_repo, task_repo, blog_repo, auditlog_repo
 from pybossa.auditlogger import AuditLogger
 from pybossa.api import mark_task_as_requested_by_user
+from pybossa.access_log import AccessLog
 
 blueprint = Blueprint('project', __name__)
 
 auditlogger = AuditLogger(auditlog_repo, caller='web')
 importer_queue = Queue('medium', connection=sentinel.master)
+access_log = AccessLog(sentinel.master)
 MAX_NUM_SYNCHRONOUS_TASKS_IMPORT = 200
 HOUR = 60 * 60
 
@@ -76,6 +78,9 @@ def project_title(project, page_name):
 def project_by_shortname(short_name):
     project = cached_projects.get_project(short_name)
     if project:
+        # Visited projects are warmed first by the cache warming job
+        access_log.record('project', project.id,
+                          current_app.config.get('ACCESS_LOG_SAMPLE_RATE'))
         # Get owner
         owner = user_repo.get(project.owner_id)
         # Populate CACHE with the data of the project
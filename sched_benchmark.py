@@ -0,0 +1,271 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+#!/usr/bin/env python
+"""Benchmark the task schedulers on synthetic large projects.
+
+The benchmark creates projects, users, tasks and task runs in the DB
+configured in the settings, so never run it against a production server.
+Usage:
+
+    python sched_benchmark.py benchmark 1000000 10000000 500 results.json
+
+creates a project with 10^6 tasks and 10^7 task runs, measures the latency
+of 500 new_task requests for every scheduler and kind of user, writes the
+p50/p99 (in milliseconds) as JSON to results.json and deletes the project.
+"""
+import sys
+import json
+import math
+import time
+import uuid
+import optparse
+import inspect
+
+#import pybossa.model as model
+from pybossa.core import db, sentinel, create_app
+from sqlalchemy.sql import text
+
+app = create_app(run_as_server=False)
+
+SCHEDULERS = ['default', 'breadth_first', 'depth_first', 'incremental',
+              'random', 'pool']
+POOL_SCHEDULERS = ['random', 'incremental', 'pool']
+
+
+def benchmark(n_tasks, n_task_runs, n_requests=200, output=None):
+    '''Create a synthetic project, benchmark it and delete it'''
+    project_id = _create_project(int(n_tasks), int(n_task_runs))
+    try:
+        run(project_id, n_requests, output)
+    finally:
+        delete_project(project_id)
+
+
+def create_project(n_tasks, n_task_runs):
+    '''Create a synthetic project with n_tasks and n_task_runs'''
+    print _create_project(int(n_tasks), int(n_task_runs))
+
+
+def run(project_id, n_requests=200, output=None):
+    '''Benchmark the schedulers with an existing synthetic project'''
+    project_id = int(project_id)
+    n_requests = int(n_requests)
+    with app.app_context():
+        from pybossa import sched
+        from pybossa.jobs import fill_task_pool
+        counts = db.session.execute(text('''
+            SELECT COUNT(id) AS n_tasks, SUM(n_task_runs) AS n_task_runs
+            FROM task WHERE project_id=:project_id'''),
+            dict(project_id=project_id)).first()
+        user_ids = [row.id for row in db.session.execute(text('''
+            SELECT DISTINCT user_id AS id FROM task_run
+            WHERE project_id=:project_id AND user_id IS NOT NULL'''),
+            dict(project_id=project_id))]
+        results = dict(project_id=project_id,
+                       n_tasks=counts.n_tasks,
+                       n_task_runs=int(counts.n_task_runs or 0),
+                       n_requests=n_requests,
+                       schedulers={})
+        for name in SCHEDULERS:
+            _reset_scheduler_keys()
+            if name in POOL_SCHEDULERS:
+                fill_task_pool(project_id)
+            results['schedulers'][name] = dict(
+                auth=_measure(sched, project_id, name, n_requests,
+                              user_ids=user_ids),
+                anon=_measure(sched, project_id, name, n_requests))
+        _reset_scheduler_keys()
+    out = json.dumps(results, sort_keys=True, indent=4)
+    if output:
+        with open(output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print out
+
+
+def delete_project(project_id):
+    '''Delete a synthetic project and its users'''
+    project_id = int(project_id)
+    with app.app_context():
+        name = db.session.execute(text('''
+            SELECT short_name FROM project WHERE id=:project_id'''),
+            dict(project_id=project_id)).scalar()
+        if not name or not name.startswith('schedbench_'):
+            print "Project %s is not a benchmark project" % project_id
+            sys.exit(1)
+        params = dict(project_id=project_id, users='%s_%%' % name)
+        db.session.execute(text('''DELETE FROM task_run
+                                WHERE project_id=:project_id'''), params)
+        db.session.execute(text('''DELETE FROM task
+                                WHERE project_id=:project_id'''), params)
+        db.session.execute(text('''DELETE FROM project
+                                WHERE id=:project_id'''), params)
+        db.session.execute(text('''DELETE FROM "user"
+                                WHERE name LIKE :users'''), params)
+        db.session.commit()
+        _reset_scheduler_keys()
+
+
+def _create_project(n_tasks, n_task_runs):
+    from pybossa.model.category import Category
+    from pybossa.model.project import Project
+    name = 'schedbench_%s' % uuid.uuid4().hex[:8]
+    # Every task gets at most one answer from each user or IP: answers are
+    # given in rounds over all the tasks, alternating users and IPs
+    n_rounds = n_task_runs / n_tasks + 1
+    n_users = n_rounds / 2 + 1
+    with app.app_context():
+        t0 = time.time()
+        db.session.execute(text('''
+            INSERT INTO "user" (created, email_addr, name, fullname, locale,
+                                privacy_mode)
+            SELECT now(), :name || '_' || s || '@example.com',
+                   :name || '_' || s, :name, 'en', true
+            FROM generate_series(1, :n_users) AS s'''),
+            dict(name=name, n_users=n_users))
+        owner_id = db.session.execute(text('''
+            SELECT MIN(id) FROM "user" WHERE name LIKE :users'''),
+            dict(users='%s_%%' % name)).scalar()
+        category = db.session.query(Category).first()
+        if category is None:
+            category = Category(name=name, short_name=name, description=name)
+        project = Project(name=name, short_name=name, description=name,
+                          owner_id=owner_id, category=category)
+        db.session.add(project)
+        db.session.commit()
+        project_id = project.id
+        params = dict(project_id=project_id, n_tasks=n_tasks,
+                      n_task_runs=n_task_runs, n_users=n_users,
+                      users='%s_%%' % name)
+        db.session.execute(text('''
+            INSERT INTO task (created, project_id, state, quorum, calibration,
+                              priority_0, info, n_answers, n_task_runs)
+            SELECT now(), :project_id, 'ongoing', 0, 0, random(), '{}',
+                   5 + s % 11, 0
+            FROM generate_series(1, :n_tasks) AS s'''), params)
+        db.session.execute(text('''
+            WITH tasks AS (
+                SELECT id, row_number() OVER (ORDER BY id) - 1 AS n
+                FROM task WHERE project_id=:project_id
+            ), users AS (
+                SELECT id, row_number() OVER (ORDER BY id) - 1 AS n
+                FROM "user" WHERE name LIKE :users
+            ), answers AS (
+                SELECT s % :n_tasks AS task_n, s / :n_tasks AS round
+                FROM generate_series(0, :n_task_runs - 1) AS s
+            )
+            INSERT INTO task_run (created, project_id, task_id, user_id,
+                                  user_ip, finish_time, info)
+            SELECT now(), :project_id, tasks.id, users.id,
+                   CASE WHEN answers.round % 2 = 1 THEN
+                   '10.' || answers.round / 65536 % 256 || '.' ||
+                   answers.round / 256 % 256 || '.' || answers.round % 256
+                   END, now(), '{"answer": "benchmark"}'
+            FROM answers JOIN tasks ON (tasks.n = answers.task_n)
+            LEFT JOIN users ON (answers.round % 2 = 0
+                                AND users.n = answers.round / 2)'''), params)
+        # Task runs were inserted in bulk, without the TaskRun listeners
+        db.session.execute(text('''
+            WITH answers AS (
+                SELECT task_id, COUNT(id) AS n_task_runs, MAX(id) AS last_id
+                FROM task_run WHERE project_id=:project_id GROUP BY task_id
+            )
+            UPDATE task SET n_task_runs=answers.n_task_runs,
+                last_task_run_id=answers.last_id,
+                state=CASE WHEN answers.n_task_runs >= task.n_answers
+                      THEN 'completed' ELSE 'ongoing' END
+            FROM answers WHERE answers.task_id=task.id'''), params)
+        db.session.commit()
+        db.session.execute('ANALYZE task')
+        db.session.execute('ANALYZE task_run')
+        db.session.commit()
+        print >> sys.stderr, "Created project %s in %.1fs" % (project_id,
+                                                              time.time() - t0)
+        return project_id
+
+
+def _measure(sched, project_id, name, n_requests, user_ids=None):
+    timings = []
+    for i in range(n_requests):
+        if user_ids:
+            user_id, user_ip = user_ids[i % len(user_ids)], None
+        else:
+            user_id, user_ip = None, '172.16.%s.%s' % (i / 256 % 256, i % 256)
+        t0 = time.time()
+        sched.new_task(project_id, name, user_id, user_ip)
+        timings.append((time.time() - t0) * 1000)
+        db.slave_session.remove()
+    return dict(p50=_percentile(timings, 50), p99=_percentile(timings, 99),
+                mean=sum(timings) / len(timings), max=max(timings))
+
+
+def _percentile(values, percent):
+    """Return the nearest-rank percentile of a list of values."""
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def _reset_scheduler_keys():
+    # Answered tasks, leases and pools, so every scheduler starts cold
+    for key in sentinel.master.keys('pybossa:sched:*'):
+        sentinel.master.delete(key)
+
+
+## ==================================================
+## Misc stuff for setting up a command line interface
+
+def _module_functions(functions):
+    local_functions = dict(functions)
+    for k,v in local_functions.items():
+        if not inspect.isfunction(v) or k.startswith('_'):
+            del local_functions[k]
+    return local_functions
+
+def _main(functions_or_object):
+    isobject = inspect.isclass(functions_or_object)
+    if isobject:
+        _methods = _object_methods(functions_or_object)
+    else:
+        _methods = _module_functions(functions_or_object)
+
+    usage = '''%prog {action}
+
+Actions:
+    '''
+    usage += '\n    '.join(
+        [ '%s: %s' % (name, m.__doc__.split('\n')[0] if m.__doc__ else '') for (name,m)
+        in sorted(_methods.items()) ])
+    parser = optparse.OptionParser(usage)
+    options, args = parser.parse_args()
+
+    if not args or not args[0] in _methods:
+        parser.print_help()
+        sys.exit(1)
+
+    method = args[0]
+    if isobject:
+        getattr(functions_or_object(), method)(*args[1:])
+    else:
+        _methods[method](*args[1:])
+
+__all__ = [ '_main' ]
+
+if __name__ == '__main__':
+    _main(locals())
@@ -0,0 +1,59 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.access_log import AccessLog
+
+
+class TestAccessLog(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.access_log = AccessLog(self.connection)
+
+    def test_record_and_scores(self):
+        """Test AccessLog scores returns the recorded accesses"""
+        for i in range(3):
+            self.access_log.record('project', 1)
+        self.access_log.record('project', 2)
+        self.access_log.record('user', 1)
+
+        assert self.access_log.scores('project', [1, 2, 3]) == [3, 1, 0]
+        assert self.access_log.top('project', 1) == ['1']
+
+    def test_record_samples_accesses(self):
+        """Test AccessLog record only records a sample of the accesses"""
+        for i in range(1000):
+            self.access_log.record('project', 1, sample_rate=0.1)
+
+        score = self.access_log.scores('project', [1])[0]
+        assert 50 < score < 150, score
+
+    def test_decay(self):
+        """Test AccessLog decay lowers the scores and drops the members with
+        a score too low"""
+        for i in range(10):
+            self.access_log.record('project', 1)
+        self.access_log.record('project', 2, sample_rate=1)
+        self.connection.zadd(AccessLog.KEY % 'project', 0.1, 3)
+
+        self.access_log.decay('project')
+
+        scores = self.access_log.scores('project', [1, 2, 3])
+        assert scores == [10 * AccessLog.DECAY, AccessLog.DECAY, 0], scores
@@ -0,0 +1,111 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.answered_tasks import AnsweredTasks
+
+
+class TestAnsweredTasks(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.answered = AnsweredTasks(self.connection)
+
+    def test_get_returns_none_if_not_loaded(self):
+        """Test AnsweredTasks get returns None for a set never loaded"""
+        assert self.answered.get(1, user_id=1) is None
+
+    def test_get_returns_empty_set_for_user_without_answers(self):
+        """Test AnsweredTasks get returns an empty set once loaded with no
+        answers"""
+        self.answered.load(1, [], user_id=1)
+
+        assert self.answered.get(1, user_id=1) == set()
+
+    def test_load_and_get(self):
+        """Test AnsweredTasks get returns the loaded task ids"""
+        self.answered.load(1, [3, 4], user_id=1)
+
+        assert self.answered.get(1, user_id=1) == set([3, 4])
+
+    def test_sets_are_per_project_and_user(self):
+        """Test AnsweredTasks keeps a set per project and user or IP"""
+        self.answered.load(1, [3], user_id=1)
+        self.answered.load(1, [4], user_ip='127.0.0.1')
+        self.answered.load(2, [5], user_id=1)
+
+        assert self.answered.get(1, user_id=1) == set([3])
+        assert self.answered.get(1, user_ip='127.0.0.1') == set([4])
+        assert self.answered.get(2, user_id=1) == set([5])
+        assert self.answered.get(2, user_id=2) is None
+
+    def test_anonymous_defaults_to_localhost(self):
+        """Test AnsweredTasks uses 127.0.0.1 when no user nor IP are given"""
+        self.answered.load(1, [3])
+
+        assert self.answered.get(1, user_ip='127.0.0.1') == set([3])
+
+    def test_add_does_not_load_the_set(self):
+        """Test AnsweredTasks a set with only new answers is not loaded"""
+        self.answered.add(1, 3, user_id=1)
+
+        assert self.answered.get(1, user_id=1) is None
+        assert self.answered.contains(1, [3], user_id=1) is None
+
+    def test_add_to_loaded_set(self):
+        """Test AnsweredTasks add records a new answer in a loaded set"""
+        self.answered.load(1, [], user_id=1)
+
+        self.answered.add(1, 3, user_id=1)
+
+        assert self.answered.get(1, user_id=1) == set([3])
+
+    def test_answer_added_before_a_stale_load_is_kept(self):
+        """Test AnsweredTasks a load read from the DB before a new answer was
+        committed does not drop the answer"""
+        self.answered.add(1, 3, user_id=1)
+
+        self.answered.load(1, [2], user_id=1)
+
+        assert self.answered.get(1, user_id=1) == set([2, 3])
+
+    def test_contains(self):
+        """Test AnsweredTasks contains tells which task ids are answered, or
+        None if the set is not loaded"""
+        assert self.answered.contains(1, [3, 4], user_id=1) is None
+
+        self.answered.load(1, [3], user_id=1)
+
+        assert self.answered.contains(1, [3, 4], user_id=1) == [True, False]
+        assert self.answered.contains(1, [], user_id=1) == []
+
+    def test_remove(self):
+        """Test AnsweredTasks remove forgets an answer"""
+        self.answered.load(1, [3, 4], user_id=1)
+
+        self.answered.remove(1, 3, user_id=1)
+
+        assert self.answered.get(1, user_id=1) == set([4])
+
+    def test_sets_expire(self):
+        """Test AnsweredTasks sets have a TTL"""
+        self.answered.load(1, [3], user_id=1)
+        key = self.answered._key(1, user_id=1)
+
+        assert 0 < self.connection.ttl(key) <= AnsweredTasks.TTL
@@ -16,12 +16,20 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import hashlib
 from mock import patch
 from pybossa.cache import (get_key_to_hash, get_hash_key, cache, memoize,
-                           delete_cached, delete_memoized)
+                           delete_cached, delete_memoized, get_many,
+                           invalidate_project, get_stats, stats, _evict,
+                           _memoize_key, warm, refresh_hot, prune_indexes,
+                           flush_stats,
+                           INVALIDATION_CHANNEL, KEY_PREFIX, STATS_KEY)
+from pybossa.cache.local import LocalCache
+from pybossa.cache import serializer
 from pybossa.sentinel import Sentinel
-from settings_test import REDIS_SENTINEL, REDIS_KEYPREFIX
+from pybossa.access_log import AccessLog
+from settings_test import REDIS_SENTINEL
 
 
 
@@ -69,6 +77,11 @@ class FakeApp(object):
 
 test_sentinel = Sentinel(app=FakeApp())
 
+
+def memoized_keys():
+    """Return the keys of the memoized values, without their indexes."""
+    return test_sentinel.master.keys('%s:*_args:*' % KEY_PREFIX)
+
 @patch('pybossa.cache.sentinel', new=test_sentinel)
 class TestCacheMemoizeFunctions(object):
 
@@ -99,7 +112,7 @@ class TestCacheMemoizeFunctions(object):
         def my_func():
             return 'my_func was called'
         my_func()
-        key = "%s::%s" % (REDIS_KEYPREFIX, 'my_cached_func')
+        key = "%s::%s" % (KEY_PREFIX, 'my_cached_func')
 
         assert test_sentinel.master.keys() == [key], test_sentinel.master.keys()
 
@@ -141,7 +154,7 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg')
-        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        key_pattern = "%s:%s_args:*" % (KEY_PREFIX, my_func.__name__)
 
         assert len(test_sentinel.master.keys(key_pattern)) == 1
 
@@ -155,7 +168,7 @@ class TestCacheMemoizeFunctions(object):
             return [args, kwargs]
         my_func('arg')
         my_func('arg')
-        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        key_pattern = "%s:%s_args:*" % (KEY_PREFIX, my_func.__name__)
 
         assert len(test_sentinel.master.keys(key_pattern)) == 1
 
@@ -167,7 +180,7 @@ class TestCacheMemoizeFunctions(object):
         @memoize()
         def my_func(*args, **kwargs):
             return [args, kwargs]
-        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        key_pattern = "%s:%s_args:*" % (KEY_PREFIX, my_func.__name__)
         my_func('arg')
         assert len(test_sentinel.master.keys(key_pattern)) == 1
         my_func('another_arg')
@@ -216,7 +229,7 @@ class TestCacheMemoizeFunctions(object):
         @cache(key_prefix='my_cached_func')
         def my_func():
             return 'my_func was called'
-        key = "%s::%s" % (REDIS_KEYPREFIX, 'my_cached_func')
+        key = "%s::%s" % (KEY_PREFIX, 'my_cached_func')
         my_func()
         assert test_sentinel.master.keys() == [key]
 
@@ -231,7 +244,7 @@ class TestCacheMemoizeFunctions(object):
         @cache(key_prefix='my_cached_func')
         def my_func():
             return 'my_func was called'
-        key = "%s::%s" % (REDIS_KEYPREFIX, 'my_cached_func')
+        key = "%s::%s" % (KEY_PREFIX, 'my_cached_func')
         assert test_sentinel.master.keys() == []
 
         delete_succedeed = delete_cached('my_cached_func')
@@ -246,7 +259,7 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
-        assert len(test_sentinel.master.keys()) == 1
+        assert len(memoized_keys()) == 1
 
         delete_succedeed = delete_memoized(my_func, 'arg', kwarg='kwarg')
         assert delete_succedeed is True, delete_succedeed
@@ -260,11 +273,11 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
-        assert len(test_sentinel.master.keys()) == 1
+        assert len(memoized_keys()) == 1
 
         delete_succedeed = delete_memoized(my_func, 'badarg', kwarg='barkwarg')
         assert delete_succedeed is False, delete_succedeed
-        assert len(test_sentinel.master.keys()) == 1, 'Key was unexpectedly deleted'
+        assert len(memoized_keys()) == 1, 'Key was unexpectedly deleted'
 
 
     def test_delete_memoized_deletes_only_requested(self):
@@ -276,11 +289,11 @@ class TestCacheMemoizeFunctions(object):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
         my_func('other', kwarg='other')
-        assert len(test_sentinel.master.keys()) == 2
+        assert len(memoized_keys()) == 2
 
         delete_succedeed = delete_memoized(my_func, 'arg', kwarg='kwarg')
         assert delete_succedeed is True, delete_succedeed
-        assert len(test_sentinel.master.keys()) == 1, 'Everything was deleted!'
+        assert len(memoized_keys()) == 1, 'Everything was deleted!'
 
 
     def test_delete_memoized_deletes_all_function_calls(self):
@@ -296,8 +309,569 @@ class TestCacheMemoizeFunctions(object):
         my_func('arg', kwarg='kwarg')
         my_func('other', kwarg='other')
         my_other_func('arg', kwarg='kwarg')
-        assert len(test_sentinel.master.keys()) == 3
+        assert len(memoized_keys()) == 3
 
         delete_succedeed = delete_memoized(my_func)
         assert delete_succedeed is True, delete_succedeed
-        assert len(test_sentinel.master.keys()) == 1
+        assert len(memoized_keys()) == 1
+
+
+    def test_delete_memoized_does_not_scan_the_keyspace(self):
+        """Test CACHE delete_memoized deletes all the function calls using
+        the index of the function, not KEYS, even in a large keyspace"""
+
+        @memoize()
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        @memoize()
+        def my_other_func(*args, **kwargs):
+            return [args, kwargs]
+        pipe = test_sentinel.master.pipeline()
+        for i in range(100000):
+            pipe.set('%s:other_key:%s' % (KEY_PREFIX, i), i)
+        pipe.execute()
+        for i in range(100):
+            my_func(i)
+        my_other_func('arg')
+
+        with patch.object(test_sentinel.slave, 'keys') as slave_keys:
+            with patch.object(test_sentinel.master, 'keys') as master_keys:
+                delete_succedeed = delete_memoized(my_func)
+                assert not slave_keys.called
+                assert not master_keys.called
+
+        assert delete_succedeed is True, delete_succedeed
+        assert len(memoized_keys()) == 1, len(memoized_keys())
+        assert test_sentinel.master.dbsize() == 100000 + 2
+
+    def test_get_many_returns_cached_and_missing_values(self):
+        """Test CACHE get_many returns the values of every call, computing
+        only the missing ones with a single call to compute"""
+
+        @memoize()
+        def my_func(arg):
+            return arg * 2
+        my_func(1)
+        computed = []
+        def compute(args_list):
+            computed.append(args_list)
+            return [args[0] * 2 for args in args_list]
+
+        values = get_many(my_func, [(1,), (2,), (3,)], compute)
+
+        assert values == [2, 4, 6], values
+        assert computed == [[(2,), (3,)]], computed
+        assert len(memoized_keys()) == 3
+
+    def test_get_many_stores_values_for_the_memoized_function(self):
+        """Test CACHE get_many stores the computed values with the same keys
+        as the memoized function, and in its index"""
+
+        @memoize()
+        def my_func(arg, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+        get_many(my_func, [('a',), ('b',)])
+
+        assert my_func('a') == 1, my_func('a')
+        assert my_func('b') == 2, my_func('b')
+        assert delete_memoized(my_func) is True
+        assert memoized_keys() == []
+
+    def test_get_many_reads_values_with_one_mget(self):
+        """Test CACHE get_many reads all the values with a single MGET"""
+
+        @memoize()
+        def my_func(arg):
+            return arg
+        for i in range(10):
+            my_func(i)
+
+        with patch.object(test_sentinel.slave, 'get') as get:
+            values = get_many(my_func, [(i,) for i in range(10)])
+            assert not get.called
+
+        assert values == range(10), values
+
+    def test_invalidate_project_invalidates_project_scoped_values(self):
+        """Test CACHE invalidate_project invalidates all the project scoped
+        values of a project, and only them, with a single INCR"""
+
+        @memoize(project_scoped=True)
+        def my_func(project_id, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+        assert my_func(1) == 1
+        assert my_func(2) == 2
+        assert my_func(1) == 1
+
+        with patch.object(test_sentinel.master, 'delete') as delete:
+            invalidate_project(1)
+            assert not delete.called
+
+        assert my_func(1) == 3, my_func(1)
+        assert my_func(2) == 2, my_func(2)
+
+    def test_invalidations_are_coalesced(self):
+        """Test CACHE project scoped values are served CACHE_PROJECT_DEBOUNCE
+        seconds after being invalidated"""
+
+        @memoize(project_scoped=True)
+        def my_func(project_id, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+        my_func(1)
+        invalidate_project(1)
+
+        with patch('pybossa.cache.PROJECT_DEBOUNCE', 60):
+            assert my_func(1) == 1, my_func(1)
+        assert my_func(1) == 2, my_func(1)
+
+    def test_get_many_project_scoped(self):
+        """Test CACHE get_many takes into account the project generations"""
+
+        @memoize(project_scoped=True)
+        def my_func(project_id):
+            return project_id * 2
+        computed = []
+        def compute(args_list):
+            computed.extend(args_list)
+            return [args[0] * 2 for args in args_list]
+        get_many(my_func, [(1,), (2,)], compute)
+        invalidate_project(2)
+
+        values = get_many(my_func, [(1,), (2,)], compute)
+
+        assert values == [2, 4], values
+        assert computed == [(1,), (2,), (2,)], computed
+
+    def test_delete_memoized_removes_key_from_index(self):
+        """Test CACHE delete_memoized with arguments removes the key from the
+        index of the function"""
+
+        @memoize()
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        my_func('arg')
+        my_func('other')
+
+        delete_memoized(my_func, 'arg')
+
+        index = "%s:%s_index" % (KEY_PREFIX, my_func.__name__)
+        assert test_sentinel.master.scard(index) == 1
+
+    def test_prune_indexes_removes_expired_keys(self):
+        """Test CACHE prune_indexes removes the keys that expired from the
+        index of the function"""
+
+        @memoize()
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        my_func('arg')
+        my_func('other')
+        test_sentinel.master.delete(memoized_keys()[0])
+
+        assert prune_indexes() == 1
+        index = "%s:%s_index" % (KEY_PREFIX, my_func.__name__)
+        assert test_sentinel.master.smembers(index) == set(memoized_keys())
+
+
+@patch('pybossa.cache._listen_for_invalidations')
+@patch('pybossa.cache.sentinel', new=test_sentinel)
+class TestCacheLocalTier(object):
+
+    @classmethod
+    def setup_class(cls):
+        import os
+        cls.cache = os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+
+    @classmethod
+    def teardown_class(cls):
+        if cls.cache:
+            import os
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def setUp(self):
+        flush_stats()
+        test_sentinel.master.flushall()
+        stats.clear()
+        self.local_cache = LocalCache(max_size=10, ttl=60)
+        self.patcher = patch('pybossa.cache.local_cache', new=self.local_cache)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_memoize_serves_from_local_tier(self, listen):
+        """Test CACHE memoize reads the local tier before Redis"""
+
+        @memoize()
+        def my_func(arg, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+        my_func('arg')
+        test_sentinel.master.flushall()
+
+        assert my_func('arg') == 1
+        assert get_stats()['local']['hits'] == 1, get_stats()
+
+    def test_stats_report_hit_rate_per_tier(self, listen):
+        """Test CACHE get_stats reports the hits and misses of every tier"""
+
+        @cache(key_prefix='my_cached_func')
+        def my_func():
+            return 'my_func was called'
+        my_func()
+        self.local_cache.clear()
+        my_func()
+        my_func()
+
+        stats = get_stats()
+        assert stats['local'] == dict(hits=1, misses=2, hit_rate=1 / 3.0), stats
+        assert stats['redis'] == dict(hits=1, misses=1, hit_rate=0.5), stats
+
+    def test_stats_are_aggregated_in_redis(self, listen):
+        """Test CACHE get_stats adds up the stats of all the processes"""
+
+        @cache(key_prefix='my_cached_func')
+        def my_func():
+            return 'my_func was called'
+        my_func()
+        my_func()
+        # Flushed by another process
+        test_sentinel.master.hincrby(STATS_KEY, 'redis_hits', 3)
+
+        stats = get_stats(aggregated=True)
+        assert stats['local'] == dict(hits=1, misses=1, hit_rate=0.5), stats
+        assert stats['redis'] == dict(hits=3, misses=1, hit_rate=0.75), stats
+
+    def test_delete_memoized_evicts_and_publishes(self, listen):
+        """Test CACHE delete_memoized drops the value from the local tier and
+        publishes it for the rest of workers"""
+
+        @memoize()
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        my_func('arg')
+        my_func('other')
+
+        with patch.object(test_sentinel.master, 'publish') as publish:
+            delete_memoized(my_func)
+
+        assert len(self.local_cache) == 0
+        prefix = "%s:%s_args:" % (KEY_PREFIX, my_func.__name__)
+        publish.assert_called_once_with(INVALIDATION_CHANNEL, prefix + '*')
+
+    def test_delete_cached_evicts_local_value(self, listen):
+        """Test CACHE delete_cached drops the value from the local tier"""
+
+        @cache(key_prefix='my_cached_func')
+        def my_func(call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+        my_func()
+
+        delete_cached('my_cached_func')
+
+        assert my_func() == 2
+
+    def test_evict_published_keys(self, listen):
+        """Test CACHE keys published by other workers are evicted"""
+        self.local_cache.set('prefix:a', 1)
+        self.local_cache.set('prefix:b', 2)
+        self.local_cache.set('other', 3)
+
+        _evict('prefix:a')
+        assert self.local_cache.get('prefix:a') is None
+        assert self.local_cache.get('prefix:b') == 2
+
+        _evict('prefix:*')
+        assert self.local_cache.get('prefix:b') is None
+        assert self.local_cache.get('other') == 3
+
+
+@patch('pybossa.cache.sentinel', new=test_sentinel)
+class TestCacheStampedeProtection(object):
+
+    @classmethod
+    def setup_class(cls):
+        import os
+        cls.cache = os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+
+    @classmethod
+    def teardown_class(cls):
+        if cls.cache:
+            import os
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def setUp(self):
+        test_sentinel.master.flushall()
+        self.calls = []
+
+    def my_func(self):
+        @memoize(timeout=60, grace=30)
+        def my_func(arg):
+            self.calls.append(arg)
+            return 'fresh'
+        return my_func
+
+    def key(self, arg):
+        prefix = "%s:%s_args:" % (KEY_PREFIX, 'my_func')
+        return get_hash_key(prefix, get_key_to_hash(arg))
+
+    def store(self, arg, expires, delta=0):
+        test_sentinel.master.setex(self.key(arg), 100,
+                                   serializer.dumps((expires, delta, 'stale')))
+
+    def test_values_are_kept_grace_seconds_longer(self):
+        """Test CACHE memoize with grace keeps values after they expire"""
+        my_func = self.my_func()
+
+        assert my_func('arg') == 'fresh'
+        assert my_func('arg') == 'fresh'
+        assert self.calls == ['arg'], self.calls
+        assert 60 < test_sentinel.master.ttl(self.key('arg')) <= 90
+
+    def test_expired_value_is_recomputed(self):
+        """Test CACHE memoize with grace recomputes an expired value if no
+        other worker is doing it"""
+        my_func = self.my_func()
+        self.store('arg', expires=time.time() - 1)
+
+        assert my_func('arg') == 'fresh'
+        assert self.calls == ['arg'], self.calls
+        assert not test_sentinel.master.exists(self.key('arg') + ':lock')
+
+    def test_stale_value_is_served_while_recomputed(self):
+        """Test CACHE memoize with grace serves the stale value while other
+        worker recomputes it"""
+        my_func = self.my_func()
+        self.store('arg', expires=time.time() - 1)
+        test_sentinel.master.set(self.key('arg') + ':lock', 'other worker')
+
+        assert my_func('arg') == 'stale'
+        assert self.calls == [], self.calls
+
+    def test_missing_value_waits_for_the_lock(self):
+        """Test CACHE memoize with single_flight waits for other worker, and
+        computes the value itself if the lock is released without it"""
+        my_func = self.my_func()
+        test_sentinel.master.set(self.key('arg') + ':lock', 'other worker',
+                                 px=200)
+
+        assert my_func('arg') == 'fresh'
+        assert self.calls == ['arg'], self.calls
+
+    def test_unreadable_value_is_recomputed_while_waiting(self):
+        """Test CACHE memoize recomputes a value in an unknown format instead
+        of waiting for it"""
+        my_func = self.my_func()
+        test_sentinel.master.set(self.key('arg'), '\x02unknown')
+        test_sentinel.master.set(self.key('arg') + ':lock', 'other worker',
+                                 px=200)
+
+        assert my_func('arg') == 'fresh'
+        assert self.calls == ['arg'], self.calls
+
+    @patch('pybossa.cache.random.random')
+    def test_early_refresh(self, random):
+        """Test CACHE early_refresh recomputes values before they expire"""
+        random.return_value = 1 - 1e-9
+        @cache(key_prefix='my_cached_func', timeout=60, early_refresh=1)
+        def my_func():
+            self.calls.append(1)
+            return 'fresh'
+        key = "%s::%s" % (KEY_PREFIX, 'my_cached_func')
+        value = serializer.dumps((time.time() + 10, 1, 'old'))
+        test_sentinel.master.setex(key, 100, value)
+
+        assert my_func() == 'fresh'
+        assert self.calls == [1], self.calls
+
+
+@patch('pybossa.cache.sentinel', new=test_sentinel)
+class TestCacheWarm(object):
+
+    @classmethod
+    def setup_class(cls):
+        import os
+        cls.cache = os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+
+    @classmethod
+    def teardown_class(cls):
+        if cls.cache:
+            import os
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def setUp(self):
+        test_sentinel.master.flushall()
+        self.calls = []
+
+    def my_func(self, **kwargs):
+        @memoize(timeout=3600, **kwargs)
+        def my_func(project_id):
+            self.calls.append(project_id)
+            return len(self.calls)
+        return my_func
+
+    def test_warm_computes_missing_values(self):
+        """Test CACHE warm computes the values not cached yet"""
+        my_func = self.my_func()
+
+        assert warm(my_func, 1) is True
+        assert my_func(1) == 1
+        assert self.calls == [1], self.calls
+
+    def test_warm_skips_fresh_values(self):
+        """Test CACHE warm does not recompute values expiring later than
+        WARM_MIN_TTL"""
+        my_func = self.my_func()
+        my_func(1)
+
+        assert warm(my_func, 1) is False
+        assert self.calls == [1], self.calls
+
+    def test_warm_recomputes_values_about_to_expire(self):
+        """Test CACHE warm recomputes values expiring in less than
+        WARM_MIN_TTL"""
+        my_func = self.my_func()
+        my_func(1)
+
+        with patch('pybossa.cache.WARM_MIN_TTL', 3600):
+            with patch('pybossa.cache.WARM_TIMEOUT_FRACTION', 1):
+                assert warm(my_func, 1) is True
+        assert my_func(1) == 2
+        assert self.calls == [1, 1], self.calls
+
+    def test_warm_skips_values_with_short_timeouts_not_about_to_expire(self):
+        """Test CACHE warm does not recompute values with a timeout shorter
+        than WARM_MIN_TTL until the last part of their timeout"""
+        @memoize(timeout=300)
+        def my_func(project_id):
+            self.calls.append(project_id)
+            return len(self.calls)
+        my_func(1)
+
+        with patch('pybossa.cache.WARM_MIN_TTL', 600):
+            assert warm(my_func, 1) is False
+            test_sentinel.master.expire(_memoize_key('my_func', 1), 100)
+            assert warm(my_func, 1) is True
+        assert self.calls == [1, 1], self.calls
+
+    def test_warm_protected_values(self):
+        """Test CACHE warm takes into account the grace period of protected
+        values"""
+        my_func = self.my_func(grace=600)
+        my_func(1)
+
+        with patch('pybossa.cache.WARM_MIN_TTL', 3700):
+            with patch('pybossa.cache.WARM_TIMEOUT_FRACTION', 1.1):
+                assert warm(my_func, 1) is True
+        assert my_func(1) == 2
+        assert self.calls == [1, 1], self.calls
+
+    def test_warm_recomputes_invalidated_project_values(self):
+        """Test CACHE warm recomputes project scoped values of an older
+        generation"""
+        my_func = self.my_func(project_scoped=True)
+        my_func(1)
+        my_func(2)
+        invalidate_project(1)
+
+        assert warm(my_func, 1) is True
+        assert warm(my_func, 2) is False
+        assert my_func(1) == 3
+        assert self.calls == [1, 2, 1], self.calls
+
+    def test_warm_cached_function(self):
+        """Test CACHE warm works with cached functions too"""
+        @cache(key_prefix='my_cached_func', timeout=3600)
+        def my_func():
+            self.calls.append(1)
+            return 'value'
+
+        assert warm(my_func) is True
+        assert warm(my_func) is False
+        assert my_func() == 'value'
+        assert self.calls == [1], self.calls
+
+    def test_warm_does_nothing_if_cache_disabled(self):
+        """Test CACHE warm does nothing when the cache is disabled"""
+        my_func = self.my_func()
+
+        with patch.dict('os.environ', {'PYBOSSA_REDIS_CACHE_DISABLED': '1'}):
+            assert warm(my_func, 1) is False
+        assert self.calls == [], self.calls
+
+
+@patch('pybossa.cache.ACCESS_SAMPLE_RATE', 1)
+@patch('pybossa.cache.sentinel', new=test_sentinel)
+class TestCacheRefreshHot(object):
+
+    @classmethod
+    def setup_class(cls):
+        import os
+        cls.cache = os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+
+    @classmethod
+    def teardown_class(cls):
+        if cls.cache:
+            import os
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def setUp(self):
+        test_sentinel.master.flushall()
+        self.calls = []
+        self.access_log = AccessLog(test_sentinel.master)
+
+    def my_func(self):
+        @memoize(timeout=3600)
+        def my_func(arg, option=None):
+            self.calls.append(arg)
+            return len(self.calls)
+        return my_func
+
+    def test_memoize_records_calls(self):
+        """Test CACHE memoize records the calls to memoized functions"""
+        my_func = self.my_func()
+        my_func(1)
+        my_func(1)
+        my_func(2, option='a')
+
+        top = self.access_log.top('cache', 2)
+
+        assert top == ['["my_func", [1], {}]',
+                       '["my_func", [2], {"option": "a"}]'], top
+
+    def test_memoize_does_not_record_calls_with_other_arguments(self):
+        """Test CACHE memoize does not record calls with arguments that
+        cannot be stored as json"""
+        my_func = self.my_func()
+        my_func(object())
+
+        assert self.access_log.top('cache', 1) == []
+
+    def test_refresh_hot_recomputes_hot_values_about_to_expire(self):
+        """Test CACHE refresh_hot recomputes only the most accessed values,
+        if they are about to expire"""
+        my_func = self.my_func()
+        for i in range(3):
+            my_func(1, option='a')
+        my_func(2)
+
+        assert refresh_hot(1) == 0
+        with patch('pybossa.cache.WARM_MIN_TTL', 3600):
+            with patch('pybossa.cache.WARM_TIMEOUT_FRACTION', 1):
+                assert refresh_hot(1) == 1
+        assert self.calls == [1, 2, 1], self.calls
+        assert my_func(1, option='a') == 3
+
+    def test_refresh_hot_decays_access_counts(self):
+        """Test CACHE refresh_hot decays the access counts"""
+        my_func = self.my_func()
+        my_func(1)
+
+        refresh_hot(1)
+
+        score = self.access_log.scores('cache', ['["my_func", [1], {}]'])
+        assert score == [AccessLog.DECAY], score
@@ -0,0 +1,75 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from mock import patch
+from pybossa.cache.local import LocalCache
+
+
+class TestLocalCache(object):
+
+    def test_get_returns_none_if_missing(self):
+        """Test LocalCache get returns None for a key never set"""
+        assert LocalCache().get('key') is None
+
+    def test_set_and_get(self):
+        """Test LocalCache get returns the stored value"""
+        local_cache = LocalCache()
+        local_cache.set('key', 'value')
+
+        assert local_cache.get('key') == 'value'
+
+    @patch('pybossa.cache.local.time')
+    def test_entries_expire(self, time):
+        """Test LocalCache entries expire after ttl, or timeout if lower"""
+        local_cache = LocalCache(ttl=10)
+        time.time.return_value = 100
+        local_cache.set('key', 'value')
+        local_cache.set('short', 'value', timeout=5)
+
+        time.time.return_value = 106
+        assert local_cache.get('key') == 'value'
+        assert local_cache.get('short') is None
+
+        time.time.return_value = 111
+        assert local_cache.get('key') is None
+
+    def test_least_recently_used_entries_are_dropped(self):
+        """Test LocalCache keeps at most max_size entries, dropping the least
+        recently used ones"""
+        local_cache = LocalCache(max_size=2)
+        local_cache.set('a', 1)
+        local_cache.set('b', 2)
+        local_cache.get('a')
+
+        local_cache.set('c', 3)
+
+        assert len(local_cache) == 2
+        assert local_cache.get('b') is None
+        assert local_cache.get('a') == 1
+        assert local_cache.get('c') == 3
+
+    def test_delete_prefix(self):
+        """Test LocalCache delete_prefix drops only the matching keys"""
+        local_cache = LocalCache()
+        local_cache.set('prefix:a', 1)
+        local_cache.set('other', 2)
+
+        local_cache.delete_prefix('prefix:')
+
+        assert local_cache.get('prefix:a') is None
+        assert local_cache.get('other') == 2
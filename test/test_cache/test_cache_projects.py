@@ -20,6 +20,9 @@ from default import Test, with_context
 from pybossa.cache import projects as cached_projects
 from factories import UserFactory, ProjectFactory, TaskFactory, \
     TaskRunFactory, AnonymousTaskRunFactory
+from pybossa.core import task_repo, sentinel
+from pybossa.jobs import backfill_project_volunteers
+from pybossa.project_volunteers import ProjectVolunteers
 from mock import patch
 
 
@@ -352,6 +355,51 @@ class TestProjectsCache(Test):
         assert total_volunteers == 5, err_msg
 
 
+    def test_stats_many_match_single_project_values(self):
+        """Test CACHE PROJECTS the values computed in batch for the project
+        lists are the same ones computed for every project"""
+        project = self.create_project_with_contributors(2, 3, two_tasks=True)
+        other = self.create_project_with_tasks(1, 3)
+        empty = ProjectFactory.create()
+        project_ids = [project.id, other.id, empty.id]
+
+        stats = cached_projects._stats_many(project_ids)
+
+        for project_id in project_ids:
+            expected = (cached_projects.last_activity(project_id),
+                        cached_projects.overall_progress(project_id),
+                        cached_projects.n_tasks(project_id),
+                        cached_projects.n_volunteers(project_id))
+            assert stats[project_id] == expected, (stats, expected)
+
+
+    def test_many_helpers_compute_values_in_batch(self):
+        """Test CACHE PROJECTS the batch helpers compute the values of many
+        projects at once"""
+        project = self.create_project_with_contributors(2, 3)
+        other = self.create_project_with_tasks(1, 3)
+        args_list = [(project.id,), (other.id,)]
+
+        assert cached_projects._n_anonymous_volunteers_many(args_list) == [2, 0]
+        assert cached_projects._n_registered_volunteers_many(args_list) == [3, 0]
+
+
+    def test_count_counters(self):
+        """Test CACHE PROJECTS count_counters counts the tasks, completed tasks
+        and task runs of many projects at once"""
+        project = self.create_project_with_contributors(2, 3)
+        other = self.create_project_with_tasks(1, 3)
+        empty = ProjectFactory.create()
+
+        counters = cached_projects.count_counters([project.id, other.id,
+                                                   empty.id])
+
+        assert counters == [
+            dict(n_tasks=1, n_completed_tasks=0, n_task_runs=5),
+            dict(n_tasks=4, n_completed_tasks=1, n_task_runs=0),
+            dict(n_tasks=0, n_completed_tasks=0, n_task_runs=0)], counters
+
+
     def test_n_draft_no_drafts(self):
         """Test CACHE PROJECTS _n_draft returns 0 if there are no draft projects"""
         # Here, we are suposing that a project is draft iff has no presenter AND has no tasks
@@ -455,9 +503,9 @@ class TestProjectsCache(Test):
         assert number_of_featured == 1, number_of_featured
 
 
-    @patch('pybossa.cache.pickle')
+    @patch('pybossa.cache.serializer')
     @patch('pybossa.cache.projects._n_draft')
-    def test_n_count_calls_n_draft(self, _n_draft, pickle):
+    def test_n_count_calls_n_draft(self, _n_draft, serializer):
         """Test CACHE PROJECTS n_count calls _n_draft when called with argument
         'draft'"""
         cached_projects.n_count('draft')
@@ -465,9 +513,9 @@ class TestProjectsCache(Test):
         _n_draft.assert_called_with()
 
 
-    @patch('pybossa.cache.pickle')
+    @patch('pybossa.cache.serializer')
     @patch('pybossa.cache.projects._n_featured')
-    def test_n_count_calls_n_featuredt(self, _n_featured, pickle):
+    def test_n_count_calls_n_featuredt(self, _n_featured, serializer):
         """Test CACHE PROJECTS n_count calls _n_featured when called with
         argument 'featured'"""
         cached_projects.n_count('featured')
@@ -531,3 +579,159 @@ class TestProjectsCache(Test):
 
         for field in fields:
             assert field in pro_owned_projects[0].keys(), field
+
+
+class TestProjectsCacheCounters(Test):
+
+    @classmethod
+    def setup_class(cls):
+        # Enable the cache for tests within this class
+        import os
+        cls.cache = None
+        if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED'):
+            cls.cache = os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED')
+            del os.environ['PYBOSSA_REDIS_CACHE_DISABLED']
+
+    @classmethod
+    def teardown_class(cls):
+        # Restore the environment variables to its previous state
+        if cls.cache:
+            import os
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def counters(self, project_id):
+        return (cached_projects.n_tasks(project_id),
+                cached_projects.n_completed_tasks(project_id),
+                cached_projects.n_task_runs(project_id),
+                cached_projects.overall_progress(project_id))
+
+    @with_context
+    def test_counters_are_loaded_once(self):
+        """Test CACHE PROJECTS counters are counted in the DB the first time
+        they are read only"""
+        project = ProjectFactory.create()
+        TaskFactory.create_batch(2, project=project)
+
+        with patch('pybossa.cache.projects.count_counters',
+                   wraps=cached_projects.count_counters) as count:
+            assert self.counters(project.id) == (2, 0, 0, 0)
+            assert self.counters(project.id) == (2, 0, 0, 0)
+
+        assert count.call_count == 1, count.call_count
+
+    @with_context
+    def test_counters_follow_task_and_task_run_changes(self):
+        """Test CACHE PROJECTS counters are kept up to date without counting
+        again in the DB"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=2)
+        assert self.counters(project.id) == (1, 0, 0, 0)
+
+        with patch('pybossa.cache.projects.count_counters') as count:
+            TaskFactory.create(project=project)
+            TaskRunFactory.create(task=task)
+            assert self.counters(project.id) == (2, 0, 1, 0)
+            TaskRunFactory.create(task=task)
+            assert self.counters(project.id) == (2, 1, 2, 50)
+            task_repo.delete(task)
+            assert self.counters(project.id) == (1, 0, 0, 0)
+
+        assert not count.called
+
+    @with_context
+    def test_counters_follow_task_state_updates(self):
+        """Test CACHE PROJECTS completed tasks counter follows the changes of
+        the state of the tasks"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        assert self.counters(project.id) == (1, 0, 0, 0)
+
+        task.state = 'completed'
+        task_repo.update(task)
+        assert self.counters(project.id) == (1, 1, 0, 100)
+
+        task.state = 'ongoing'
+        task_repo.update(task)
+        assert self.counters(project.id) == (1, 0, 0, 0)
+
+    @with_context
+    def test_counters_are_counted_again_after_redundancy_update(self):
+        """Test CACHE PROJECTS counters are counted again after the bulk
+        update of the redundancy of the tasks"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=2)
+        TaskRunFactory.create(task=task)
+        assert self.counters(project.id) == (1, 0, 1, 0)
+
+        task_repo.update_tasks_redundancy(project, 1)
+
+        assert self.counters(project.id) == (1, 1, 1, 100)
+
+    @with_context
+    def test_volunteers_are_counted_in_db_until_backfilled(self):
+        """Test CACHE PROJECTS volunteers are counted in the DB if the project
+        sketches have not been backfilled"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        AnonymousTaskRunFactory.create(task=task)
+        TaskRunFactory.create(task=task)
+
+        with patch('pybossa.cache.projects._n_registered_volunteers_many',
+                   wraps=cached_projects._n_registered_volunteers_many) as sql:
+            assert cached_projects.n_registered_volunteers(project.id) == 1
+            assert cached_projects.n_anonymous_volunteers(project.id) == 1
+
+        assert sql.called
+
+    @with_context
+    def test_volunteers_are_read_from_sketches_once_backfilled(self):
+        """Test CACHE PROJECTS volunteers are read from the sketches of the
+        project once backfilled, and follow new answers"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        AnonymousTaskRunFactory.create(task=task)
+        backfill_project_volunteers(project.id)
+
+        with patch('pybossa.cache.projects.'
+                   '_n_registered_volunteers_many') as sql:
+            TaskRunFactory.create(task=task)
+            TaskRunFactory.create(task=task)
+            assert cached_projects.n_registered_volunteers(project.id) == 2
+            assert cached_projects.n_anonymous_volunteers(project.id) == 1
+            assert cached_projects.n_volunteers(project.id) == 3
+            stats = cached_projects._stats_many([project.id])
+            assert stats[project.id][3] == 3, stats
+
+        assert not sql.called
+
+    @with_context
+    def test_volunteers_exact_mode(self):
+        """Test CACHE PROJECTS volunteers are counted in the DB with
+        EXACT_VOLUNTEER_COUNTS"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        TaskRunFactory.create(task=task)
+        backfill_project_volunteers(project.id)
+        # Counted in the sketches, but not in the DB
+        ProjectVolunteers(sentinel.master).add(project.id, user_id=100)
+
+        with patch.dict(self.flask_app.config,
+                        {'EXACT_VOLUNTEER_COUNTS': True}):
+            assert cached_projects.n_registered_volunteers(project.id) == 1
+
+        assert cached_projects.n_registered_volunteers(project.id) == 2
+
+    @with_context
+    def test_deleting_answers_drops_the_sketches(self):
+        """Test CACHE PROJECTS volunteers are counted in the DB again after
+        answers are deleted"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        task_run = TaskRunFactory.create(task=task)
+        backfill_project_volunteers(project.id)
+        assert cached_projects.n_registered_volunteers(project.id) == 1
+
+        task_repo.delete(task_run)
+
+        assert ProjectVolunteers(sentinel.master).count(project.id) is None
+        assert cached_projects.n_registered_volunteers(project.id) == 0
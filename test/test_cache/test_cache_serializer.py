@@ -0,0 +1,82 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+import cPickle as pickle
+from datetime import datetime
+from nose.tools import assert_raises
+from pybossa.cache.serializer import Serializer, FormatError, VERSION
+
+
+class TestSerializer(object):
+
+    values = [None, 0, [], {'a': [1, 2]}, u'ñ', 'x' * 2000]
+
+    def test_round_trip(self):
+        """Test Serializer loads the values it dumps with every format"""
+        for format in ('pickle', 'json'):
+            for compression in (None, 'zlib'):
+                serializer = Serializer(format, compression)
+                for value in self.values:
+                    out = serializer.loads(serializer.dumps(value))
+                    assert out == value, (format, compression, value)
+
+    def test_header(self):
+        """Test Serializer stores the version, format and compression"""
+        serializer = Serializer('json', 'zlib', threshold=10)
+
+        assert serializer.dumps([1]) == VERSION + 'jn[1]'
+        assert serializer.dumps('x' * 20)[:3] == VERSION + 'jz'
+
+    def test_json_falls_back_to_pickle(self):
+        """Test Serializer pickles the values json cannot serialize"""
+        serializer = Serializer('json')
+        data = serializer.dumps(datetime(2015, 7, 1))
+
+        assert data[1] == 'p', data
+        assert serializer.loads(data) == datetime(2015, 7, 1)
+
+    def test_json_falls_back_to_pickle_with_check(self):
+        """Test Serializer with check pickles the values json would change"""
+        serializer = Serializer('json', check=True)
+        for value in [(1, 2), {1: 'a'}, datetime(2015, 7, 1)]:
+            data = serializer.dumps(value)
+
+            assert data[1] == 'p', data
+            assert serializer.loads(data) == value
+
+    def test_json_without_check_does_not_load_back(self):
+        """Test Serializer without check stores the values json changes
+        as json"""
+        serializer = Serializer('json')
+        data = serializer.dumps((1, 2))
+
+        assert data[1] == 'j', data
+        assert serializer.loads(data) == [1, 2]
+
+    def test_loads_values_without_header(self):
+        """Test Serializer loads the values pickled by older versions"""
+        for protocol in (0, 2):
+            data = pickle.dumps({'a': 1}, protocol)
+
+            assert Serializer().loads(data) == {'a': 1}
+
+    def test_unknown_formats(self):
+        """Test Serializer raises FormatError for unknown versions or
+        formats"""
+        assert_raises(FormatError, Serializer().loads, '\x02pn.')
+        assert_raises(FormatError, Serializer().loads, VERSION + 'xn.')
@@ -0,0 +1,56 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.gold_tasks import GoldTasks
+
+
+class TestGoldTasks(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.gold_tasks = GoldTasks(self.connection)
+
+    def test_get_returns_none_if_not_cached(self):
+        """Test GoldTasks get returns None for a project never set"""
+        assert self.gold_tasks.get(1) is None
+
+    def test_set_and_get(self):
+        """Test GoldTasks get returns the stored calibration_frac and ids"""
+        self.gold_tasks.set(1, 0.25, [3, 5])
+        self.gold_tasks.set(2, None, [])
+
+        assert self.gold_tasks.get(1) == (0.25, [3, 5])
+        assert self.gold_tasks.get(2) == (0, [])
+
+    def test_pools_expire(self):
+        """Test GoldTasks pools expire after TTL seconds"""
+        self.gold_tasks.set(1, 0.25, [3])
+
+        assert 0 < self.connection.ttl(GoldTasks.KEY % 1) <= GoldTasks.TTL
+
+    def test_invalidate(self):
+        """Test GoldTasks invalidate drops the pool of a project"""
+        self.gold_tasks.set(1, 0.25, [3])
+        self.gold_tasks.set(2, 0.25, [4])
+
+        self.gold_tasks.invalidate(1)
+
+        assert self.gold_tasks.get(1) is None
+        assert self.gold_tasks.get(2) == (0.25, [4])
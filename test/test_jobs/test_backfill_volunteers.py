@@ -0,0 +1,54 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from pybossa.jobs import backfill_project_volunteers, get_volunteers_jobs
+from default import Test, with_context
+from factories import ProjectFactory, TaskFactory, TaskRunFactory, \
+    AnonymousTaskRunFactory
+
+
+class TestBackfillVolunteers(Test):
+
+    @with_context
+    def test_backfill_project_volunteers(self):
+        """Test JOB backfill_project_volunteers adds the volunteers of the
+        project to its sketches"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project)
+        for task in tasks:
+            AnonymousTaskRunFactory.create(task=task, user_ip='127.0.0.1')
+            AnonymousTaskRunFactory.create(task=task, user_ip='127.0.0.2')
+        TaskRunFactory.create(task=tasks[0])
+
+        counts = backfill_project_volunteers(project.id)
+
+        assert counts == dict(registered=1, anonymous=2), counts
+
+    @with_context
+    def test_get_volunteers_jobs(self):
+        """Test JOB get_volunteers_jobs returns jobs for the projects not
+        backfilled only"""
+        projects = ProjectFactory.create_batch(2)
+        backfill_project_volunteers(projects[0].id)
+
+        jobs = list(get_volunteers_jobs())
+
+        assert len(jobs) == 1, jobs
+        assert jobs[0]['name'] == backfill_project_volunteers
+        assert jobs[0]['args'] == [projects[1].id]
+        assert jobs[0]['queue'] == 'low'
@@ -0,0 +1,90 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from pybossa.jobs import reconcile_project_counters
+from pybossa.core import sentinel
+from pybossa.project_counters import ProjectCounters
+from mock import patch
+from default import Test, with_context
+from factories import ProjectFactory, TaskFactory, TaskRunFactory
+
+
+class TestReconcileProjectCounters(Test):
+
+    def setUp(self):
+        super(TestReconcileProjectCounters, self).setUp()
+        self.counters = ProjectCounters(sentinel.master)
+
+    @with_context
+    def test_reconcile_fixes_drifted_counters(self):
+        """Test JOB reconcile_project_counters counts again the tasks and task
+        runs of the projects"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=1)
+        TaskFactory.create(project=project)
+        TaskRunFactory.create(task=task)
+        self.counters.load({project.id: dict(n_tasks=7, n_completed_tasks=5,
+                                             n_task_runs=0)})
+
+        reconcile_project_counters()
+
+        counters = self.counters.get(project.id)
+        assert counters == dict(n_tasks=2, n_completed_tasks=1,
+                                n_task_runs=1), counters
+
+    @with_context
+    def test_reconcile_loads_the_counters_of_every_project(self):
+        """Test JOB reconcile_project_counters loads the counters of every
+        project, in batches"""
+        projects = ProjectFactory.create_batch(3)
+        TaskFactory.create(project=projects[0])
+
+        n_projects = reconcile_project_counters(batch_size=2)
+
+        assert n_projects == 3, n_projects
+        counters = self.counters.get_many([p.id for p in projects])
+        assert counters == [dict(n_tasks=1, n_completed_tasks=0,
+                                 n_task_runs=0),
+                            dict(n_tasks=0, n_completed_tasks=0,
+                                 n_task_runs=0),
+                            dict(n_tasks=0, n_completed_tasks=0,
+                                 n_task_runs=0)], counters
+
+    @with_context
+    def test_reconcile_skips_the_counters_changed_while_counting(self):
+        """Test JOB reconcile_project_counters does not overwrite the counters
+        of a project incremented while counting it"""
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project)
+        self.counters.load({project.id: dict(n_tasks=7, n_completed_tasks=0,
+                                             n_task_runs=0)})
+        import pybossa.cache.projects as cached_projects
+        count_counters = cached_projects.count_counters
+
+        def count_and_incr(project_ids):
+            counted = count_counters(project_ids)
+            self.counters.incr(project.id, n_task_runs=1)
+            return counted
+
+        with patch('pybossa.cache.projects.count_counters',
+                   side_effect=count_and_incr):
+            reconcile_project_counters()
+
+        counters = self.counters.get(project.id)
+        assert counters == dict(n_tasks=7, n_completed_tasks=0,
+                                n_task_runs=1), counters
@@ -0,0 +1,167 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2013 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from mock import patch
+from pybossa.jobs import rollup_project_activity
+from pybossa.core import db, task_repo
+from pybossa.model.project_activity import ProjectActivity, RollupMark
+import pybossa.cache.project_stats as stats
+from default import Test, with_context
+from factories import ProjectFactory, TaskFactory, TaskRunFactory, \
+    AnonymousTaskRunFactory
+
+
+class TestRollupProjectActivity(Test):
+
+    def totals(self, project_id):
+        activity = db.session.query(ProjectActivity)\
+            .filter_by(project_id=project_id).all()
+        return dict((field, sum(getattr(a, field) for a in activity))
+                    for field in ('n_answers', 'n_auth', 'n_anon',
+                                  'n_completed'))
+
+    @with_context
+    @patch('pybossa.jobs.ROLLUP_LAG', 0)
+    def test_rollup_folds_answers_and_completed_tasks(self):
+        """Test JOB rollup_project_activity folds the answers and completed
+        tasks into the activity of their projects"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=2)
+        TaskRunFactory.create(task=task)
+        last = AnonymousTaskRunFactory.create(task=task)
+        other_project = TaskFactory.create().project
+
+        last_id = rollup_project_activity()
+
+        assert last_id == last.id, last_id
+        totals = self.totals(project.id)
+        assert totals == dict(n_answers=2, n_auth=1, n_anon=1,
+                              n_completed=1), totals
+        assert self.totals(other_project.id)['n_answers'] == 0
+
+    @with_context
+    @patch('pybossa.jobs.ROLLUP_LAG', 0)
+    def test_rollup_is_incremental(self):
+        """Test JOB rollup_project_activity only folds the new answers, in
+        batches"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=3)
+        TaskRunFactory.create(task=task)
+        rollup_project_activity()
+        TaskRunFactory.create_batch(2, task=task)
+
+        rollup_project_activity(batch_size=1)
+
+        totals = self.totals(project.id)
+        assert totals == dict(n_answers=3, n_auth=3, n_anon=0,
+                              n_completed=1), totals
+
+    @with_context
+    @patch('pybossa.jobs.ROLLUP_LAG', 0)
+    def test_rollup_fills_the_missing_timestamps(self):
+        """Test JOB rollup_project_activity folds the answers written without
+        timestamp columns, and fills them"""
+        project = ProjectFactory.create()
+        task_run = TaskRunFactory.create(task=TaskFactory.create(
+            project=project))
+        db.session.execute('''UPDATE task_run SET created_ts=NULL,
+                              finish_time_ts=NULL''')
+        db.session.commit()
+
+        rollup_project_activity()
+
+        assert self.totals(project.id)['n_answers'] == 1
+        db.session.refresh(task_run)
+        assert task_run.finish_time_ts is not None
+        assert task_run.created_ts is not None
+
+    @with_context
+    def test_rollup_leaves_the_last_answers(self):
+        """Test JOB rollup_project_activity does not fold the answers just
+        created, as they may be committed out of order"""
+        project = ProjectFactory.create()
+        TaskRunFactory.create(task=TaskFactory.create(project=project))
+
+        assert rollup_project_activity() == 0
+        assert self.totals(project.id)['n_answers'] == 0
+
+    @with_context
+    @patch('pybossa.jobs.ROLLUP_LAG', 0)
+    def test_stats_read_the_activity_and_the_last_answers(self):
+        """Test JOB rollup_project_activity does not change the stats of the
+        project"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=3)
+        TaskRunFactory.create(task=task)
+        AnonymousTaskRunFactory.create(task=task)
+        hours = stats.stats_hours(project.id)
+        dates = stats.stats_dates(project.id)
+
+        rollup_project_activity()
+        TaskRunFactory.create(task=task)
+
+        new_dates = stats.stats_dates(project.id)
+        assert stats.stats_hours(project.id)[3] == hours[3] + 1
+        assert sum(new_dates[0].values()) == sum(dates[0].values()) + 1
+        assert sum(new_dates[2].values()) == sum(dates[2].values()) + 1
+        assert new_dates[1] == dates[1], new_dates
+
+    @with_context
+    @patch('pybossa.jobs.ROLLUP_LAG', 0)
+    def test_deleted_answers_are_discounted(self):
+        """Test JOB rollup_project_activity activity is updated when an
+        answer already folded in is deleted"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        task_run = AnonymousTaskRunFactory.create(task=task)
+        TaskRunFactory.create(task=task)
+        rollup_project_activity()
+
+        task_repo.delete(task_run)
+
+        totals = self.totals(project.id)
+        assert totals == dict(n_answers=1, n_auth=1, n_anon=0,
+                              n_completed=0), totals
+
+    @with_context
+    @patch('pybossa.jobs.ROLLUP_LAG', 0)
+    def test_deleted_completions_are_discounted(self):
+        """Test JOB rollup_project_activity folds the activity of a project
+        again once a task it had completed is deleted with its answers"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=1)
+        TaskRunFactory.create(task=task)
+        other = TaskFactory.create(project=project, n_answers=1)
+        TaskRunFactory.create(task=other)
+        rollup_project_activity()
+
+        task_repo.delete(task)
+        rollup_project_activity()
+
+        totals = self.totals(project.id)
+        assert totals == dict(n_answers=1, n_auth=1, n_anon=0,
+                              n_completed=1), totals
+
+    @with_context
+    def test_mark_exists_before_the_first_run(self):
+        """Test JOB rollup_project_activity has a mark to lock even before
+        its first run"""
+        mark = db.session.query(RollupMark)\
+            .filter_by(name=ProjectActivity.__tablename__).one()
+
+        assert mark.last_id == 0, mark.last_id
@@ -0,0 +1,63 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from pybossa.jobs import (warm_lists, warm_projects, warm_users,
+                          get_warm_jobs, WARM_BATCH_SIZE)
+from pybossa.core import sentinel
+from pybossa.access_log import AccessLog
+from default import Test, with_context
+from factories import ProjectFactory, TaskFactory, TaskRunFactory
+
+
+class TestWarmCache(Test):
+
+    @with_context
+    def test_warm_lists_returns_projects_and_users(self):
+        """Test JOB warm_lists returns the projects and users to warm, the
+        most visited first"""
+        featured = ProjectFactory.create(featured=True)
+        project = ProjectFactory.create()
+        for p in (featured, project):
+            TaskRunFactory.create(task=TaskFactory.create(project=p))
+        access_log = AccessLog(sentinel.master)
+        access_log.record('project', project.id)
+
+        projects, users, elapsed = warm_lists()
+
+        assert projects == [[project.id, project.short_name, False],
+                            [featured.id, featured.short_name, True]], projects
+        assert len(users) == 2, users
+        assert elapsed >= 0
+
+    @with_context
+    def test_get_warm_jobs(self):
+        """Test JOB get_warm_jobs returns batches of projects and users in
+        the given order"""
+        projects = [[i, 'project%s' % i, False]
+                    for i in range(WARM_BATCH_SIZE + 1)]
+        users = [[1, 'user1']]
+
+        jobs = list(get_warm_jobs(projects, users))
+
+        assert len(jobs) == 3, jobs
+        assert jobs[0]['name'] == warm_projects
+        assert jobs[0]['args'] == [projects[:WARM_BATCH_SIZE]]
+        assert jobs[1]['args'] == [projects[WARM_BATCH_SIZE:]]
+        assert jobs[2]['name'] == warm_users
+        assert jobs[2]['args'] == [users]
+        assert all(job['queue'] == 'super' for job in jobs)
@@ -0,0 +1,144 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from default import Test, db, with_context
+from sqlalchemy.sql import text
+from factories import ProjectFactory, TaskFactory, AnonymousTaskRunFactory
+
+
+class TestModelIndexes(Test):
+
+    def explain(self, sql, **params):
+        # Test tables are tiny, so a sequential scan would always be cheaper
+        db.session.execute('SET LOCAL enable_seqscan = off')
+        rows = db.session.execute(text('EXPLAIN ' + sql), params)
+        return '\n'.join(row[0] for row in rows)
+
+    def setUp(self):
+        super(TestModelIndexes, self).setUp()
+        with self.flask_app.app_context():
+            project = ProjectFactory.create()
+            tasks = TaskFactory.create_batch(3, project=project)
+            AnonymousTaskRunFactory.create(project=project, task=tasks[0])
+
+    @with_context
+    def test_depth_first_candidates_use_open_priority_index(self):
+        """Test INDEXES depth_first candidates use task_open_priority_idx"""
+        plan = self.explain('''SELECT id FROM task
+                            WHERE project_id=:project_id
+                            AND state !='completed'
+                            ORDER BY priority_0 DESC, id ASC LIMIT 100''',
+                            project_id=1)
+
+        assert 'task_open_priority_idx' in plan, plan
+
+    @with_context
+    def test_breadth_first_uses_open_n_task_runs_index(self):
+        """Test INDEXES breadth_first uses task_open_n_task_runs_idx"""
+        plan = self.explain('''SELECT id FROM task
+                            WHERE project_id=:project_id
+                            AND state !='completed'
+                            ORDER BY n_task_runs, id ASC LIMIT 10''',
+                            project_id=1)
+
+        assert 'task_open_n_task_runs_idx' in plan, plan
+
+    @with_context
+    def test_random_task_ids_use_open_id_index(self):
+        """Test INDEXES random sampling uses task_open_id_idx"""
+        plan = self.explain('''SELECT id FROM task
+                            WHERE project_id=:project_id
+                            AND state !='completed' AND id >= :start
+                            ORDER BY id ASC LIMIT 20''',
+                            project_id=1, start=2)
+
+        assert 'task_open_id_idx' in plan, plan
+
+    @with_context
+    def test_answered_tasks_by_user_use_user_index(self):
+        """Test INDEXES answered tasks of a user use
+        task_run_project_id_user_id_task_id_idx"""
+        plan = self.explain('''SELECT task_id FROM task_run
+                            WHERE project_id=:project_id
+                            AND user_id=:user_id''',
+                            project_id=1, user_id=1)
+
+        assert 'task_run_project_id_user_id_task_id_idx' in plan, plan
+
+    @with_context
+    def test_answered_tasks_by_ip_use_ip_index(self):
+        """Test INDEXES answered tasks of an IP use
+        task_run_project_id_user_ip_task_id_idx"""
+        plan = self.explain('''SELECT task_id FROM task_run
+                            WHERE project_id=:project_id
+                            AND user_ip=:user_ip''',
+                            project_id=1, user_ip='127.0.0.1')
+
+        assert 'task_run_project_id_user_ip_task_id_idx' in plan, plan
+
+    @with_context
+    def test_task_run_auth_check_uses_a_composite_index(self):
+        """Test INDEXES the check for repeated answers of TaskRunAuth uses a
+        composite task_run index"""
+        plan = self.explain('''SELECT COUNT(id) FROM task_run
+                            WHERE project_id=:project_id
+                            AND task_id=:task_id
+                            AND user_id IS NULL
+                            AND user_ip=:user_ip''',
+                            project_id=1, task_id=1, user_ip='127.0.0.1')
+
+        assert 'task_run_project_id_user' in plan, plan
+
+    @with_context
+    def test_answers_of_a_task_use_task_id_index(self):
+        """Test INDEXES counting the answers of a task uses
+        task_run_task_id_idx"""
+        plan = self.explain('''SELECT COUNT(id) FROM task_run
+                            WHERE task_id=:task_id''', task_id=1)
+
+        assert 'task_run_task_id_idx' in plan, plan
+
+    @with_context
+    def test_answers_not_rolled_up_use_project_id_id_index(self):
+        """Test INDEXES the answers of a project above the rollup mark use
+        task_run_project_id_id_idx"""
+        plan = self.explain('''SELECT COUNT(id) FROM task_run
+                            WHERE project_id=:project_id AND id > :last_id''',
+                            project_id=1, last_id=1)
+
+        assert 'task_run_project_id_id_idx' in plan, plan
+
+    @with_context
+    def test_answers_of_a_period_use_finish_time_index(self):
+        """Test INDEXES the answers of a period use
+        task_run_finish_time_ts_idx"""
+        plan = self.explain('''SELECT COUNT(id) FROM task_run
+                            WHERE finish_time_ts > NOW() - INTERVAL '24 hour'
+                            ''')
+
+        assert 'task_run_finish_time_ts_idx' in plan, plan
+
+    @with_context
+    def test_projects_not_updated_use_updated_index(self):
+        """Test INDEXES the projects not updated for a period use
+        project_updated_ts_idx"""
+        plan = self.explain('''SELECT id FROM project
+                            WHERE updated_ts < NOW() - '3 month'::INTERVAL
+                            ''')
+
+        assert 'project_updated_ts_idx' in plan, plan
@@ -22,7 +22,8 @@ from mock import patch
 from pybossa.model.project import Project
 from pybossa.model.user import User
 from sqlalchemy.exc import IntegrityError
-from factories import ProjectFactory
+from factories import ProjectFactory, TaskFactory
+from pybossa.model import parse_timestamp
 
 
 class TestModelProject(Test):
@@ -170,3 +171,18 @@ class TestModelProject(Test):
         project.delete_autoimporter()
 
         assert project.has_autoimporter() is False, project.get_autoimporter()
+
+    @with_context
+    def test_project_updated_timestamp(self):
+        """Test PROJECT model updated_ts follows updated, also when a task is
+        added"""
+        project = ProjectFactory.create()
+        assert project.updated_ts == parse_timestamp(project.updated)
+
+        project.name = u'New name'
+        db.session.commit()
+        assert project.updated_ts == parse_timestamp(project.updated)
+
+        TaskFactory.create(project=project)
+        db.session.refresh(project)
+        assert project.updated_ts == parse_timestamp(project.updated)
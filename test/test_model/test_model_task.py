@@ -23,6 +23,7 @@ from pybossa.model.user import User
 from pybossa.model.project import Project
 from pybossa.model.task import Task
 from pybossa.model.category import Category
+from factories import TaskFactory, AnonymousTaskRunFactory
 
 
 class TestModelTask(Test):
@@ -49,3 +50,36 @@ class TestModelTask(Test):
         db.session.add(task)
         assert_raises(IntegrityError, db.session.commit)
         db.session.rollback()
+
+
+    @with_context
+    def test_task_n_task_runs_follows_task_runs(self):
+        """Test TASK n_task_runs is updated when task runs are added or
+        deleted"""
+        task = TaskFactory.create(n_answers=5)
+        task_runs = AnonymousTaskRunFactory.create_batch(2, task=task)
+        db.session.expire_all()
+
+        assert db.session.query(Task).get(task.id).n_task_runs == 2
+
+        db.session.delete(task_runs[0])
+        db.session.commit()
+        db.session.expire_all()
+
+        assert db.session.query(Task).get(task.id).n_task_runs == 1
+
+
+    @with_context
+    def test_task_last_task_run_id_follows_task_runs(self):
+        """Test TASK last_task_run_id points to the last answer of the task"""
+        task = TaskFactory.create(n_answers=5)
+        first, last = AnonymousTaskRunFactory.create_batch(2, task=task)
+        db.session.expire_all()
+
+        assert db.session.query(Task).get(task.id).last_task_run_id == last.id
+
+        db.session.delete(last)
+        db.session.commit()
+        db.session.expire_all()
+
+        assert db.session.query(Task).get(task.id).last_task_run_id == first.id
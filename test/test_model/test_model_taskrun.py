@@ -24,6 +24,8 @@ from pybossa.model.project import Project
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from pybossa.model.category import Category
+from pybossa.model import parse_timestamp
+from factories import TaskRunFactory
 
 
 class TestModelTaskRun(Test):
@@ -59,3 +61,24 @@ class TestModelTaskRun(Test):
         db.session.add(task_run)
         assert_raises(IntegrityError, db.session.commit)
         db.session.rollback()
+
+    @with_context
+    def test_task_run_timestamps(self):
+        """Test TASK_RUN model keeps the timestamps of its text columns"""
+        task_run = TaskRunFactory.create(finish_time='2015-07-01T10:00:00')
+
+        assert task_run.created_ts == parse_timestamp(task_run.created)
+        assert task_run.finish_time_ts.isoformat() == '2015-07-01T10:00:00'
+        assert 'finish_time_ts' not in task_run.dictize()
+
+        task_run.finish_time = '2015-07-02T11:30:00.123456'
+        db.session.commit()
+
+        assert task_run.finish_time_ts.isoformat() == task_run.finish_time
+
+    def test_parse_timestamp(self):
+        """Test TASK_RUN parse_timestamp only parses make_timestamp values"""
+        assert parse_timestamp('2015-07-01T10:00:00.5').microsecond == 500000
+        assert parse_timestamp('2015-07-01T10:00:00').hour == 10
+        assert parse_timestamp('now') is None
+        assert parse_timestamp(None) is None
@@ -0,0 +1,106 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.project_counters import ProjectCounters
+
+
+class TestProjectCounters(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.counters = ProjectCounters(self.connection)
+
+    def values(self, n_tasks=0, n_completed_tasks=0, n_task_runs=0):
+        return dict(n_tasks=n_tasks, n_completed_tasks=n_completed_tasks,
+                    n_task_runs=n_task_runs)
+
+    def test_get_returns_none_if_not_loaded(self):
+        """Test ProjectCounters get returns None for a project not loaded"""
+        assert self.counters.get(1) is None
+
+    def test_load_and_get_many(self):
+        """Test ProjectCounters get_many returns the loaded counters"""
+        self.counters.load({1: self.values(4, 1, 10), 2: self.values()})
+
+        counters = self.counters.get_many([1, 2, 3])
+
+        assert counters == [self.values(4, 1, 10), self.values(), None]
+
+    def test_counters_expire(self):
+        """Test ProjectCounters counters expire after TTL seconds"""
+        self.counters.load({1: self.values(4, 1, 10)})
+
+        ttl = self.connection.ttl(ProjectCounters.KEY % 1)
+        assert 0 < ttl <= ProjectCounters.TTL
+
+    def test_incr(self):
+        """Test ProjectCounters incr adds the deltas to the counters"""
+        self.counters.load({1: self.values(4, 1, 10)})
+
+        self.counters.incr(1, n_task_runs=1, n_completed_tasks=1)
+        self.counters.incr(1, n_tasks=-1)
+
+        assert self.counters.get(1) == self.values(3, 2, 11)
+
+    def test_incr_ignores_counters_not_loaded(self):
+        """Test ProjectCounters incr does not create partial counters"""
+        self.counters.incr(1, n_task_runs=1)
+
+        assert self.counters.get(1) is None
+        assert not self.connection.exists(ProjectCounters.KEY % 1)
+
+    def test_reconcile_stores_the_expected_counters(self):
+        """Test ProjectCounters reconcile stores the counters of the projects
+        whose counters are the expected ones, or not loaded"""
+        self.counters.load({1: self.values(4, 1, 10)})
+
+        stored = self.counters.reconcile(
+            {1: self.values(5, 1, 12), 2: self.values(3)},
+            {1: self.values(4, 1, 10), 2: None})
+
+        assert sorted(stored) == [1, 2], stored
+        assert self.counters.get(1) == self.values(5, 1, 12)
+        assert self.counters.get(2) == self.values(3)
+        ttl = self.connection.ttl(ProjectCounters.KEY % 2)
+        assert 0 < ttl <= ProjectCounters.TTL
+
+    def test_reconcile_keeps_the_counters_changed_meanwhile(self):
+        """Test ProjectCounters reconcile does not overwrite the increments
+        made after the expected counters were read"""
+        self.counters.load({1: self.values(4, 1, 10)})
+        self.counters.incr(1, n_task_runs=1)
+        self.counters.load({2: self.values(3)})
+
+        stored = self.counters.reconcile(
+            {1: self.values(5, 1, 12), 2: self.values(3)},
+            {1: self.values(4, 1, 10), 2: None})
+
+        assert stored == [], stored
+        assert self.counters.get(1) == self.values(4, 1, 11)
+        assert self.counters.get(2) == self.values(3)
+
+    def test_invalidate(self):
+        """Test ProjectCounters invalidate drops the counters of a project"""
+        self.counters.load({1: self.values(4), 2: self.values(5)})
+
+        self.counters.invalidate(1)
+
+        assert self.counters.get(1) is None
+        assert self.counters.get(2) == self.values(5)
@@ -0,0 +1,89 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.project_volunteers import ProjectVolunteers
+
+
+class TestProjectVolunteers(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.volunteers = ProjectVolunteers(self.connection)
+
+    def test_count_returns_none_if_not_backfilled(self):
+        """Test ProjectVolunteers count returns None until the project is
+        backfilled"""
+        self.volunteers.add(1, user_id=1)
+
+        assert self.volunteers.count(1) is None
+        assert self.volunteers.ready_many([1]) == [False]
+
+    def test_backfill_and_add(self):
+        """Test ProjectVolunteers counts the backfilled and added volunteers
+        once"""
+        self.volunteers.add(1, user_id=3)
+        self.volunteers.backfill(1, [1, 2, 3], ['127.0.0.1'])
+        self.volunteers.add(1, user_id=2)
+        self.volunteers.add(1, user_ip='127.0.0.2')
+
+        assert self.volunteers.count(1) == dict(registered=3, anonymous=2)
+
+    def test_add_ignores_answers_with_user_id_and_ip(self):
+        """Test ProjectVolunteers add classifies volunteers as the SQL
+        queries do"""
+        self.volunteers.backfill(1, [], [])
+        self.volunteers.add(1, user_id=1, user_ip='127.0.0.1')
+        self.volunteers.add(1)
+
+        assert self.volunteers.count(1) == dict(registered=0, anonymous=0)
+
+    def test_backfill_many_volunteers(self):
+        """Test ProjectVolunteers approximates large numbers of volunteers
+        with a small error"""
+        n_volunteers = 3 * ProjectVolunteers.CHUNK_SIZE + 1
+        user_ips = ('10.0.%s.%s' % (i / 256, i % 256)
+                    for i in range(n_volunteers))
+
+        self.volunteers.backfill(1, xrange(n_volunteers), user_ips)
+
+        counts = self.volunteers.count(1)
+        for kind in ProjectVolunteers.KINDS:
+            error = abs(counts[kind] - n_volunteers)
+            assert error < 0.03 * n_volunteers, counts
+
+    def test_count_many(self):
+        """Test ProjectVolunteers count_many counts many projects at once"""
+        self.volunteers.backfill(1, [1], [])
+        self.volunteers.backfill(3, [], ['127.0.0.1'])
+
+        counts = self.volunteers.count_many([1, 2, 3])
+
+        assert counts == [dict(registered=1, anonymous=0), None,
+                          dict(registered=0, anonymous=1)], counts
+
+    def test_invalidate(self):
+        """Test ProjectVolunteers invalidate drops the sketches of a project"""
+        self.volunteers.backfill(1, [1], [])
+        self.volunteers.backfill(2, [1], [])
+
+        self.volunteers.invalidate(1)
+
+        assert self.volunteers.count(1) is None
+        assert self.volunteers.count(2) == dict(registered=1, anonymous=0)
@@ -18,6 +18,8 @@
 # Cache global variables for timeouts
 
 from default import Test, db
+from pybossa.core import sentinel
+from pybossa.task_pool import TaskPool
 from nose.tools import assert_raises
 from factories import TaskFactory, TaskRunFactory, ProjectFactory
 from pybossa.repositories import TaskRepository
@@ -549,3 +551,87 @@ class TestTaskRepositorySaveDeleteUpdate(Test):
 
         for task in tasks:
             assert task.state == 'completed', task.state
+
+
+class TestTaskRepositoryTaskPool(Test):
+
+    def setUp(self):
+        super(TestTaskRepositoryTaskPool, self).setUp()
+        self.task_repo = TaskRepository(db)
+        self.pool = TaskPool(sentinel.master)
+
+
+    def _pool_ids(self, project_id):
+        return [task_id for chunk in self.pool.iter_task_ids(project_id)
+                for task_id in chunk]
+
+
+    def test_save_adds_task_to_warm_pool(self):
+        """Test save adds new tasks to the pool of the project, sorted by
+        priority"""
+
+        project = ProjectFactory.create()
+        low = TaskFactory.create(project=project, priority_0=0)
+        self.pool.fill(project.id, [(low.id, 0)])
+
+        high = TaskFactory.create(project=project, priority_0=1)
+
+        assert self._pool_ids(project.id) == [high.id, low.id]
+
+
+    def test_save_does_not_create_cold_pools(self):
+        """Test save does not add tasks to a pool that is not filled"""
+
+        task = TaskFactory.create()
+
+        assert self.pool.size(task.project_id) == 0
+
+
+    def test_update_rescores_task_in_pool(self):
+        """Test update applies priority changes to the pool straight away"""
+
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project, priority_0=0)
+        self.pool.fill(project.id, [(task.id, 0) for task in tasks])
+
+        tasks[1].priority_0 = 0.5
+        self.task_repo.update(tasks[1])
+
+        assert self._pool_ids(project.id) == [tasks[1].id, tasks[0].id]
+
+
+    def test_update_removes_completed_task_from_pool(self):
+        """Test update removes completed tasks from the pool"""
+
+        task = TaskFactory.create()
+        self.pool.fill(task.project_id, [(task.id, 0)])
+
+        task.state = 'completed'
+        self.task_repo.update(task)
+
+        assert self._pool_ids(task.project_id) == []
+
+
+    def test_delete_removes_task_from_pool(self):
+        """Test delete and delete_all remove the tasks from the pool"""
+
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project)
+        self.pool.fill(project.id, [(task.id, 0) for task in tasks])
+
+        self.task_repo.delete(tasks[0])
+        self.task_repo.delete_all(tasks[1:])
+
+        assert self._pool_ids(project.id) == []
+
+
+    def test_update_tasks_redundancy_invalidates_pool(self):
+        """Test update_tasks_redundancy makes the pool of the project cold"""
+
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        self.pool.fill(project.id, [(task.id, 0)])
+
+        self.task_repo.update_tasks_redundancy(project, 2)
+
+        assert self.pool.is_warm(project.id) is False
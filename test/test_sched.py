@@ -486,3 +486,666 @@ class TestGetBreadthFirst(Test):
         tr = TaskRun(project=project, task=task, user=user)
         db.session.add(tr)
         db.session.commit()
+
+    @with_context
+    def test_breadth_first_uses_task_answer_count(self):
+        """Test SCHED breadth_first orders the tasks by task.n_task_runs"""
+        project = ProjectFactory.create()
+        busy = TaskFactory.create(project=project, n_task_runs=5)
+        idle = TaskFactory.create(project=project, n_task_runs=1)
+
+        out = pybossa.sched.get_breadth_first_task(project.id)
+
+        assert out.id == idle.id, out
+
+
+class TestGetPoolTask(Test):
+
+    def _fill_pool(self, project):
+        from pybossa.jobs import fill_task_pool
+        return fill_task_pool(project.id)
+
+    @with_context
+    @patch('pybossa.sched._request_pool_fill')
+    def test_cold_pool_falls_back_to_depth_first(self, request_fill):
+        """Test SCHED pool uses depth_first and requests a fill when the pool
+        is cold"""
+        project = ProjectFactory.create(info={'sched': 'pool'})
+        tasks = TaskFactory.create_batch(2, project=project)
+
+        task = pybossa.sched.new_task(project.id, 'pool')
+
+        assert task.id == tasks[0].id, task
+        assert request_fill.called
+
+    @with_context
+    def test_warm_pool_respects_priority(self):
+        """Test SCHED pool returns the task with the highest priority"""
+        project = ProjectFactory.create(info={'sched': 'pool'})
+        TaskFactory.create(project=project, priority_0=0)
+        high = TaskFactory.create(project=project, priority_0=1)
+        assert self._fill_pool(project) == 2
+
+        task = pybossa.sched.get_pool_task(project.id, user_ip='127.0.0.1')
+
+        assert task.id == high.id, task
+
+    @with_context
+    def test_warm_pool_excludes_answered_tasks(self):
+        """Test SCHED pool does not return tasks already answered by the user"""
+        project = ProjectFactory.create(info={'sched': 'pool'})
+        tasks = TaskFactory.create_batch(2, project=project)
+        AnonymousTaskRunFactory.create(project=project, task=tasks[0])
+        self._fill_pool(project)
+
+        task = pybossa.sched.get_pool_task(project.id, user_ip='127.0.0.1')
+        other = pybossa.sched.get_pool_task(project.id, user_ip='127.0.0.2')
+
+        assert task.id == tasks[1].id, task
+        assert other.id == tasks[0].id, other
+
+    @with_context
+    def test_warm_pool_offset(self):
+        """Test SCHED pool skips offset tasks"""
+        project = ProjectFactory.create(info={'sched': 'pool'})
+        tasks = TaskFactory.create_batch(3, project=project)
+        self._fill_pool(project)
+
+        task = pybossa.sched.get_pool_task(project.id, user_ip='127.0.0.1',
+                                           offset=2)
+        none = pybossa.sched.get_pool_task(project.id, user_ip='127.0.0.1',
+                                           offset=3)
+
+        assert task.id == tasks[2].id, task
+        assert none is None, none
+
+    @with_context
+    def test_completed_tasks_leave_the_pool(self):
+        """Test SCHED pool removes tasks once they are completed"""
+        project = ProjectFactory.create(info={'sched': 'pool'})
+        task = TaskFactory.create(project=project, n_answers=1)
+        self._fill_pool(project)
+
+        AnonymousTaskRunFactory.create(project=project, task=task)
+
+        out = pybossa.sched.get_pool_task(project.id, user_ip='127.0.0.2')
+        assert out is None, out
+
+
+class TestGetRandomTask(Test):
+
+    @with_context
+    @patch('pybossa.sched._request_pool_fill')
+    def test_random_is_registered(self, request_fill):
+        """Test SCHED random is a scheduler variant used by new_task"""
+        project = ProjectFactory.create(info={'sched': 'random'})
+        tasks = TaskFactory.create_batch(3, project=project)
+
+        with patch('pybossa.sched.get_random_task_ids') as random_ids:
+            random_ids.return_value = [tasks[1].id]
+            task = pybossa.sched.new_task(project.id, 'random')
+
+        assert 'random' in dict(pybossa.sched.sched_variants())
+        assert task.id == tasks[1].id, task
+
+    @with_context
+    def test_random_from_warm_pool(self):
+        """Test SCHED random samples the tasks from a warm pool"""
+        from pybossa.jobs import fill_task_pool
+        project = ProjectFactory.create(info={'sched': 'random'})
+        tasks = TaskFactory.create_batch(5, project=project)
+        fill_task_pool(project.id)
+
+        with patch('pybossa.sched.get_random_task_ids') as random_ids:
+            task = pybossa.sched.get_random_task(project.id,
+                                                 user_ip='127.0.0.1')
+            assert not random_ids.called
+
+        assert task.id in [t.id for t in tasks], task
+
+    @with_context
+    @patch('pybossa.sched._request_pool_fill')
+    def test_random_skips_answered_tasks(self, request_fill):
+        """Test SCHED random never returns a task answered by the user"""
+        project = ProjectFactory.create(info={'sched': 'random'})
+        tasks = TaskFactory.create_batch(30, project=project)
+        for task in tasks[:-1]:
+            AnonymousTaskRunFactory.create(project=project, task=task)
+
+        for i in range(5):
+            task = pybossa.sched.get_random_task(project.id,
+                                                 user_ip='127.0.0.1')
+            assert task.id == tasks[-1].id, task
+
+    @with_context
+    @patch('pybossa.sched._request_pool_fill')
+    def test_random_returns_none_without_tasks(self, request_fill):
+        """Test SCHED random returns None when there are no tasks left"""
+        project = ProjectFactory.create(info={'sched': 'random'})
+        task = TaskFactory.create(project=project)
+        AnonymousTaskRunFactory.create(project=project, task=task)
+
+        out = pybossa.sched.get_random_task(project.id, user_ip='127.0.0.1')
+
+        assert out is None, out
+
+    @with_context
+    @patch('pybossa.sched._request_pool_fill')
+    def test_random_spreads_tasks(self, request_fill):
+        """Test SCHED random does not always return the same task"""
+        project = ProjectFactory.create(info={'sched': 'random'})
+        TaskFactory.create_batch(20, project=project)
+
+        task_ids = set(pybossa.sched.get_random_task(
+            project.id, user_ip='10.0.0.%s' % i).id for i in range(1, 21))
+
+        assert len(task_ids) > 1, task_ids
+
+    @with_context
+    def test_random_task_ids_wrap_around(self):
+        """Test SCHED get_random_task_ids returns a full sample whatever the
+        random id it starts from"""
+        project = ProjectFactory.create(info={'sched': 'random'})
+        tasks = TaskFactory.create_batch(5, project=project)
+
+        for i in range(10):
+            task_ids = pybossa.sched.get_random_task_ids(project.id, 5)
+            assert sorted(task_ids) == [t.id for t in tasks], task_ids
+
+
+class TestGetIncrementalTask(Test):
+
+    @with_context
+    def test_incremental_returns_last_answer(self):
+        """Test SCHED incremental adds the last answer of the task"""
+        project = ProjectFactory.create(info={'sched': 'incremental'})
+        task = TaskFactory.create(project=project, info={'question': 'q'})
+        AnonymousTaskRunFactory.create(task=task, user_ip='10.0.0.1',
+                                       info={'answer': 'first'})
+        AnonymousTaskRunFactory.create(task=task, user_ip='10.0.0.2',
+                                       info={'answer': 'last'})
+
+        out = pybossa.sched.get_incremental_task(project.id,
+                                                 user_ip='10.0.0.3')
+
+        assert out.id == task.id, out
+        assert out.info['last_answer'] == {'answer': 'last'}, out.info
+
+    @with_context
+    def test_incremental_without_answers(self):
+        """Test SCHED incremental returns tasks without answers as they are"""
+        project = ProjectFactory.create(info={'sched': 'incremental'})
+        TaskFactory.create(project=project, info={'question': 'q'})
+
+        out = pybossa.sched.get_incremental_task(project.id,
+                                                 user_ip='10.0.0.1')
+
+        assert out.info == {'question': 'q'}, out.info
+
+    @with_context
+    def test_incremental_with_limit(self):
+        """Test SCHED incremental adds the last answer to every task"""
+        project = ProjectFactory.create(info={'sched': 'incremental'})
+        tasks = TaskFactory.create_batch(2, project=project, info={})
+        for task in tasks:
+            AnonymousTaskRunFactory.create(task=task, user_ip='10.0.0.1',
+                                           info={'answer': task.id})
+
+        out = pybossa.sched.get_incremental_task(project.id,
+                                                 user_ip='10.0.0.2', limit=2)
+
+        assert len(out) == 2, out
+        for task in out:
+            assert task.info['last_answer'] == {'answer': task.id}, task.info
+
+    @with_context
+    def test_incremental_spreads_users_over_the_candidates(self):
+        """Test SCHED incremental picks tasks at random among the candidates"""
+        project = ProjectFactory.create(info={'sched': 'incremental'})
+        tasks = TaskFactory.create_batch(10, project=project, info={},
+                                         n_answers=100)
+
+        task_ids = set(pybossa.sched.get_incremental_task(
+            project.id, user_ip='10.0.0.%s' % i).id for i in range(1, 21))
+
+        assert len(task_ids) > 1, task_ids
+        assert task_ids <= set(task.id for task in tasks), task_ids
+
+
+class TestGetAnsweredTaskIds(Test):
+
+    @with_context
+    def test_loads_answered_tasks_from_db(self):
+        """Test SCHED get_answered_task_ids returns the tasks answered by the
+        user"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project)
+        AnonymousTaskRunFactory.create(project=project, task=tasks[0])
+
+        answered = pybossa.sched.get_answered_task_ids(project.id,
+                                                       user_ip='127.0.0.1')
+
+        assert answered == set([tasks[0].id]), answered
+
+    @with_context
+    def test_new_answers_update_the_loaded_set(self):
+        """Test SCHED answered tasks are kept up to date on TaskRun insert"""
+        user = UserFactory.create()
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project)
+        assert pybossa.sched.get_answered_task_ids(project.id, user.id) == set()
+
+        TaskRunFactory.create(project=project, task=tasks[1], user=user)
+
+        with patch('pybossa.sched.db') as db:
+            answered = pybossa.sched.get_answered_task_ids(project.id, user.id)
+            assert not db.session.execute.called
+        assert answered == set([tasks[1].id]), answered
+
+    @with_context
+    def test_answers_rolled_back_are_not_recorded(self):
+        """Test SCHED answered tasks only get the answers once committed"""
+        user = UserFactory.create()
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        assert pybossa.sched.get_answered_task_ids(project.id, user.id) == set()
+
+        db.session.add(TaskRun(project_id=project.id, task_id=task.id,
+                               user_id=user.id))
+        db.session.flush()
+        db.session.rollback()
+
+        answered = pybossa.sched.get_answered_task_ids(project.id, user.id)
+        assert answered == set(), answered
+
+    @with_context
+    def test_loads_answered_tasks_from_master(self):
+        """Test SCHED answered tasks are not loaded from a lagging replica"""
+        user = UserFactory.create()
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        TaskRunFactory.create(project=project, task=task, user=user)
+
+        with patch('pybossa.sched.session') as slave_session:
+            answered = pybossa.sched.get_answered_task_ids(project.id, user.id)
+            assert not slave_session.execute.called
+        assert answered == set([task.id]), answered
+
+    @with_context
+    def test_schedulers_skip_answered_tasks(self):
+        """Test SCHED depth_first and breadth_first skip answered tasks"""
+        user = UserFactory.create()
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project)
+        TaskRunFactory.create(project=project, task=tasks[0], user=user)
+
+        depth = pybossa.sched.get_depth_first_task(project.id, user.id)
+        breadth = pybossa.sched.get_breadth_first_task(project.id, user.id)
+
+        assert depth.id == tasks[1].id, depth
+        assert breadth.id == tasks[1].id, breadth
+
+    @with_context
+    @patch('pybossa.sched.CANDIDATES_PAGE_SIZE', 2)
+    def test_schedulers_page_past_answered_tasks(self):
+        """Test SCHED depth_first and breadth_first keep reading tasks when a
+        whole page of them is answered"""
+        user = UserFactory.create()
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(6, project=project)
+        for task in tasks[:5]:
+            TaskRunFactory.create(project=project, task=task, user=user)
+
+        depth = pybossa.sched.get_depth_first_task(project.id, user.id)
+        breadth = pybossa.sched.iter_open_task_ids(project.id, user.id,
+                                                   order='breadth_first')
+
+        assert depth.id == tasks[5].id, depth
+        assert list(breadth) == [tasks[5].id]
+
+    @with_context
+    def test_candidates_check_answers_per_page(self):
+        """Test SCHED the candidates are checked against the answered tasks
+        without reading the whole set"""
+        user = UserFactory.create()
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project)
+        TaskRunFactory.create(project=project, task=tasks[0], user=user)
+        pybossa.sched.get_answered_task_ids(project.id, user.id)
+
+        with patch('pybossa.sched.get_answered_task_ids') as answered:
+            out = pybossa.sched.get_depth_first_task(project.id, user.id)
+            assert not answered.called
+        assert out.id == tasks[1].id, out
+
+
+class TestTaskLeases(Test):
+
+    @with_context
+    def test_newtask_does_not_overassign_under_concurrency(self):
+        """Test SCHED newtask hands a task out at most n_answers times to many
+        concurrent users"""
+        import threading
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=3)
+        url = 'api/project/%s/newtask' % project.id
+        assigned = []
+
+        def request_task(user_ip):
+            client = self.flask_app.test_client()
+            res = client.get(url, environ_base={'REMOTE_ADDR': user_ip})
+            data = json.loads(res.data)
+            if data.get('id'):
+                assigned.append(data['id'])
+
+        threads = [threading.Thread(target=request_task,
+                                    args=('10.0.0.%s' % i,))
+                   for i in range(1, 51)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert assigned == [task.id] * 3, assigned
+
+    @with_context
+    def test_leases_count_submitted_answers(self):
+        """Test SCHED a task is only leased for the answers it still needs"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=2)
+        AnonymousTaskRunFactory.create(project=project, task=task,
+                                       user_ip='10.0.0.1')
+
+        first = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.2')
+        second = pybossa.sched.get_depth_first_task(project.id,
+                                                    user_ip='10.0.0.3')
+
+        assert first.id == task.id, first
+        assert second is None, second
+
+    @with_context
+    def test_submitting_an_answer_releases_the_lease(self):
+        """Test SCHED the lease of a user is released when it answers"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=2)
+        pybossa.sched.get_depth_first_task(project.id, user_ip='10.0.0.1')
+
+        AnonymousTaskRunFactory.create(project=project, task=task,
+                                       user_ip='10.0.0.1')
+
+        out = pybossa.sched.get_depth_first_task(project.id,
+                                                 user_ip='10.0.0.2')
+        assert out.id == task.id, out
+
+    @with_context
+    def test_same_user_gets_its_leased_task_again(self):
+        """Test SCHED a user keeps getting the task it holds a lease on"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=1)
+
+        first = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.1')
+        again = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.1')
+        other = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.2')
+
+        assert first.id == again.id == task.id
+        assert other is None, other
+
+    @with_context
+    @patch('pybossa.sched.CANDIDATES_PAGE_SIZE', 2)
+    def test_leases_go_past_the_leased_candidates(self):
+        """Test SCHED a user gets a task when all the first candidates are
+        leased to others"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project, n_answers=1)
+        first = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.1')
+        second = pybossa.sched.get_depth_first_task(project.id,
+                                                    user_ip='10.0.0.2')
+
+        out = pybossa.sched.get_depth_first_task(project.id,
+                                                 user_ip='10.0.0.3')
+
+        assert [first.id, second.id] == [tasks[0].id, tasks[1].id]
+        assert out.id == tasks[2].id, out
+
+    @with_context
+    def test_prefetch_uses_the_cached_lease_limits(self):
+        """Test SCHED prefetching the next task does not read the lease
+        limits of the tasks again"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project, n_answers=1)
+        first = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.1')
+
+        with patch('pybossa.sched.get_lease_limits') as get_lease_limits:
+            prefetched = pybossa.sched.get_depth_first_task(
+                project.id, user_ip='10.0.0.1', offset=1)
+
+        assert not get_lease_limits.called
+        assert [first.id, prefetched.id] == [t.id for t in tasks]
+
+    @with_context
+    def test_answers_drop_the_cached_lease_limit(self):
+        """Test SCHED a task is not leased for the answers it got after its
+        lease limit was cached"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=3)
+        pybossa.sched.get_depth_first_task(project.id, user_ip='10.0.0.1')
+        AnonymousTaskRunFactory.create(project=project, task=task,
+                                       user_ip='10.0.0.2')
+        AnonymousTaskRunFactory.create(project=project, task=task,
+                                       user_ip='10.0.0.3')
+
+        out = pybossa.sched.get_depth_first_task(project.id,
+                                                 user_ip='10.0.0.4')
+
+        assert out is None, out
+
+
+class TestCandidateTaskIds(Test):
+
+    @with_context
+    def test_offset_requests_reuse_candidates(self):
+        """Test SCHED depth_first prefetching with offset does not query the
+        candidates again"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project)
+        first = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.1')
+
+        with patch('pybossa.sched.filter_answered') as answered:
+            second = pybossa.sched.get_depth_first_task(project.id,
+                                                        user_ip='10.0.0.1',
+                                                        offset=1)
+            assert not answered.called
+
+        assert first.id == tasks[0].id, first
+        assert second.id == tasks[1].id, second
+
+    @with_context
+    def test_submitting_drops_the_user_candidates(self):
+        """Test SCHED the cached candidates of a user are dropped when it
+        submits an answer"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project)
+        first = pybossa.sched.get_depth_first_task(project.id,
+                                                   user_ip='10.0.0.1')
+
+        AnonymousTaskRunFactory.create(project=project, task=first,
+                                       user_ip='10.0.0.1')
+
+        out = pybossa.sched.get_depth_first_task(project.id,
+                                                 user_ip='10.0.0.1')
+        assert out.id == tasks[1].id, out
+
+    @with_context
+    def test_new_tasks_drop_all_candidates(self):
+        """Test SCHED new tasks are taken into account straight away"""
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project, priority_0=0)
+        pybossa.sched.get_depth_first_task(project.id, user_ip='10.0.0.1')
+
+        urgent = TaskFactory.create(project=project, priority_0=1)
+
+        out = pybossa.sched.get_depth_first_task(project.id,
+                                                 user_ip='10.0.0.1')
+        assert out.id == urgent.id, out
+
+
+class TestGetCalibrationTask(Test):
+
+    @with_context
+    def test_calibration_is_registered(self):
+        """Test SCHED calibration is an available scheduler"""
+        assert 'calibration' in dict(pybossa.sched.sched_variants())
+
+    @with_context
+    def test_calibration_frac_zero_never_sends_gold_tasks(self):
+        """Test SCHED calibration with calibration_frac 0 sends the normal
+        tasks in depth_first order"""
+        project = ProjectFactory.create(calibration_frac=0)
+        TaskFactory.create(project=project, calibration=1, priority_0=1)
+        tasks = TaskFactory.create_batch(2, project=project)
+
+        out = pybossa.sched.new_tasks(project.id, 'calibration',
+                                      user_ip='10.0.0.1', limit=3)
+
+        assert [task.id for task in out] == [tasks[0].id, tasks[1].id], out
+
+    @with_context
+    def test_calibration_frac_one_sends_unanswered_gold_tasks(self):
+        """Test SCHED calibration with calibration_frac 1 sends only the gold
+        tasks the user has not answered, even if completed"""
+        project = ProjectFactory.create(calibration_frac=1)
+        gold = TaskFactory.create_batch(2, project=project, calibration=1,
+                                        n_answers=1)
+        TaskFactory.create(project=project)
+        AnonymousTaskRunFactory.create(project=project, task=gold[0],
+                                       user_ip='10.0.0.1')
+
+        out = pybossa.sched.get_calibration_task(project.id,
+                                                 user_ip='10.0.0.2')
+        again = pybossa.sched.get_calibration_task(project.id,
+                                                   user_ip='10.0.0.1')
+
+        assert out.id in [gold[0].id, gold[1].id], out
+        assert again.id == gold[1].id, again
+
+    @with_context
+    def test_normal_tasks_once_gold_tasks_are_answered(self):
+        """Test SCHED calibration sends normal tasks when the user has
+        answered all the gold ones"""
+        project = ProjectFactory.create(calibration_frac=1)
+        gold = TaskFactory.create(project=project, calibration=1)
+        task = TaskFactory.create(project=project)
+        AnonymousTaskRunFactory.create(project=project, task=gold,
+                                       user_ip='10.0.0.1')
+
+        out = pybossa.sched.get_calibration_task(project.id,
+                                                 user_ip='10.0.0.1')
+
+        assert out.id == task.id, out
+
+    @with_context
+    def test_gold_pool_is_cached(self):
+        """Test SCHED calibration does not query the gold tasks again once
+        they are cached"""
+        project = ProjectFactory.create(calibration_frac=1)
+        gold = TaskFactory.create(project=project, calibration=1)
+        pybossa.sched.get_calibration_task(project.id, user_ip='10.0.0.1')
+
+        with patch('pybossa.sched.session.execute') as execute:
+            frac, task_ids = pybossa.sched.get_gold_task_ids(project.id)
+            assert not execute.called
+
+        assert (frac, task_ids) == (1, [gold.id]), (frac, task_ids)
+
+    @with_context
+    def test_gold_pool_is_dropped_on_changes(self):
+        """Test SCHED calibration takes new gold tasks and changes to
+        calibration_frac into account straight away"""
+        project = ProjectFactory.create(calibration_frac=0)
+        pybossa.sched.get_gold_task_ids(project.id)
+
+        gold = TaskFactory.create(project=project, calibration=1)
+        project.calibration_frac = 0.5
+        db.session.commit()
+
+        out = pybossa.sched.get_gold_task_ids(project.id)
+        assert out == (0.5, [gold.id]), out
+
+
+class TestNewTasks(Test):
+
+    @with_context
+    def test_new_tasks_returns_up_to_limit_tasks(self):
+        """Test SCHED new_tasks returns up to limit tasks in order"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project)
+
+        out = pybossa.sched.new_tasks(project.id, 'default',
+                                      user_ip='127.0.0.1', limit=2)
+        rest = pybossa.sched.new_tasks(project.id, 'default',
+                                       user_ip='127.0.0.1', offset=2, limit=2)
+
+        assert [task.id for task in out] == [tasks[0].id, tasks[1].id], out
+        assert [task.id for task in rest] == [tasks[2].id], rest
+
+    @with_context
+    def test_new_tasks_leases_every_returned_task(self):
+        """Test SCHED new_tasks leases all the tasks it returns"""
+        project = ProjectFactory.create()
+        TaskFactory.create_batch(2, project=project, n_answers=1)
+
+        out = pybossa.sched.new_tasks(project.id, 'default',
+                                      user_ip='10.0.0.1', limit=2)
+        other = pybossa.sched.new_tasks(project.id, 'default',
+                                        user_ip='10.0.0.2', limit=2)
+
+        assert len(out) == 2, out
+        assert other == [], other
+
+    @with_context
+    def test_new_tasks_breadth_first(self):
+        """Test SCHED new_tasks with breadth_first returns the tasks with less
+        answers first"""
+        project = ProjectFactory.create(info={'sched': 'breadth_first'})
+        tasks = TaskFactory.create_batch(3, project=project)
+        AnonymousTaskRunFactory.create(project=project, task=tasks[0],
+                                       user_ip='10.0.0.1')
+
+        out = pybossa.sched.new_tasks(project.id, 'breadth_first',
+                                      user_ip='127.0.0.1', limit=3)
+
+        expected = [tasks[1].id, tasks[2].id, tasks[0].id]
+        assert [task.id for task in out] == expected, out
+
+    @with_context
+    def test_newtask_api_with_limit(self):
+        """Test SCHED newtask with limit returns a list of tasks and marks
+        them all as requested"""
+        from pybossa.core import sentinel
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project)
+
+        res = self.app.get('api/project/%s/newtask?limit=2' % project.id)
+        data = json.loads(res.data)
+
+        assert [task['id'] for task in data] == [tasks[0].id, tasks[1].id]
+        for task in tasks[:2]:
+            key = 'pybossa:task_requested:user:127.0.0.1:task:%s' % task.id
+            assert sentinel.master.get(key), key
+
+    @with_context
+    def test_newtask_api_with_limit_and_no_tasks(self):
+        """Test SCHED newtask with limit returns an empty list when there are
+        no tasks"""
+        project = ProjectFactory.create()
+
+        res = self.app.get('api/project/%s/newtask?limit=2' % project.id)
+
+        assert json.loads(res.data) == [], res.data
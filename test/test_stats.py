@@ -18,6 +18,7 @@
 
 import datetime
 import time
+from mock import patch
 from factories import ProjectFactory, TaskFactory, TaskRunFactory, AnonymousTaskRunFactory
 from default import Test, with_context
 from pybossa.model.task_run import TaskRun
@@ -152,3 +153,40 @@ class TestStats(Test):
 
         err_msg = "user stats sum of auth and anon should be 7"
         assert user_stats['n_anon'] + user_stats['n_auth'] == 7, err_msg
+
+    def test_stats_users(self):
+        """Test STATS stats_users returns the top 5 authenticated users and
+        all the anonymous ones"""
+        for task in self.project.tasks[:3]:
+            TaskRunFactory.create(task=task)
+
+        users, anon_users, auth_users = stats.stats_users(self.project.id)
+
+        assert users == dict(n_auth=7, n_anon=1), users
+        assert anon_users == [['127.0.0.1', 4]], anon_users
+        assert len(auth_users) == 5, auth_users
+
+    def test_stats_hours_without_answers(self):
+        """Test STATS stats_hours returns no maximum if there are no
+        answers"""
+        project = ProjectFactory.create()
+
+        hours, hours_anon, hours_auth, max_hours,\
+            max_hours_anon, max_hours_auth = stats.stats_hours(project.id)
+
+        assert max_hours is None
+        assert max_hours_anon is None
+        assert max_hours_auth is None
+        assert sum(hours.values()) == 0, hours
+
+    def test_stats_scan_task_runs_once(self):
+        """Test STATS stats_users, stats_hours and stats_dates count all the
+        answers, and the completed tasks, with a single query each"""
+        with patch.object(stats.session, 'execute',
+                          wraps=stats.session.execute) as execute:
+            stats.stats_users(self.project.id)
+            stats.stats_hours(self.project.id)
+            assert execute.call_count == 2, execute.call_count
+            stats.stats_dates(self.project.id)
+            # Plus the query of n_tasks
+            assert execute.call_count == 4, execute.call_count
@@ -0,0 +1,83 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.task_candidates import TaskCandidates
+
+
+class TestTaskCandidates(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.candidates = TaskCandidates(self.connection)
+
+    def test_get_returns_none_if_not_cached(self):
+        """Test TaskCandidates get returns None for a list never set"""
+        assert self.candidates.get(1, user_id=1) is None
+
+    def test_set_and_get(self):
+        """Test TaskCandidates get returns the stored list, even if empty"""
+        self.candidates.set(1, [3, 2], 0, user_id=1)
+        self.candidates.set(1, [], 0, user_ip='127.0.0.1')
+
+        assert self.candidates.get(1, user_id=1) == [3, 2]
+        assert self.candidates.get(1, user_ip='127.0.0.1') == []
+        assert self.candidates.get(2, user_id=1) is None
+
+    def test_lists_are_short_lived(self):
+        """Test TaskCandidates lists expire after TTL seconds"""
+        self.candidates.set(1, [3], 0, user_id=1)
+        key = self.candidates._key(1, user_id=1)
+
+        assert 0 < self.connection.ttl(key) <= TaskCandidates.TTL
+
+    def test_invalidate(self):
+        """Test TaskCandidates invalidate drops the list of a user"""
+        self.candidates.set(1, [3], 0, user_id=1)
+        self.candidates.set(1, [3], 0, user_id=2)
+
+        self.candidates.invalidate(1, user_id=1)
+
+        assert self.candidates.get(1, user_id=1) is None
+        assert self.candidates.get(1, user_id=2) == [3]
+
+    def test_invalidate_project(self):
+        """Test TaskCandidates invalidate_project drops the lists of all the
+        users of a project"""
+        self.candidates.set(1, [3], 0, user_id=1)
+        self.candidates.set(1, [3], 0, user_ip='127.0.0.1')
+        self.candidates.set(2, [4], 0, user_id=1)
+
+        self.candidates.invalidate_project(1)
+
+        assert self.candidates.get(1, user_id=1) is None
+        assert self.candidates.get(1, user_ip='127.0.0.1') is None
+        assert self.candidates.get(2, user_id=1) == [4]
+        self.candidates.set(1, [5], self.candidates.version(1), user_id=1)
+        assert self.candidates.get(1, user_id=1) == [5]
+
+    def test_set_with_a_version_already_invalidated(self):
+        """Test TaskCandidates get ignores a list queried before the project
+        was invalidated"""
+        version = self.candidates.version(1)
+        self.candidates.invalidate_project(1)
+
+        self.candidates.set(1, [3], version, user_id=1)
+
+        assert self.candidates.get(1, user_id=1) is None
@@ -0,0 +1,110 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from mock import patch
+from redis import StrictRedis
+from pybossa.task_leases import TaskLeases
+
+
+class TestTaskLeases(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.leases = TaskLeases(self.connection)
+
+    def test_holder(self):
+        """Test TaskLeases holder uses the user id, or the IP for anonymous"""
+        assert self.leases.holder(user_id=1) == 'user:1'
+        assert self.leases.holder(user_ip='1.1.1.1') == 'ip:1.1.1.1'
+        assert self.leases.holder() == 'ip:127.0.0.1'
+
+    def test_acquire_up_to_max_leases(self):
+        """Test TaskLeases acquire leases a task at most max_leases times"""
+        assert self.leases.acquire(1, 'user:1', 2) is True
+        assert self.leases.acquire(1, 'user:2', 2) is True
+        assert self.leases.acquire(1, 'user:3', 2) is False
+        assert self.leases.count(1) == 2
+
+    def test_acquire_renews_own_lease(self):
+        """Test TaskLeases acquire always renews the lease of its holder"""
+        self.leases.acquire(1, 'user:1', 1)
+
+        assert self.leases.acquire(1, 'user:1', 1) is True
+        assert self.leases.count(1) == 1
+
+    def test_acquire_with_no_leases_left(self):
+        """Test TaskLeases acquire fails if the task needs no more answers"""
+        assert self.leases.acquire(1, 'user:1', 0) is False
+        assert self.leases.acquire(1, 'user:1', -1) is False
+
+    def test_expired_leases_are_freed(self):
+        """Test TaskLeases expired leases do not count"""
+        now = time.time()
+        with patch('pybossa.task_leases.time.time', return_value=now - 10):
+            self.leases.acquire(1, 'user:1', 1, timeout=5)
+
+        assert self.leases.count(1) == 0
+        assert self.leases.acquire(1, 'user:2', 1) is True
+
+    def test_release(self):
+        """Test TaskLeases release frees the lease of a holder"""
+        self.leases.acquire(1, 'user:1', 1)
+
+        self.leases.release(1, 'user:1')
+
+        assert self.leases.acquire(1, 'user:2', 1) is True
+
+    def test_release_all(self):
+        """Test TaskLeases release_all frees all the leases of a task"""
+        self.leases.acquire(1, 'user:1', 2)
+        self.leases.acquire(1, 'user:2', 2)
+
+        self.leases.release_all(1)
+
+        assert self.leases.count(1) == 0
+
+    def test_limits_are_cached_per_project(self):
+        """Test TaskLeases get_limits returns the limits set for a project"""
+        self.leases.set_limits(1, None, {1: 2, 2: 0})
+
+        assert self.leases.get_limits(1, [1, 2, 3]) == (0, {1: 2, 2: 0})
+        assert self.leases.get_limits(2, [1]) == (None, {})
+
+    def test_forget_limits(self):
+        """Test TaskLeases forget_limits drops the limit of a task, or all the
+        limits of a project"""
+        self.leases.set_limits(1, 60, {1: 2, 2: 1})
+
+        self.leases.forget_limits(1, 1)
+        assert self.leases.get_limits(1, [1, 2]) == (60, {2: 1})
+
+        self.leases.forget_limits(1)
+        assert self.leases.get_limits(1, [2]) == (None, {})
+
+    def test_limits_expire_even_if_updated(self):
+        """Test TaskLeases set_limits does not extend the life of the limits
+        already cached"""
+        self.leases.set_limits(1, 60, {1: 2})
+        key = TaskLeases.LIMITS_KEY % 1
+        self.connection.expire(key, 5)
+
+        self.leases.set_limits(1, 60, {2: 1})
+
+        assert 0 < self.connection.ttl(key) <= 5
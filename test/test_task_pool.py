@@ -0,0 +1,132 @@
+# -*- coding: utf8 -*-
+# This file is part of PyBossa.
+#
+# Copyright (C) 2015 SF Isle of Man Limited
+#
+# PyBossa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyBossa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.task_pool import TaskPool
+
+
+class TestTaskPool(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.pool = TaskPool(self.connection)
+
+    def _all_ids(self, project_id):
+        return [task_id for chunk in self.pool.iter_task_ids(project_id)
+                for task_id in chunk]
+
+    def test_pool_is_cold_until_filled(self):
+        """Test TaskPool is_warm returns False until the pool is filled"""
+        assert self.pool.is_warm(1) is False
+
+        self.pool.fill(1, [(1, 0)])
+
+        assert self.pool.is_warm(1) is True
+
+    def test_fill_with_no_tasks_warms_an_empty_pool(self):
+        """Test TaskPool fill with no open tasks leaves a warm empty pool"""
+        self.pool.fill(1, [(1, 0)])
+        self.pool.fill(1, [])
+
+        assert self.pool.is_warm(1) is True
+        assert self.pool.size(1) == 0
+        assert self._all_ids(1) == []
+
+    def test_fill_replaces_previous_pool(self):
+        """Test TaskPool fill replaces the tasks previously in the pool"""
+        self.pool.fill(1, [(1, 0), (2, 0)])
+        self.pool.fill(1, [(3, 0)])
+
+        assert self._all_ids(1) == [3], self._all_ids(1)
+
+    def test_fill_in_several_chunks(self):
+        """Test TaskPool fill adds all the tasks when they take several
+        chunks"""
+        n_tasks = 2 * TaskPool.CHUNK_SIZE + 1
+        self.pool.fill(1, [(i, 0) for i in range(1, n_tasks + 1)])
+
+        assert self.pool.size(1) == n_tasks, self.pool.size(1)
+        assert not self.connection.exists(TaskPool.POOL_KEY % 1 + ':tmp')
+
+    def test_iter_task_ids_uses_depth_first_order(self):
+        """Test TaskPool returns tasks by priority_0 DESC and id ASC"""
+        self.pool.fill(1, [(10, 0), (9, 0), (100, 0.5), (2, 1)])
+
+        assert self._all_ids(1) == [2, 100, 9, 10], self._all_ids(1)
+
+    def test_iter_task_ids_in_chunks(self):
+        """Test TaskPool iter_task_ids yields chunks of the given size"""
+        self.pool.fill(1, [(i, 0) for i in range(1, 6)])
+
+        chunks = list(self.pool.iter_task_ids(1, chunk_size=2))
+
+        assert chunks == [[1, 2], [3, 4], [5]], chunks
+
+    def test_add_and_remove(self):
+        """Test TaskPool add and remove update the pool of a project"""
+        self.pool.fill(1, [(1, 0)])
+        self.pool.add(1, 2, priority=1)
+        self.pool.remove(1, 1)
+
+        assert self._all_ids(1) == [2], self._all_ids(1)
+
+    def test_pools_are_per_project(self):
+        """Test TaskPool keeps a different pool for every project"""
+        self.pool.fill(1, [(1, 0)])
+        self.pool.fill(2, [(2, 0)])
+
+        assert self._all_ids(1) == [1]
+        assert self._all_ids(2) == [2]
+
+    def test_invalidate(self):
+        """Test TaskPool invalidate makes the pool cold"""
+        self.pool.fill(1, [(1, 0)])
+
+        self.pool.invalidate(1)
+
+        assert self.pool.is_warm(1) is False
+        assert self.pool.size(1) == 0
+
+    def test_start_filling_only_once(self):
+        """Test TaskPool start_filling returns True only for the first call
+        until the pool is filled"""
+        assert self.pool.start_filling(1) is True
+        assert self.pool.start_filling(1) is False
+
+        self.pool.fill(1, [])
+
+        assert self.pool.start_filling(1) is True
+
+    def test_random_task_ids(self):
+        """Test TaskPool random_task_ids returns different tasks of the pool"""
+        self.pool.fill(1, [(i, 0) for i in range(1, 11)])
+
+        task_ids = self.pool.random_task_ids(1, 5)
+
+        assert len(task_ids) == 5, task_ids
+        assert len(set(task_ids)) == 5, task_ids
+        assert set(task_ids) <= set(range(1, 11)), task_ids
+
+    def test_random_task_ids_with_small_or_empty_pool(self):
+        """Test TaskPool random_task_ids returns at most the tasks in the
+        pool"""
+        self.pool.fill(1, [(1, 0), (2, 0)])
+
+        assert sorted(self.pool.random_task_ids(1, 5)) == [1, 2]
+        assert self.pool.random_task_ids(2, 5) == []
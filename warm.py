@@ -17,66 +17,52 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 
 #!/usr/bin/env python
+"""Warm the cache with a pool of processes, like the warm_cache job does
+with the workers of the RQ queue.
+
+Usage:
+
+    python warm.py warm_cache 8
+"""
 import os
 import sys
+import time
 import optparse
 import inspect
+from multiprocessing import Pool
 
 #import pybossa.model as model
-from pybossa.core import create_app
+from pybossa.core import create_app, db
 
 app = create_app()
 
 
-def warm_cache():
+def warm_cache(processes=4):
     '''Warm cache'''
-    # Disable cache, so we can refresh the data in Redis
-    os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = '1'
-    # Cache 3 pages
-    apps_cached = []
-    pages = range(1, 4)
+    from pybossa.jobs import warm_lists, get_warm_jobs
+    start = time.time()
+    with app.app_context():
+        projects, users, elapsed = warm_lists()
+        jobs = [(job['name'], job['args']) for job in
+                get_warm_jobs(projects, users)]
+    print "Lists warmed in %.2fs" % elapsed
+    # Connections can not be shared with the forked processes
+    for bind in (None, 'slave'):
+        db.get_engine(app, bind=bind).dispose()
+    pool = Pool(int(processes))
+    try:
+        pool.map(_run_job, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    print ("%s projects and %s users warmed in %.2fs" %
+           (len(projects), len(users), time.time() - start))
+
+
+def _run_job(job):
+    function, args = job
     with app.app_context():
-        import pybossa.cache.projects as cached_apps
-        import pybossa.cache.categories as cached_cat
-        import pybossa.cache.users as cached_users
-        import pybossa.cache.project_stats  as stats
-
-        def warm_app(id, short_name, featured=False):
-            if id not in apps_cached:
-                cached_apps.get_app(short_name)
-                cached_apps.n_tasks(id)
-                n_task_runs = cached_apps.n_task_runs(id)
-                cached_apps.overall_progress(id)
-                cached_apps.last_activity(id)
-                cached_apps.n_completed_tasks(id)
-                cached_apps.n_volunteers(id)
-                if n_task_runs >= 1000 or featured:
-                    print "Getting stats for %s as it has %s task runs" % (short_name, n_task_runs)
-                    stats.get_stats(id, app.config.get('GEO'))
-                apps_cached.append(id)
-
-        # Cache top projects
-        apps = cached_apps.get_top()
-        for a in apps:
-            warm_app(a['id'], a['short_name'])
-        for page in pages:
-            apps = cached_apps.get_featured('featured', page,
-                                            app.config['APPS_PER_PAGE'])
-            for a in apps:
-                warm_app(a['id'], a['short_name'], featured=True)
-
-        # Categories
-        categories = cached_cat.get_used()
-        for c in categories:
-            for page in pages:
-                 apps = cached_apps.get(c['short_name'],
-                                        page,
-                                        app.config['APPS_PER_PAGE'])
-                 for a in apps:
-                     warm_app(a['id'], a['short_name'])
-        # Users
-        cached_users.get_leaderboard(app.config['LEADERBOARD'], 'anonymous')
-        cached_users.get_top()
+        return function(*args)
 
 
 ## ==================================================